@@ -0,0 +1,154 @@
+import heapq
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable
+
+
+class Clock(ABC):
+    """A source of time that components use instead of the `time` module.
+
+    This lets us swap the real clock for a simulated one, so that simulations and
+    tests run faster than real time and don't depend on how busy the machine is.
+    """
+
+    @abstractmethod
+    def time(self) -> float:
+        """Seconds since the epoch, like time.time()."""
+
+    @abstractmethod
+    def monotonic(self) -> float:
+        """Like time.monotonic()."""
+
+    @abstractmethod
+    def sleep(self, seconds: float): ...
+
+    @abstractmethod
+    def start_thread(self, target: Callable[[], None]) -> threading.Thread:
+        """Start a thread whose sleeps are governed by this clock."""
+
+    @abstractmethod
+    def join_thread(self, thread: threading.Thread):
+        """Wait for a thread started by start_thread() to finish."""
+
+
+class SystemClock(Clock):
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def start_thread(self, target: Callable[[], None]) -> threading.Thread:
+        thread = threading.Thread(target=target)
+        thread.start()
+        return thread
+
+    def join_thread(self, thread: threading.Thread):
+        thread.join()
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class SimulatedClock(Clock):
+    """A clock where sleeping takes no real time.
+
+    Virtual time only moves forward once every participating thread is asleep, and
+    then it jumps straight to the earliest wake-up time. Only one thread is woken up
+    at a time (in the order they went to sleep if the wake-up times are equal), so
+    the threads take turns and the outcome doesn't depend on the OS scheduler.
+
+    Participating threads are the one that created the clock and the ones started
+    via start_thread(). A participant that blocks on something other than the clock
+    (a lock, a queue, joining a thread...) stalls virtual time, so use join_thread()
+    instead of Thread.join().
+    """
+
+    def __init__(self, start_time: float = 0.0, epoch: float = 1.7e9):
+        self._now = start_time
+        self._epoch = epoch
+        self._condition = threading.Condition()
+
+        self._participants = {threading.get_ident()}
+        # Threads that were started but haven't registered themselves yet.
+        # We must not advance time until they do.
+        self._n_starting = 0
+        # Heap of (wake-up time, sequence number, thread ident)
+        self._sleepers: list[tuple[float, int, int]] = []
+        self._asleep: set[int] = set()
+        self._sequence = 0
+
+    def time(self) -> float:
+        return self._epoch + self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float):
+        ident = threading.get_ident()
+        with self._condition:
+            wake_time = self._now + max(seconds, 0.0)
+            heapq.heappush(self._sleepers, (wake_time, self._sequence, ident))
+            self._sequence += 1
+            self._asleep.add(ident)
+
+            while ident in self._asleep:
+                if self._can_advance():
+                    self._advance()
+                else:
+                    self._condition.wait()
+
+    def start_thread(self, target: Callable[[], None]) -> threading.Thread:
+        def run():
+            ident = threading.get_ident()
+            with self._condition:
+                self._n_starting -= 1
+                self._participants.add(ident)
+            try:
+                # Wait for our turn so that we don't run concurrently with the thread
+                # that started us.
+                self.sleep(0)
+                target()
+            finally:
+                with self._condition:
+                    self._participants.discard(ident)
+                    self._condition.notify_all()
+
+        with self._condition:
+            self._n_starting += 1
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def join_thread(self, thread: threading.Thread):
+        ident = threading.get_ident()
+        with self._condition:
+            is_participant = ident in self._participants
+            # Let time pass while we wait
+            self._participants.discard(ident)
+            self._condition.notify_all()
+
+        thread.join()
+
+        if is_participant:
+            with self._condition:
+                self._participants.add(ident)
+
+    def _can_advance(self) -> bool:
+        return (
+            self._n_starting == 0
+            and bool(self._sleepers)
+            and self._participants <= self._asleep
+        )
+
+    def _advance(self):
+        """Jump to the earliest wake-up time and wake up the thread waiting for it."""
+        wake_time, _, ident = heapq.heappop(self._sleepers)
+        self._now = max(self._now, wake_time)
+        self._asleep.discard(ident)
+        self._condition.notify_all()
@@ -0,0 +1,97 @@
+import librosa
+import numpy as np
+from pydantic import BaseModel
+
+# The range to look for the pitch of a pluck in, like PitchDetector
+MIN_PLUCK_NOTE = "E1"
+MAX_PLUCK_NOTE = "E3"
+# Long enough for a few periods of the lowest note
+PLUCK_FRAME_LENGTH = 4096
+
+
+class Pluck(BaseModel):
+    """A pluck of the string heard while the pick motor was moving."""
+
+    # Where the motor was at the onset of the pluck
+    steps: int
+    loudness: float
+    # Of the string right after the pluck, NaN if unclear
+    frequency: float
+
+
+def estimate_pluck_frequency(y: np.ndarray, sr: float) -> float:
+    """The frequency of a pluck from the audio right after its onset.
+
+    NaN if there's less than a frame of audio, e.g. if the onset is close to the end
+    of the recording.
+    """
+    if len(y) < PLUCK_FRAME_LENGTH:
+        return np.nan
+    f0 = librosa.yin(
+        y,
+        fmin=librosa.note_to_hz(MIN_PLUCK_NOTE),
+        fmax=librosa.note_to_hz(MAX_PLUCK_NOTE),
+        sr=sr,
+        frame_length=PLUCK_FRAME_LENGTH,
+        center=False,
+    )
+    return float(np.median(f0))
+
+
+class StrumOffsetTable(BaseModel):
+    """Where the pick plucks the string, depending on the string's frequency.
+
+    A looser string is held by the pick for longer, so it's plucked further along the
+    move. The table stores, for a few frequencies, how far the pluck positions of an
+    upstroke and a downstroke are from those at the first frequency. Between them,
+    we interpolate on a log scale (i.e. by notes). Outside of the range, the nearest
+    entry is used.
+
+    Build it with from_plucks(), from measurements across the playable range.
+    """
+
+    frequencies: list[float]
+    upstroke_steps: list[float]
+    downstroke_steps: list[float]
+
+    @classmethod
+    def from_plucks(
+        cls, plucks: list[tuple[Pluck, Pluck]], steps_per_turn: int
+    ) -> "StrumOffsetTable":
+        """Build the table from (upstroke, downstroke) plucks at various frequencies.
+
+        The frequency of an entry is the mean of both plucks'. The plucks can be on
+        different turns of the pick, so positions are compared modulo a turn.
+        """
+        plucks = [
+            (up, down)
+            for up, down in plucks
+            if not np.isnan(up.frequency) and not np.isnan(down.frequency)
+        ]
+        if not plucks:
+            raise ValueError("No plucks with a known frequency")
+        plucks.sort(key=lambda pair: pair[0].frequency + pair[1].frequency)
+
+        def relative(steps: int, reference: int) -> float:
+            half_turn = steps_per_turn / 2
+            return float((steps - reference + half_turn) % steps_per_turn - half_turn)
+
+        first_up, first_down = plucks[0]
+        return cls(
+            frequencies=[(up.frequency + down.frequency) / 2 for up, down in plucks],
+            upstroke_steps=[relative(up.steps, first_up.steps) for up, _ in plucks],
+            downstroke_steps=[
+                relative(down.steps, first_down.steps) for _, down in plucks
+            ],
+        )
+
+    def get_offsets(
+        self, frequency: float, reference_frequency: float
+    ) -> tuple[float, float]:
+        """How much further the (upstroke, downstroke) pluck positions are at
+        `frequency` than at `reference_frequency`."""
+        log_frequencies = np.log(self.frequencies)
+        x = np.log([frequency, reference_frequency])
+        up = np.interp(x, log_frequencies, self.upstroke_steps)
+        down = np.interp(x, log_frequencies, self.downstroke_steps)
+        return float(up[0] - up[1]), float(down[0] - down[1])
@@ -0,0 +1,330 @@
+import logging
+import threading
+from types import TracebackType
+
+import numpy as np
+from pydantic import BaseModel
+
+from autoguitar.clock import SYSTEM_CLOCK, Clock
+from autoguitar.control.strummer import StrumAction, Strummer, StrumState
+from autoguitar.dsp.loudness_detector import find_onset
+from autoguitar.signal import Signal
+
+logger = logging.getLogger(__name__)
+
+# How long after issuing a strum to look for its sound. The latency is the motor
+# move, the pick holding the string until it slips and for a remote motor, the HTTP
+# request.
+MAX_LATENCY_SEC = 0.3
+# How much each measurement moves the latency estimate
+LATENCY_SMOOTHING = 0.2
+# Events that would be issued more than this late are skipped, so that a slow move
+# doesn't delay everything after it
+MAX_LATE_BEATS = 0.25
+# Sleep at most this long at a time, to react to tempo changes and stop()
+POLL_SEC = 0.02
+# The previous strum is usually still ringing, so the new one is not much louder
+# than the quietest point before it, and the ringing fluctuates. A high threshold
+# ignores the fluctuations, the attack of a strum is steep enough for it not to
+# delay the onset much.
+ONSET_MIN_PEAK_RATIO = 1.3
+ONSET_THRESHOLD = 0.5
+# If the audio of a strum hasn't arrived after this long, give up on measuring it
+MEASUREMENT_TIMEOUT_SEC = 1.0
+
+
+class StrumEvent(BaseModel):
+    # Position within the bar, from 0 to beats_per_bar
+    beat: float
+    action: StrumAction = "strum"
+
+
+class StrumPattern(BaseModel):
+    events: list[StrumEvent]
+    beats_per_bar: int = 4
+
+
+class StrumTiming(BaseModel):
+    """When one event of the pattern was supposed to sound and when it did.
+
+    Times are in clock.monotonic() time.
+    """
+
+    bar: int
+    action: StrumAction
+    state: StrumState
+    scheduled_at: float
+    # None if the event was skipped because we were running late
+    issued_at: float | None = None
+    # None if it hasn't been (or couldn't be) measured, e.g. for mutes
+    sounded_at: float | None = None
+    # Only look for the sound until here, after that it's the next event's
+    listen_until: float | None = None
+
+
+class BarStats(BaseModel):
+    bar: int
+    n_events: int
+    n_skipped: int
+    # How many strums we found the onset of
+    n_measured: int
+    # Positive means late
+    mean_error_sec: float
+    # Standard deviation of the errors
+    jitter_sec: float
+    # Change of the mean error since the previous measured bar
+    drift_sec: float
+    latency_sec: dict[str, float]
+
+
+class StrumScheduler:
+    """Plays a strumming pattern at a given tempo.
+
+    Unlike sleeping between strums, the beats are on a fixed grid, so the time that
+    each strum takes doesn't add up into the tempo drifting. The grid is re-anchored
+    when the tempo changes so that the beat doesn't jump.
+
+    There is a delay between issuing a strum and hearing it. We issue each command
+    early by that much, and measure the delay continuously by finding the onset of
+    each strum in the audio. It's tracked per target state because the pick slips
+    off the string at a different point of the move on an upstroke and a downstroke.
+
+    After each bar, the timing errors of its strums are summarized in a BarStats,
+    which is logged and sent to `on_bar`.
+
+    Args:
+        strummer: A calibrated strummer.
+        pattern: The events of one bar, repeated.
+        bpm: The tempo in beats per minute. None to start paused.
+        initial_latency_sec: The latency to assume until it's measured.
+        clock: The clock to schedule by.
+    """
+
+    def __init__(
+        self,
+        strummer: Strummer,
+        pattern: StrumPattern,
+        bpm: float | None = None,
+        initial_latency_sec: float = 0.05,
+        clock: Clock = SYSTEM_CLOCK,
+    ):
+        if not pattern.events:
+            raise ValueError("The pattern has no events")
+
+        self.strummer = strummer
+        self.input_stream = strummer.input_stream
+        self.events = sorted(pattern.events, key=lambda event: event.beat)
+        self.beats_per_bar = pattern.beats_per_bar
+        self.initial_latency_sec = initial_latency_sec
+        self.clock = clock
+
+        self.latency_sec: dict[StrumState, float] = {}
+        self.bar_stats: list[BarStats] = []
+        self.on_bar: Signal[BarStats] = Signal()
+
+        self._lock = threading.Lock()
+        self._bpm: float | None = None
+        # The beat grid: beat `_anchor_beat` is at time `_anchor_time`
+        self._anchor_time = 0.0
+        self._anchor_beat = 0.0
+        # Index of the next event, counting from the first event of the first bar
+        self._next_event = 0
+        self._timings: dict[int, list[StrumTiming]] = {}
+
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.set_bpm(bpm)
+
+    def __enter__(self):
+        self.stop_event.clear()
+        self.thread = self.clock.start_thread(self._run)
+        return self
+
+    def __exit__(self, exc_type: type, exc_val: Exception, exc_tb: TracebackType):
+        self.stop_event.set()
+        assert self.thread is not None
+        self.clock.join_thread(self.thread)
+
+    def get_bpm(self) -> float | None:
+        return self._bpm
+
+    def set_bpm(self, bpm: float | None):
+        """Change the tempo. None pauses, a later tempo resumes with the next event."""
+        with self._lock:
+            now = self.clock.monotonic()
+            if bpm is None:
+                self._bpm = None
+                return
+            if bpm <= 0:
+                raise ValueError(f"Invalid tempo: {bpm}")
+
+            if self._bpm is None:
+                # Play the next event as soon as it can sound on time
+                self._anchor_time = now + max(
+                    [self.initial_latency_sec, *self.latency_sec.values()]
+                )
+                self._anchor_beat = self._get_event_beat(self._next_event)
+            else:
+                self._anchor_beat = self._get_beat_at(now)
+                self._anchor_time = now
+            self._bpm = bpm
+
+    def get_latency_sec(self, state: StrumState) -> float:
+        return self.latency_sec.get(state, self.initial_latency_sec)
+
+    def get_current_bar(self) -> int:
+        return self._next_event // len(self.events)
+
+    def wait_until_bar(self, bar: int):
+        """Wait until the events of the bars before `bar` have been played."""
+        while self.get_current_bar() < bar:
+            self.clock.sleep(POLL_SEC)
+
+    def _get_event_beat(self, index: int) -> float:
+        bar, i = divmod(index, len(self.events))
+        return bar * self.beats_per_bar + self.events[i].beat
+
+    def _get_beat_at(self, time: float) -> float:
+        assert self._bpm is not None
+        return self._anchor_beat + (time - self._anchor_time) * self._bpm / 60
+
+    def _get_time_of_beat(self, beat: float) -> float:
+        assert self._bpm is not None
+        return self._anchor_time + (beat - self._anchor_beat) * 60 / self._bpm
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self._process_measurements()
+
+            with self._lock:
+                bpm = self._bpm
+                if bpm is not None:
+                    index = self._next_event
+                    scheduled_at = self._get_time_of_beat(self._get_event_beat(index))
+                    next_scheduled_at = self._get_time_of_beat(
+                        self._get_event_beat(index + 1)
+                    )
+
+            if bpm is None:
+                self.clock.sleep(POLL_SEC)
+                continue
+
+            event = self.events[index % len(self.events)]
+            state = self.strummer.get_next_state(event.action)
+            issue_at = scheduled_at - self.get_latency_sec(state)
+
+            now = self.clock.monotonic()
+            if issue_at > now:
+                self.clock.sleep(min(issue_at - now, POLL_SEC))
+                continue
+
+            timing = StrumTiming(
+                bar=index // len(self.events),
+                action=event.action,
+                state=state,
+                scheduled_at=scheduled_at,
+            )
+            if now - issue_at > MAX_LATE_BEATS * 60 / bpm:
+                logger.debug(f"Skipping a {event.action}, {now - issue_at:.3f}s late")
+            else:
+                timing.issued_at = now
+                if event.action == "strum":
+                    self.strummer.strum()
+                    timing.listen_until = min(
+                        now + MAX_LATENCY_SEC, max(next_scheduled_at, now)
+                    )
+                else:
+                    self.strummer.mute()
+
+            self._timings.setdefault(timing.bar, []).append(timing)
+            with self._lock:
+                if self._next_event == index:  # Could've been reset by set_bpm()
+                    self._next_event += 1
+
+    def _process_measurements(self):
+        now = self.clock.monotonic()
+        for timings in self._timings.values():
+            for timing in timings:
+                if (
+                    timing.listen_until is not None
+                    and timing.sounded_at is None
+                    and now >= timing.listen_until
+                ):
+                    self._measure(timing, now)
+
+        current_bar = self.get_current_bar()
+        for bar in sorted(self._timings):
+            if bar >= current_bar or any(
+                timing.listen_until is not None for timing in self._timings[bar]
+            ):
+                break
+            self._finish_bar(bar)
+
+    def _measure(self, timing: StrumTiming, now: float):
+        assert timing.issued_at is not None and timing.listen_until is not None
+        assert self.input_stream.stream is not None
+        samplerate = self.input_stream.stream.samplerate
+
+        audio = self.input_stream.get_audio_since(timing.issued_at)
+        if audio is not None:
+            y, start_time = audio
+            start = max(0, round((timing.issued_at - start_time) * samplerate))
+            end = round((timing.listen_until - start_time) * samplerate)
+            if end > len(y) and now < timing.listen_until + MEASUREMENT_TIMEOUT_SEC:
+                return  # The audio hasn't arrived yet
+
+            onset = find_onset(
+                y[start:end],
+                threshold=ONSET_THRESHOLD,
+                min_peak_ratio=ONSET_MIN_PEAK_RATIO,
+            )
+            if onset is not None:
+                timing.sounded_at = start_time + (start + onset) / samplerate
+                self._update_latency(timing.state, timing.sounded_at - timing.issued_at)
+
+        # Measured or not, we're done with it
+        timing.listen_until = None
+
+    def _update_latency(self, state: StrumState, latency: float):
+        estimate = self.latency_sec.get(state)
+        if estimate is None:
+            # The first measurement is better than the initial guess
+            self.latency_sec[state] = latency
+        else:
+            self.latency_sec[state] = estimate + LATENCY_SMOOTHING * (
+                latency - estimate
+            )
+
+    def _finish_bar(self, bar: int):
+        timings = self._timings.pop(bar)
+        errors = np.array(
+            [
+                timing.sounded_at - timing.scheduled_at
+                for timing in timings
+                if timing.sounded_at is not None
+            ]
+        )
+
+        mean_error_sec = float(np.mean(errors)) if len(errors) else np.nan
+        previous = [s for s in self.bar_stats if not np.isnan(s.mean_error_sec)]
+        stats = BarStats(
+            bar=bar,
+            n_events=len(timings),
+            n_skipped=sum(timing.issued_at is None for timing in timings),
+            n_measured=len(errors),
+            mean_error_sec=mean_error_sec,
+            jitter_sec=float(np.std(errors)) if len(errors) else np.nan,
+            drift_sec=(
+                mean_error_sec - previous[-1].mean_error_sec if previous else np.nan
+            ),
+            latency_sec=dict(self.latency_sec),
+        )
+        self.bar_stats.append(stats)
+        logger.info(
+            f"Bar {bar}: error {1000 * stats.mean_error_sec:+.1f}ms, "
+            f"jitter {1000 * stats.jitter_sec:.1f}ms, "
+            f"drift {1000 * stats.drift_sec:+.1f}ms, "
+            f"{stats.n_measured}/{stats.n_events} measured, "
+            f"{stats.n_skipped} skipped"
+        )
+        self.on_bar.notify(stats)
@@ -1,12 +1,18 @@
 import logging
-import time
-from typing import Literal
+from typing import Callable, Literal
 
 import numpy as np
 from pydantic import BaseModel
 
-from autoguitar.dsp.input_stream import InputStream
-from autoguitar.dsp.loudness_detector import LoudnessDetector
+from autoguitar.clock import SYSTEM_CLOCK, Clock
+from autoguitar.control.strum_offsets import (
+    Pluck,
+    StrumOffsetTable,
+    estimate_pluck_frequency,
+)
+from autoguitar.dsp.input_stream import InputStream, InputStreamCallbackData
+from autoguitar.dsp.loudness_detector import LoudnessDetector, find_onset
+from autoguitar.dsp.pitch_detector import Timestamp
 from autoguitar.motor import AbstractMotorController
 
 
@@ -16,6 +22,9 @@ class Calibration(BaseModel):
     high_loudness: float
     downstroke_steps: int
     upstroke_steps: int
+    # Of the string during the calibration, if known. The strum positions depend on
+    # it, see StrumOffsetTable.
+    frequency: float | None = None
 
 
 logger = logging.getLogger(__name__)
@@ -29,56 +38,119 @@ StrumState = Literal[
     "downstroke_mute",
 ]
 
+StrumAction = Literal["strum", "mute"]
+
+NEXT_STATE: dict[StrumAction, dict[StrumState, StrumState]] = {
+    "strum": {
+        "upstroke": "downstroke",
+        "upstroke_mute": "downstroke",
+        "downstroke": "upstroke",
+        "downstroke_mute": "upstroke",
+    },
+    "mute": {
+        "upstroke": "upstroke_mute",
+        "upstroke_mute": "upstroke_mute",
+        "downstroke": "downstroke_mute",
+        "downstroke_mute": "downstroke_mute",
+    },
+}
+
+CalibrationMethod = Literal["sweep", "steps"]
+
 STROKE_DISTANCE = 50
 UPSTROKE_BASE_OFFSET = 15
+# When recording a pluck, start this long before moving so that there's some audio
+# from before the pluck to find its onset in
+RECORDING_PREROLL_SEC = 0.05
+# After the motor stops, keep recording this long so that the audio of the last
+# steps has arrived
+RECORDING_TAIL_SEC = 0.2
 
 
 class Strummer:
     def __init__(
-        self, input_stream: InputStream, motor_controller: AbstractMotorController
+        self,
+        input_stream: InputStream,
+        motor_controller: AbstractMotorController,
+        clock: Clock = SYSTEM_CLOCK,
     ):
         self.input_stream = input_stream
-        self.loudness_detector = LoudnessDetector(input_stream=input_stream)
+        self.clock = clock
+        self.loudness_detector = LoudnessDetector(
+            input_stream=input_stream, clock=clock
+        )
         self.motor_controller = motor_controller
         self.downstroke_offset = 0
         self.upstroke_offset = 0
+        # If set, the strum positions follow the frequency of the string
+        self.offset_table: StrumOffsetTable | None = None
+        self.frequency: float | None = None
 
         # self.input_stream.on_reading.subscribe(self._input_stream_callback)
 
         self.calibration: Calibration | None = None
         self.strum_state: StrumState = "unknown"
 
-    def calibrate(self, estimate_downstroke_separately: bool = False):
+    def calibrate(
+        self,
+        estimate_downstroke_separately: bool = False,
+        method: CalibrationMethod = "sweep",
+    ):
         """Measure the motor positions for the upstroke and downstroke.
 
         Args:
             estimate_downstroke_separately: If False, do a rough estimate
                 of the downstroke position based on the upstroke position.
                 Faster but potentially less accurate.
+            method: "sweep" turns the pick continuously and finds when the pluck
+                happened from the audio, see find_pluck_position_by_sweep(). "steps"
+                moves a few steps at a time and listens after each one, which is
+                slower. If the sweep doesn't find a pluck, we fall back to "steps".
         """
         self.input_stream.wait_for_initialization()
 
         low_loudness = self.loudness_detector.measure_loudness()
         print("Low loudness: ", low_loudness)
 
-        # Moving by small steps is slow, so first take big steps to roughly
-        # find where the string is
-        time.sleep(0.5)
-        self.find_strum_position(steps_at_a_time=-25)
-        high_loudness = self.loudness_detector.measure_loudness()
-        # Go a bit back
-        self.motor_controller.move(-10, wait=True)
-        time.sleep(1)
-
-        # Now move in small steps until the string is plucked
-        position_up = self.find_strum_position(steps_at_a_time=3)
-        position_up += UPSTROKE_BASE_OFFSET
+        pluck = None
+        frequency = None
+        if method == "sweep":
+            pluck = self.find_pluck_position_by_sweep(direction=1)
+            if pluck is None:
+                logger.warning("No pluck found by sweeping, moving in steps instead")
+
+        if pluck is not None:
+            high_loudness = pluck.loudness
+            position_up = pluck.steps + UPSTROKE_BASE_OFFSET
+            if not np.isnan(pluck.frequency):
+                frequency = pluck.frequency
+        else:
+            # Moving by small steps is slow, so first take big steps to roughly
+            # find where the string is
+            self.clock.sleep(0.5)
+            self.find_strum_position(steps_at_a_time=-25)
+            high_loudness = self.loudness_detector.measure_loudness()
+            # Go a bit back
+            self.motor_controller.move(-10, wait=True)
+            self.clock.sleep(1)
+
+            # Now move in small steps until the string is plucked
+            position_up = self.find_strum_position(steps_at_a_time=3)
+            position_up += UPSTROKE_BASE_OFFSET
         print("Upstroke position:", position_up)
 
         if estimate_downstroke_separately:
-            self.motor_controller.move(-10, wait=True)
-            time.sleep(1)
-            position_down = self.find_strum_position(steps_at_a_time=-3)
+            if pluck is not None:
+                # Continue from past the string, back over it
+                self.motor_controller.set_target_steps(position_up, wait=True)
+                pluck = self.find_pluck_position_by_sweep(direction=-1)
+
+            if pluck is not None:
+                position_down = pluck.steps
+            else:
+                self.motor_controller.move(-10, wait=True)
+                self.clock.sleep(1)
+                position_down = self.find_strum_position(steps_at_a_time=-3)
             self.strum_state = "downstroke"
         else:
             # The angle difference should always be more or less the same
@@ -92,8 +164,152 @@ class Strummer:
             high_loudness=high_loudness,
             downstroke_steps=position_down,
             upstroke_steps=position_up,
+            frequency=frequency,
+        )
+        self.frequency = frequency
+        self.set_strum_state("upstroke")
+
+    def find_pluck_position_by_sweep(
+        self, direction: int, n_steps: int | None = None
+    ) -> Pluck | None:
+        """Turn the pick continuously and find the position where it plucked.
+
+        We record the audio while the motor turns at full speed, find the onset of
+        the pluck in it and look up where the motor was at that moment in its step
+        history. This takes a single pass, rather than stopping to listen after
+        every few steps.
+
+        Args:
+            direction: 1 or -1.
+            n_steps: How far to turn. Defaults to a full turn, so that the pick
+                crosses the string exactly once wherever it starts.
+
+        Returns:
+            The pluck, or None if no pluck was found.
+        """
+        if n_steps is None:
+            n_steps = self.motor_controller.steps_per_turn()
+
+        pluck = self._find_pluck_while(
+            lambda: self.motor_controller.move(direction * n_steps, wait=True)
         )
+        if pluck is not None:
+            logger.info(f"Found a pluck at {pluck.steps} steps by sweeping")
+        return pluck
+
+    def measure_plucks(self) -> tuple[Pluck, Pluck] | None:
+        """Find where the (upstroke, downstroke) plucks are at the current tuning.
+
+        See StrumOffsetTable.from_plucks(). Afterwards, the strum state is unknown.
+        """
+        self.strum_state = "unknown"
+        # Each sweep is a full turn, so it crosses the string once wherever it starts
+        up = self.find_pluck_position_by_sweep(direction=1)
+        if up is None:
+            return None
+        down = self.find_pluck_position_by_sweep(direction=-1)
+        if down is None:
+            return None
+        return up, down
+
+    def set_frequency(self, frequency: float | None):
+        """Tell the strummer what the string is tuned to, see StrumOffsetTable."""
+        self.frequency = frequency
+
+    def on_pitch_reading(self, data: tuple[float, Timestamp]):
+        """Follow the measured frequency of the string. Subscribe to a PitchDetector.
+
+        While the tuning motor is moving, the string isn't at the target frequency
+        yet, so the measured frequency is the better guess of the tension.
+        """
+        frequency, _ = data
+        if not np.isnan(frequency):
+            self.set_frequency(frequency)
+
+    def validate_calibration(
+        self, calibration: Calibration, max_error_steps: int = 10
+    ) -> bool:
+        """Check that a calibration from a previous run is still valid, with one strum.
+
+        We go to the upstroke position and strum. The calibration is valid if we hear
+        the pluck and the motor was close to the downstroke position at that moment,
+        which is where calibrate() found the pluck on the way down (adjusted for the
+        frequency of the string if there is an offset table). If the motor
+        position was lost in the meantime, the strum either misses the string or
+        plucks it somewhere else.
+
+        If valid, the strummer uses the calibration afterwards.
+        """
+        self.input_stream.wait_for_initialization()
+        previous_calibration = self.calibration
+        self.calibration = calibration
         self.set_strum_state("upstroke")
+        # Let the string settle in case going to the upstroke position plucked it
+        self.clock.sleep(0.5)
+
+        pluck = self._find_pluck_while(self.strum)
+        if pluck is None:
+            logger.info("Calibration is invalid: the validation strum was silent")
+        else:
+            if not np.isnan(pluck.frequency):
+                self.frequency = pluck.frequency
+            expected_steps = (
+                self._get_target_steps("downstroke") - self.downstroke_offset
+            )
+            if abs(pluck.steps - expected_steps) <= max_error_steps:
+                return True
+            logger.info(
+                f"Calibration is invalid: plucked at {pluck.steps} steps, expected "
+                f"{expected_steps}"
+            )
+
+        self.calibration = previous_calibration
+        self.strum_state = "unknown"
+        return False
+
+    def _find_pluck_while(self, action: Callable[[], None]) -> Pluck | None:
+        """Record while doing `action` and find where the motor was at the pluck.
+
+        Returns:
+            The pluck, or None if no pluck was found.
+        """
+        self._wait_until_quiet()
+        blocks: list[InputStreamCallbackData] = []
+        self.input_stream.on_reading.subscribe(blocks.append)
+        try:
+            self.clock.sleep(RECORDING_PREROLL_SEC)
+            action()
+            self.clock.sleep(RECORDING_TAIL_SEC)
+        finally:
+            self.input_stream.on_reading.unsubscribe(blocks.append)
+
+        if not blocks:
+            return None
+
+        y = np.concatenate([block.indata[:, 0] for block in blocks])
+        onset = find_onset(y)
+        if onset is None:
+            return None
+
+        # Blocks can be dropped, so compute the time from the block the onset is in
+        assert self.input_stream.stream is not None
+        block_index = onset // len(blocks[0].indata)
+        offset = onset - block_index * len(blocks[0].indata)
+        onset_time = self.input_stream.adc_to_monotonic(
+            blocks[block_index].timestamp + offset / self.input_stream.stream.samplerate
+        )
+        position = self.motor_controller.step_history.get_steps_at(onset_time)
+        if position is None:
+            return None
+
+        y_pluck = y[onset : onset + 8192]
+        return Pluck(
+            steps=position,
+            loudness=float(np.sqrt(np.mean(y_pluck**2))),
+            frequency=estimate_pluck_frequency(
+                y_pluck, sr=self.input_stream.stream.samplerate
+            ),
+        )
 
     def _calibrate_loudness(self, min_readings: int = 2) -> tuple[float, float]:
         """Measure the loudness of the string when it is not plucked vs when it is."""
@@ -105,7 +321,7 @@ class Strummer:
         self.motor_controller.move(
             self.motor_controller.steps_per_turn() * 2, wait=True
         )
-        time.sleep(1)
+        self.clock.sleep(1)
 
         # To remove potential outliers, take the 0.9 quantile.
         high_loudness = float(
@@ -137,23 +353,31 @@ class Strummer:
 
         return self.motor_controller.get_target_steps()
 
+    def get_next_state(self, action: StrumAction) -> StrumState:
+        """The state that strum() or mute() would move to from the current one."""
+        return NEXT_STATE[action][self.strum_state]
+
     def strum(self) -> None:
-        target_state: dict[StrumState, StrumState] = {
-            "upstroke": "downstroke",
-            "upstroke_mute": "downstroke",
-            "downstroke": "upstroke",
-            "downstroke_mute": "upstroke",
-        }
-        self.set_strum_state(target_state[self.strum_state])
+        self.set_strum_state(self.get_next_state("strum"))
 
     def mute(self) -> None:
-        target_state: dict[StrumState, StrumState] = {
-            "upstroke": "upstroke_mute",
-            "upstroke_mute": "upstroke_mute",
-            "downstroke": "downstroke_mute",
-            "downstroke_mute": "downstroke_mute",
-        }
-        self.set_strum_state(target_state[self.strum_state])
+        self.set_strum_state(self.get_next_state("mute"))
+
+    def _wait_until_quiet(self, timeout_sec: float = 5.0):
+        """Wait for the string to stop ringing, so that the next pluck stands out.
+
+        Before calibrating, we don't know what quiet is, so we don't wait.
+        """
+        if self.calibration is None:
+            return
+
+        low = self.calibration.low_loudness
+        threshold = low + 0.2 * (self.calibration.high_loudness - low)
+        deadline = self.clock.monotonic() + timeout_sec
+        while self.loudness_detector.measure_loudness() > threshold:
+            if self.clock.monotonic() > deadline:
+                logger.warning("The string didn't stop ringing, continuing anyway")
+                break
 
     def set_strum_state(self, state: StrumState) -> None:
         assert state != "unknown"
@@ -167,11 +391,28 @@ class Strummer:
         # What's tricky here is that the angle that you need to rotate depends
         # on the tension of the string. A loose string (lower frequency) will be
         # held longer by the pick, meaning you need to turn more for the pluck
-        # to happen.
+        # to happen. The offset table accounts for that if we have one, the manual
+        # offsets are on top of it.
+        upstroke_offset, downstroke_offset = self._get_frequency_offsets()
+        upstroke = self.calibration.upstroke_steps + round(upstroke_offset)
+        downstroke = self.calibration.downstroke_steps + round(downstroke_offset)
         return {
-            "upstroke": self.calibration.upstroke_steps + self.upstroke_offset,
-            "downstroke": self.calibration.downstroke_steps + self.downstroke_offset,
+            "upstroke": upstroke + self.upstroke_offset,
+            "downstroke": downstroke + self.downstroke_offset,
             # unused atm:
-            "upstroke_mute": self.calibration.downstroke_steps + 5,
-            "downstroke_mute": self.calibration.downstroke_steps + 6,
+            "upstroke_mute": downstroke + 5,
+            "downstroke_mute": downstroke + 6,
         }[state]
+
+    def _get_frequency_offsets(self) -> tuple[float, float]:
+        """How far the plucks have moved since calibrating, see StrumOffsetTable."""
+        assert self.calibration is not None
+        if (
+            self.offset_table is None
+            or self.frequency is None
+            or self.calibration.frequency is None
+        ):
+            return 0.0, 0.0
+        return self.offset_table.get_offsets(
+            self.frequency, reference_frequency=self.calibration.frequency
+        )
@@ -1,15 +1,27 @@
 import logging
+import zlib
 
 import dash
 import flask
-import requests
+from pydantic import ValidationError
 
-from autoguitar.dashboard.event_storage import EVENT_STORAGE, EventKind
+from autoguitar.dashboard.event_storage import (
+    EVENT_BATCH_ADAPTER,
+    EVENT_STORAGE,
+    EventKind,
+)
 from autoguitar.dashboard.layout import LAYOUT
+from autoguitar.dashboard.telemetry import TelemetryClient
 
 PORT = 8111
+# Larger batches are rejected, split them up
+MAX_EVENTS_PER_REQUEST = 10000
+# Of a request's body, before and after decompressing it. An event is at most a few
+# hundred bytes, so this leaves plenty of room for MAX_EVENTS_PER_REQUEST of them.
+MAX_REQUEST_SIZE_BYTES = 32 * 2**20
 
 server = flask.Flask(__name__)
+server.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_SIZE_BYTES
 logger = logging.getLogger(__name__)
 
 
@@ -26,25 +38,59 @@ def event():
     value = data["value"]
 
     EVENT_STORAGE.add_event(kind=kind, value=value)
-    print(
-        EVENT_STORAGE.get_events()[-1],
-        f", total # events = {len(EVENT_STORAGE.get_events())   }",
-    )
 
     return "Event received!"
 
 
-def post_event(kind: EventKind, value: dict):
+@server.route("/api/events", methods=["POST"])
+def events():
+    """Batch version of /api/event, used by TelemetryClient.
+
+    The body is either a JSON list of events ({"kind", "value"}), or an object with
+    the list under "events". It can be gzip-compressed, with Content-Encoding: gzip.
+    The whole batch is validated first and if any event is invalid, none are added.
+    """
+    body = flask.request.get_data()
+    if flask.request.content_encoding == "gzip":
+        # With a limit, a small body can't decompress to gigabytes
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_REQUEST_SIZE_BYTES)
+        except zlib.error as e:
+            return {"error": f"Invalid gzip data: {e}"}, 400
+        if decompressor.unconsumed_tail:
+            return {"error": f"At most {MAX_REQUEST_SIZE_BYTES} bytes per request"}, 413
+        if not decompressor.eof:
+            return {"error": "Invalid gzip data: truncated"}, 400
+
     try:
-        response = requests.post(
-            f"http://localhost:{PORT}/api/event",
-            json={"kind": kind, "value": value},
-            timeout=2,
-        )
-        if response.status_code != 200:
-            raise RuntimeError(f"Failed to post event: {response.text}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to post event: {e}")
+        data = flask.json.loads(body)
+    except ValueError as e:
+        return {"error": f"Invalid JSON: {e}"}, 400
+
+    if isinstance(data, dict):
+        data = data.get("events")
+    if not isinstance(data, list):
+        return {"error": 'Expected a list of events or {"events": [...]}'}, 400
+    if len(data) > MAX_EVENTS_PER_REQUEST:
+        return {"error": f"At most {MAX_EVENTS_PER_REQUEST} events per request"}, 413
+
+    try:
+        events = EVENT_BATCH_ADAPTER.validate_python(data)
+    except ValidationError as e:
+        return {"error": e.errors(include_url=False, include_input=False)}, 400
+
+    EVENT_STORAGE.add_events(events)
+
+    return {"n_received": len(events)}
+
+
+TELEMETRY_CLIENT = TelemetryClient(f"http://localhost:{PORT}/api/events")
+
+
+def post_event(kind: EventKind, value: dict):
+    """Send an event to the dashboard in the background. Never blocks."""
+    TELEMETRY_CLIENT.post(kind=kind, value=value)
 
 
 if __name__ == "__main__":
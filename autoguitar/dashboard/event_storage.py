@@ -1,14 +1,36 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Literal
+from typing import IO, Any, Deque, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
+from autoguitar.signal import Signal
 from autoguitar.time_sync import UnixTimestamp, get_network_datetime
 
+logger = logging.getLogger(__name__)
+
 LOG_DIR = Path(__file__).parents[2] / "data" / "tuning_data"
 
 
 EventKind = Literal["tuner", "all_motors_status", "model_based_tuner_strategy"]
+# When to fsync() the log file: never (leave it to the OS), after every batch that
+# is written, or at most every `fsync_interval_sec`
+FsyncPolicy = Literal["never", "batch", "interval"]
+
+
+class Event(BaseModel):
+    kind: EventKind
+    value: dict
+
+
+# Validates a whole batch in one go, see /api/events
+EVENT_BATCH_ADAPTER = TypeAdapter(list[Event])
 
 
 class AnnotatedEvent(BaseModel):
@@ -17,24 +39,220 @@ class AnnotatedEvent(BaseModel):
     value: dict
 
 
+class EventStorageStats(BaseModel):
+    n_ingested: int = 0
+    # Events removed from memory because they were too old or there were too many.
+    # They're still in the log file.
+    n_evicted: int = 0
+    # Events that never made it to the log file, because the writer couldn't keep
+    # up or the write failed
+    n_dropped: int = 0
+    n_written: int = 0
+    n_flushes: int = 0
+    n_fsyncs: int = 0
+    n_write_errors: int = 0
+    last_flush_duration_sec: float = 0.0
+
+
 class EventStorage:
-    def __init__(self):
-        self.events = []
-        LOG_DIR.mkdir(parents=True, exist_ok=True)
+    """Keeps the recent events in memory for the dashboard and logs all of them.
+
+    add_event() only appends to two bounded in-memory queues: the events shown by
+    the dashboard, which keeps the last `retention_sec`, and the events waiting to
+    be written. A background thread appends the waiting events to a JSONL file in
+    batches, whenever `flush_batch_size` of them have accumulated or
+    `flush_interval_sec` has passed, over a file that stays open.
+
+    Args:
+        log_dir: Where to create the log file.
+        retention_sec: How long to keep events in memory.
+        max_events: At most this many events are kept in memory, even if they are
+            more recent than `retention_sec`.
+        flush_batch_size: Write as soon as this many events are waiting.
+        flush_interval_sec: Otherwise, write the waiting events this often.
+        max_pending_events: How many events can wait to be written before we start
+            dropping the oldest ones, e.g. if the disk is stuck.
+        fsync_policy: See FsyncPolicy. fsync() makes sure the events survive a power
+            loss, but on an SD card, it's slow.
+        fsync_interval_sec: For the "interval" policy.
+        autostart: Start the writer thread on the first add_event(). If False, call
+            start() manually, or flush().
+    """
+
+    def __init__(
+        self,
+        log_dir: Path = LOG_DIR,
+        retention_sec: float = 60.0,
+        max_events: int = 100_000,
+        flush_batch_size: int = 500,
+        flush_interval_sec: float = 1.0,
+        max_pending_events: int = 100_000,
+        fsync_policy: FsyncPolicy = "never",
+        fsync_interval_sec: float = 10.0,
+        autostart: bool = True,
+    ):
+        self.retention = timedelta(seconds=retention_sec)
+        self.flush_batch_size = flush_batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self.fsync_policy = fsync_policy
+        self.fsync_interval_sec = fsync_interval_sec
+        self.autostart = autostart
+
+        self.events: Deque[AnnotatedEvent] = deque(maxlen=max_events)
+        self.pending: Deque[AnnotatedEvent] = deque(maxlen=max_pending_events)
+        self.stats = EventStorageStats()
+        self.on_event: Signal[AnnotatedEvent] = Signal()
+
+        log_dir.mkdir(parents=True, exist_ok=True)
         filename = get_network_datetime().strftime("%Y-%m-%d_%H-%M-%S") + ".jsonl"
-        self.log_file_path = LOG_DIR / filename
+        self.log_file_path = log_dir / filename
+
+        self._lock = threading.Lock()
+        # Held while writing, so that flush() and the writer thread don't interleave
+        self._write_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._file: IO[str] | None = None
+        self._last_fsync_time = time.monotonic()
 
     def add_event(self, kind: EventKind, value: dict):
-        annotated_event = AnnotatedEvent(
-            added_at_network_timestamp=get_network_datetime(), kind=kind, value=value
-        )
-        self.events.append(annotated_event)
-        # append to logfile
-        with open(self.log_file_path, "a") as f:
-            f.write(annotated_event.model_dump_json() + "\n")
-
-    def get_events(self):
-        return self.events
+        self.add_events([Event(kind=kind, value=value)])
+
+    def add_events(self, events: list[Event]):
+        """Add a batch of events at once. They all get the same timestamp."""
+        added_at = get_network_datetime()
+        # The events are already validated, no need to do it again
+        annotated_events = [
+            AnnotatedEvent.model_construct(
+                added_at_network_timestamp=added_at, kind=event.kind, value=event.value
+            )
+            for event in events
+        ]
+
+        with self._lock:
+            for annotated_event in annotated_events:
+                self._append(annotated_event)
+            self._evict_old_events(added_at)
+            n_pending = len(self.pending)
+
+        for annotated_event in annotated_events:
+            self.on_event.notify(annotated_event)
+        if n_pending >= self.flush_batch_size:
+            self._flush_requested.set()
+        if self._thread is None and self.autostart:
+            self.start()
+
+    def _append(self, event: AnnotatedEvent):
+        """Call with the lock held."""
+        if len(self.events) == self.events.maxlen:
+            self.stats.n_evicted += 1
+        self.events.append(event)
+
+        if len(self.pending) == self.pending.maxlen:
+            self.stats.n_dropped += 1
+        self.pending.append(event)
+        self.stats.n_ingested += 1
+
+    def _evict_old_events(self, now: datetime):
+        """Call with the lock held."""
+        while self.events and (
+            self.events[0].added_at_network_timestamp < now - self.retention
+        ):
+            self.events.popleft()
+            self.stats.n_evicted += 1
+
+    def get_events(self) -> list[AnnotatedEvent]:
+        """The events from the last `retention_sec`, oldest first."""
+        with self._lock:
+            return list(self.events)
+
+    def get_stats(self) -> EventStorageStats:
+        with self._lock:
+            return self.stats.model_copy()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def close(self, timeout_sec: float = 5.0):
+        """Stop the writer thread and write what's left."""
+        thread = self._thread
+        if thread is not None:
+            self._stop_event.set()
+            self._flush_requested.set()
+            thread.join(timeout=timeout_sec)
+            self._thread = None
+            atexit.unregister(self.close)
+
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type: type, exc_val: Exception, exc_tb: Any):
+        self.close()
+
+    def _run(self):
+        while True:
+            self._flush_requested.wait(self.flush_interval_sec)
+            self._flush_requested.clear()
+            stopping = self._stop_event.is_set()
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self):
+        """Write the events that are waiting, right now."""
+        with self._write_lock:
+            with self._lock:
+                batch = list(self.pending)
+                self.pending.clear()
+            if not batch:
+                return
+
+            start_time = time.monotonic()
+            try:
+                self._write(batch)
+            except OSError as e:
+                logger.error(f"Failed to write {len(batch)} events: {e}")
+                with self._lock:
+                    self.stats.n_write_errors += 1
+                    self.stats.n_dropped += len(batch)
+                return
+
+            with self._lock:
+                self.stats.n_written += len(batch)
+                self.stats.n_flushes += 1
+                self.stats.last_flush_duration_sec = time.monotonic() - start_time
+
+    def _write(self, batch: list[AnnotatedEvent]):
+        """Call with the write lock held."""
+        if self._file is None:
+            self._file = self.log_file_path.open("a")
+
+        self._file.write("".join(event.model_dump_json() + "\n" for event in batch))
+        self._file.flush()
+
+        now = time.monotonic()
+        if self.fsync_policy == "batch" or (
+            self.fsync_policy == "interval"
+            and now - self._last_fsync_time >= self.fsync_interval_sec
+        ):
+            os.fsync(self._file.fileno())
+            self._last_fsync_time = now
+            with self._lock:
+                self.stats.n_fsyncs += 1
 
 
 EVENT_STORAGE = EventStorage()
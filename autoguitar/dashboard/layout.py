@@ -1,17 +1,21 @@
+import functools
+
 import dash
 import librosa
-import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 import plotly.subplots
-from dash import Input, Output, callback
+from dash import Input, Output, State, callback
 
 from autoguitar.dashboard.event_storage import EVENT_STORAGE, AnnotatedEvent
-from autoguitar.motor import AllMotorsStatus
+from autoguitar.dashboard.series_window import SeriesWindow
 from autoguitar.time_sync import unix_to_datetime
 
 NOTES_ON_Y_AXIS = "Notes on y-axis"
 
+# One per trace of the plot, in order
+FREQUENCY_SERIES = "frequency"
+CUR_STEPS_SERIES = "cur steps"
+
 LAYOUT = dash.html.Div(
     children=[
         dash.dcc.Checklist(
@@ -22,58 +26,60 @@ LAYOUT = dash.html.Div(
         dash.dcc.Graph(id="pitch-graph"),
         dash.html.Div(id="debug-div", children="This is the Dash app."),
         dash.dcc.Interval(id="interval-component", interval=1 * 1000, n_intervals=0),
+        # The sequence number of the last point in the browser's copy of the plot
+        dash.dcc.Store(id="last-sequence-number", data=None),
     ]
 )
 
 
-def events_to_df(events: list[AnnotatedEvent]) -> pd.DataFrame:
-    rows = []
-    for event in events:
-        if event.kind == "tuner":
-            rows.append(
-                {
-                    "datetime": unix_to_datetime(event.value["network_timestamp"]),
-                    "kind": "tuner",
-                    "frequency": event.value["frequency"],
-                }
-            )
-        if event.kind == "all_motors_status":
-            rows.append(
-                {
-                    "datetime": unix_to_datetime(event.value["network_timestamp"]),
-                    "kind": "all_motors_status",
-                    "cur_steps": event.value["status"][0]["cur_steps"],
-                    "target_steps": event.value["status"][0]["target_steps"],
-                }
-            )
-
-    return pd.DataFrame(rows)
-
-
-def make_frequency_plot(df: pd.DataFrame, use_note_labels: bool = False):
-    # only take last 30 seconds
-    df = df.loc[df["datetime"] > df["datetime"].max() - pd.Timedelta(seconds=30)]
+def add_event_to_window(window: SeriesWindow, event: AnnotatedEvent):
+    if event.kind == "tuner":
+        window.add_point(
+            FREQUENCY_SERIES,
+            unix_to_datetime(event.value["network_timestamp"]),
+            event.value["frequency"],
+        )
+    if event.kind == "all_motors_status":
+        window.add_point(
+            CUR_STEPS_SERIES,
+            unix_to_datetime(event.value["network_timestamp"]),
+            event.value["status"][0]["cur_steps"],
+        )
+
+
+WINDOW = SeriesWindow(names=[FREQUENCY_SERIES, CUR_STEPS_SERIES], window_sec=30.0)
+EVENT_STORAGE.on_event.subscribe(functools.partial(add_event_to_window, WINDOW))
+
+
+@functools.cache
+def get_note_ticks() -> tuple[list[float], list[str]]:
+    y_ticks = [float(librosa.midi_to_hz(y)) for y in range(0, 128)]
+    y_tick_labels = [librosa.hz_to_note(freq) for freq in y_ticks]
+    return y_ticks, y_tick_labels
 
+
+def make_frequency_plot(
+    window: SeriesWindow, until: int, use_note_labels: bool = False
+):
+    """The whole plot, with all the points in the window.
+
+    Only needed when a page is loaded or the y-axis changes, otherwise the plot is
+    extended with get_extend_data().
+    """
     fig = plotly.subplots.make_subplots(specs=[[{"secondary_y": True}]])
 
-    fig.add_trace(
-        go.Scatter(
-            x=df.loc[df["kind"] == "tuner"]["datetime"],
-            y=df.loc[df["kind"] == "tuner"]["frequency"],
-            mode="lines",
-            name="frequency",
-        )
-    )
+    x, y = window.get_points(FREQUENCY_SERIES, until=until)
+    fig.add_trace(go.Scatter(x=x, y=y, mode="lines", name=FREQUENCY_SERIES))
 
     # add motor events
-    motor_events = df.loc[df["kind"] == "all_motors_status"]
+    x, y = window.get_points(CUR_STEPS_SERIES, until=until)
     fig.add_trace(
         go.Scatter(
-            x=motor_events["datetime"],
-            y=motor_events["cur_steps"],
+            x=x,
+            y=y,
             mode="lines",
             marker=dict(color="red"),
-            name="cur steps",
+            name=CUR_STEPS_SERIES,
         ),
         secondary_y=True,
     )
@@ -84,8 +90,7 @@ def make_frequency_plot(df: pd.DataFrame, use_note_labels: bool = False):
     )
 
     if use_note_labels:
-        y_ticks = [librosa.midi_to_hz(y) for y in range(0, 128)]
-        y_tick_labels = [librosa.hz_to_note(freq) for freq in y_ticks]
+        y_ticks, y_tick_labels = get_note_ticks()
 
         fig.update_layout(
             yaxis=dict(
@@ -104,25 +109,55 @@ def make_frequency_plot(df: pd.DataFrame, use_note_labels: bool = False):
             yaxis=dict(title="Frequency (Hz)"),
         )
 
+    # This makes it so that if you zoom in, the zoom level is preserved on updates. See
+    # https://community.plotly.com/t/preserving-ui-state-like-zoom-in-dcc-graph-with-uirevision-with-dash/15793/19
+    fig.layout.update({"uirevision": "some fixed value"})
+
     return fig
 
 
+def get_extend_data(window: SeriesWindow, after: int, until: int) -> list:
+    """The points added after `after`, in the format of Graph.extendData.
+
+    The browser also drops the points that are no longer in the window.
+    """
+    xs, ys = zip(
+        *(window.get_points(name, after=after, until=until) for name in window.names)
+    )
+    lengths = window.get_lengths()
+    return [
+        {"x": list(xs), "y": list(ys)},
+        list(range(len(window.names))),
+        {"x": lengths, "y": lengths},
+    ]
+
+
 @callback(
     Output("pitch-graph", "figure"),
+    Output("pitch-graph", "extendData"),
+    Output("last-sequence-number", "data"),
     Output("debug-div", "children"),
     Input("interval-component", "n_intervals"),
     Input("y-axis-dropdown", "value"),
+    State("last-sequence-number", "data"),
 )
-def update_graph(n: int, y_axis_values: list[str]):
-    events = EVENT_STORAGE.get_events()
-    df = events_to_df(events)
+def update_graph(n: int, y_axis_values: list[str], last_sequence_number: int | None):
+    sequence_number = WINDOW.get_last_sequence_number()
+    n_events = EVENT_STORAGE.get_stats().n_ingested
+    debug_text = f"Number of events: {n_events}" if n_events else "No events yet."
+
+    if last_sequence_number is None or dash.ctx.triggered_id == "y-axis-dropdown":
+        fig = make_frequency_plot(
+            WINDOW,
+            until=sequence_number,
+            use_note_labels=y_axis_values == [NOTES_ON_Y_AXIS],
+        )
+        return fig, dash.no_update, sequence_number, debug_text
 
-    if df.empty:
-        return (px.line(title="Frequency over time"), "No events yet.")
+    if sequence_number == last_sequence_number:
+        return dash.no_update, dash.no_update, sequence_number, debug_text
 
-    fig = make_frequency_plot(df, use_note_labels=y_axis_values == [NOTES_ON_Y_AXIS])
-    # This makes it so that if you zoom in, the zoom level is preserved on updates. See
-    # https://community.plotly.com/t/preserving-ui-state-like-zoom-in-dcc-graph-with-uirevision-with-dash/15793/19
-    fig.layout.update({"uirevision": "some fixed value"})
-
-    return fig, f"Number of events: {len(events)}"
+    extend_data = get_extend_data(
+        WINDOW, after=last_sequence_number, until=sequence_number
+    )
+    return dash.no_update, extend_data, sequence_number, debug_text
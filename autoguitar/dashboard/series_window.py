@@ -0,0 +1,94 @@
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque
+
+
+class _Series:
+    def __init__(self):
+        # Columns, one entry per point
+        self.sequence_numbers: Deque[int] = deque()
+        self.x: Deque[datetime] = deque()
+        self.y: Deque[float] = deque()
+
+
+class SeriesWindow:
+    """The points of several time series from the last `window_sec`.
+
+    Points are added one at a time as events come in and dropped once they're out of
+    the window, so the cost of an update doesn't depend on how long the session has
+    been running. Every point gets an increasing sequence number, so that a client
+    that has seen the points up to some sequence number can ask for just the new
+    ones.
+
+    Args:
+        names: The series.
+        window_sec: How far back from the most recent point to keep points.
+    """
+
+    def __init__(self, names: list[str], window_sec: float = 30.0):
+        self.names = names
+        self.window = timedelta(seconds=window_sec)
+        self._series = {name: _Series() for name in names}
+        self._last_sequence_number = 0
+        self._latest_x: datetime | None = None
+        self._lock = threading.Lock()
+
+    def add_point(self, name: str, x: datetime, y: float):
+        with self._lock:
+            self._last_sequence_number += 1
+            series = self._series[name]
+            series.sequence_numbers.append(self._last_sequence_number)
+            series.x.append(x)
+            series.y.append(y)
+
+            if self._latest_x is None or x > self._latest_x:
+                self._latest_x = x
+            self._drop_old_points()
+
+    def _drop_old_points(self):
+        """Call with the lock held."""
+        assert self._latest_x is not None
+        start = self._latest_x - self.window
+        for series in self._series.values():
+            while series.x and series.x[0] < start:
+                series.sequence_numbers.popleft()
+                series.x.popleft()
+                series.y.popleft()
+
+    def get_last_sequence_number(self) -> int:
+        """Of the last point added, 0 if there are none."""
+        with self._lock:
+            return self._last_sequence_number
+
+    def get_points(
+        self, name: str, after: int = 0, until: int | None = None
+    ) -> tuple[list[datetime], list[float]]:
+        """The (x, y) columns of the points with a sequence number above `after`.
+
+        Pass `until` from get_last_sequence_number() to not get points that were
+        added in the meantime, which the next call with `after=until` would return
+        again.
+        """
+        with self._lock:
+            series = self._series[name]
+            # New points are at the end, so this only looks at the ones we return
+            x, y = [], []
+            for sequence_number, point_x, point_y in zip(
+                reversed(series.sequence_numbers),
+                reversed(series.x),
+                reversed(series.y),
+            ):
+                if sequence_number <= after:
+                    break
+                if until is not None and sequence_number > until:
+                    continue
+                x.append(point_x)
+                y.append(point_y)
+
+        return x[::-1], y[::-1]
+
+    def get_lengths(self) -> list[int]:
+        """The number of points in each series."""
+        with self._lock:
+            return [len(self._series[name].x) for name in self.names]
@@ -0,0 +1,186 @@
+import atexit
+import gzip
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque
+
+import requests
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryStats(BaseModel):
+    n_enqueued: int = 0
+    # Events thrown away because the queue was full
+    n_dropped: int = 0
+    n_sent: int = 0
+    # Events that we tried to send, but the request failed
+    n_failed: int = 0
+    n_batches: int = 0
+
+
+class TelemetryClient:
+    """Sends events to the dashboard without blocking the caller.
+
+    post() only appends to a bounded in-memory queue. A background thread sends the
+    queued events in batches over a persistent (keep-alive) connection. If the
+    dashboard is down or slow, the queue fills up and the oldest events are
+    dropped, so telemetry can never stall tuning.
+
+    Args:
+        url: The batch endpoint, which accepts {"events": [{"kind", "value"}, ...]}.
+        max_queue_size: How many events to keep before dropping the oldest ones.
+        max_batch_size: Maximum number of events per request.
+        flush_interval_sec: How long to wait for more events before sending a
+            batch that is not full.
+        timeout_sec: Timeout of a single request.
+        max_backoff_sec: After failed requests, we wait exponentially longer
+            before trying again, up to this long.
+        autostart: Start the sender thread on the first post(). If False, call
+            start() manually.
+        compress: Send the batches gzip-compressed. Worth it for large batches
+            over a slow network.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_queue_size: int = 10000,
+        max_batch_size: int = 200,
+        flush_interval_sec: float = 0.1,
+        timeout_sec: float = 2.0,
+        max_backoff_sec: float = 5.0,
+        autostart: bool = True,
+        compress: bool = False,
+    ):
+        self.url = url
+        self.max_batch_size = max_batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self.timeout_sec = timeout_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.autostart = autostart
+        self.compress = compress
+        # Set to False to discard events, e.g. when replaying recorded sessions
+        self.enabled = True
+
+        self.queue: Deque[dict[str, Any]] = deque(maxlen=max_queue_size)
+        self.stats = TelemetryStats()
+        self._lock = threading.Lock()
+        self._has_events = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def post(self, kind: str, value: dict):
+        """Queue an event to be sent. Never blocks on the network."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if len(self.queue) == self.queue.maxlen:
+                self.stats.n_dropped += 1
+            self.queue.append({"kind": kind, "value": value})
+            self.stats.n_enqueued += 1
+
+        self._has_events.set()
+        if self._thread is None and self.autostart:
+            self.start()
+
+    def get_stats(self) -> TelemetryStats:
+        with self._lock:
+            return self.stats.model_copy()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def close(self, timeout_sec: float = 1.0):
+        """Stop the sender thread, trying to send what's left in the queue first."""
+        thread = self._thread
+        if thread is None:
+            return
+
+        self._stop_event.set()
+        self._has_events.set()
+        thread.join(timeout=timeout_sec)
+        self._thread = None
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type: type, exc_val: Exception, exc_tb: Any):
+        self.close()
+
+    def _run(self):
+        backoff_sec = 0.0
+
+        with requests.Session() as session:
+            while True:
+                self._has_events.wait()
+                stopping = self._stop_event.is_set()
+                if not stopping:
+                    # Give other events a chance to arrive so that we send fewer,
+                    # larger requests
+                    self._stop_event.wait(self.flush_interval_sec)
+
+                batch = self._pop_batch()
+                if not batch:
+                    if stopping:
+                        return
+                    continue
+
+                if self._send(session, batch):
+                    backoff_sec = 0.0
+                else:
+                    if stopping:
+                        return
+                    backoff_sec = min(
+                        max(2 * backoff_sec, self.flush_interval_sec),
+                        self.max_backoff_sec,
+                    )
+                    self._stop_event.wait(backoff_sec)
+
+    def _pop_batch(self) -> list[dict[str, Any]]:
+        with self._lock:
+            n = min(len(self.queue), self.max_batch_size)
+            batch = [self.queue.popleft() for _ in range(n)]
+            if not self.queue:
+                self._has_events.clear()
+        return batch
+
+    def _send(self, session: requests.Session, batch: list[dict[str, Any]]) -> bool:
+        try:
+            if self.compress:
+                response = session.post(
+                    self.url,
+                    data=gzip.compress(json.dumps({"events": batch}).encode()),
+                    headers={
+                        "Content-Type": "application/json",
+                        "Content-Encoding": "gzip",
+                    },
+                    timeout=self.timeout_sec,
+                )
+            else:
+                response = session.post(
+                    self.url, json={"events": batch}, timeout=self.timeout_sec
+                )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to send {len(batch)} events: {e}")
+            with self._lock:
+                self.stats.n_failed += len(batch)
+            return False
+
+        with self._lock:
+            self.stats.n_sent += len(batch)
+            self.stats.n_batches += 1
+        return True
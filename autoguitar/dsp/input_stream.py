@@ -11,6 +11,7 @@ import sounddevice as sd  # pyright: ignore[reportMissingTypeStubs]
 from pydantic import BaseModel
 
 from autoguitar.signal import Signal
+from autoguitar.time_sync import ClockMapping
 
 Timestamp = float  # A result of time.time()
 
@@ -58,6 +59,11 @@ class InputStream:
 
         self.on_reading: Signal[InputStreamCallbackData] = Signal()
 
+        # PortAudio timestamps are in its own time domain. We keep track of how it
+        # relates to time.monotonic(), which is what the motors use. Fitted over
+        # the last ~10s of callbacks, which averages out the scheduling jitter.
+        self.adc_to_monotonic_mapping = ClockMapping(max_samples=1000)
+
     def __enter__(self):
         self.stream = sd.InputStream(
             callback=self._input_stream_callback,
@@ -75,16 +81,25 @@ class InputStream:
         self.stream.__exit__()
 
     def _input_stream_callback(
-        self, indata: np.ndarray, frames: int, time: Any, status: sd.CallbackFlags
+        self,
+        indata: np.ndarray,
+        frames: int,
+        time_info: Any,  # see sounddevice docs
+        status: sd.CallbackFlags,
     ):
         assert self.stream is not None, "Stream should be initialized"
+        # Both of these are "now", just in different time domains
+        self.adc_to_monotonic_mapping.add_sample(
+            source=time_info.currentTime, target=time.monotonic()
+        )
+
         indata = indata.copy()
         # time = time.copy()
         status = deepcopy(status)
         data = InputStreamCallbackData(
             indata=indata,
             frames=frames,
-            timestamp=time.inputBufferAdcTime,
+            timestamp=time_info.inputBufferAdcTime,
             status=status,
         )
         self.readings.append(data)
@@ -115,7 +130,38 @@ class InputStream:
             print(".", end="", flush=True, file=sys.stderr)
         print("done.")
 
-    def get_latest_audio(self, max_n_samples: int) -> np.ndarray:
+    def adc_to_monotonic(self, timestamp: float) -> float:
+        """Convert a timestamp from the audio stream to time.monotonic() time."""
+        return self.adc_to_monotonic_mapping(timestamp)
+
+    def get_audio_since(
+        self, start: float, channel: int = 0
+    ) -> tuple[np.ndarray, float] | None:
+        """Get the audio from `start` on, as far back as the history goes.
+
+        Args:
+            start: In time.monotonic() time, like the motors' step history.
+            channel: Which channel to return.
+
+        Returns:
+            The audio as a 1D array and the time.monotonic() time of its first
+            sample, or None if there is no audio after `start` yet. If blocks were
+            dropped, the audio after the gap is shifted, so keep `start` recent.
+        """
+        assert self.stream is not None
+        block_duration = self.block_size / self.stream.samplerate
+        blocks = [
+            data
+            for data in list(self.readings)
+            if self.adc_to_monotonic(data.timestamp) + block_duration > start
+        ]
+        if not blocks:
+            return None
+
+        y = np.concatenate([data.indata[:, channel] for data in blocks])
+        return y, self.adc_to_monotonic(blocks[0].timestamp)
+
+    def get_latest_audio(self, max_n_samples: int, channel: int = 0) -> np.ndarray:
         """Get the latest audio samples.
 
         Useful if you need a longer sample than the block size.
@@ -123,9 +169,26 @@ class InputStream:
         Args:
             max_n_samples: Maximum number of samples to return. There might be
                 fewer samples available.
+            channel: Which channel to return.
 
         Returns:
             A 1D numpy array with the latest audio samples.
         """
-        y = np.concatenate([data.indata[:, 0] for data in self.readings])
+        return self.get_latest_audio_all_channels(max_n_samples)[:, channel]
+
+    def get_latest_audio_all_channels(self, max_n_samples: int) -> np.ndarray:
+        """Like get_latest_audio(), but returns a (n_samples, n_channels) array."""
+        # Only concatenate the blocks we need
+        blocks = []
+        n_samples = 0
+        for data in reversed(self.readings):
+            if n_samples >= max_n_samples:
+                break
+            blocks.append(data.indata)
+            n_samples += len(data.indata)
+
+        if not blocks:
+            return np.zeros((0, 1), dtype=np.float32)
+
+        y = np.concatenate(blocks[::-1])
         return y[-max_n_samples:]
@@ -1,11 +1,12 @@
 import logging
-import time
 from collections import deque
 from typing import Deque
 
 import librosa
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
+from autoguitar.clock import SYSTEM_CLOCK, Clock
 from autoguitar.dsp.input_stream import InputStream, InputStreamCallbackData
 
 Timestamp = float  # A result of time.time()
@@ -14,8 +15,9 @@ logger = logging.getLogger(__name__)
 
 
 class LoudnessDetector:
-    def __init__(self, input_stream: InputStream):
+    def __init__(self, input_stream: InputStream, clock: Clock = SYSTEM_CLOCK):
         self.input_stream = input_stream
+        self.clock = clock
         self.input_stream.on_reading.subscribe(self._input_stream_callback)
         self.readings: Deque[tuple[float, Timestamp]] = deque(maxlen=100)
 
@@ -37,5 +39,58 @@ class LoudnessDetector:
     def measure_loudness(self, min_readings: int = 2) -> float:
         self.readings.clear()
         while len(self.readings) < min_readings:
-            time.sleep(0.001)
+            self.clock.sleep(0.001)
         return self.get_mean_loudness()
+
+
+def find_onset(
+    y: np.ndarray,
+    frame_length: int = 128,
+    threshold: float = 0.1,
+    min_peak_ratio: float = 3.0,
+    hold_frames: int = 8,
+) -> int | None:
+    """Find where the loudest sound in `y` starts, e.g. a pluck.
+
+    We find the loudest frame and the quietest frame before it, and return the first
+    frame in between that is above `threshold` of the way from the quiet level to the
+    peak. Starting from the quietest frame means that an earlier sound that is still
+    fading out doesn't count as the onset.
+
+    For low notes, a frame is shorter than a period, so the loudness of the frames
+    dips within a single note. To not mistake these dips for silence, the loudness of
+    each frame is the maximum over the last `hold_frames` frames. Looking only
+    backwards doesn't delay the onset.
+
+    Args:
+        y: The audio, 1D.
+        frame_length: Resolution of the loudness envelope, in samples.
+        threshold: From 0 to 1, see above.
+        min_peak_ratio: How much louder the peak must be than the quietest frame
+            before it. Below that, we don't consider it an onset.
+        hold_frames: Should cover a period of the lowest note, the default of
+            1024 samples is 43 Hz at 44.1 kHz.
+
+    Returns:
+        The index of the first sample of the frame where the onset is, or None if
+        there is no clear onset.
+    """
+    n_frames = len(y) // frame_length
+    if n_frames <= hold_frames:
+        return None
+
+    frames = y[: n_frames * frame_length].reshape(n_frames, frame_length)
+    envelope = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    # Frame i of the result is frame i + hold_frames - 1 of the input
+    envelope = sliding_window_view(envelope, hold_frames).max(axis=1)
+    peak = int(np.argmax(envelope))
+    quietest = int(np.argmin(envelope[: peak + 1]))
+    floor = envelope[quietest]
+    if quietest == peak or envelope[peak] < min_peak_ratio * floor:
+        # If the peak is the quietest frame, it's at the very start, i.e. the onset
+        # was before `y`
+        return None
+
+    level = floor + threshold * (envelope[peak] - floor)
+    above = np.flatnonzero(envelope[quietest : peak + 1] >= level)
+    return int(quietest + above[0] + hold_frames - 1) * frame_length
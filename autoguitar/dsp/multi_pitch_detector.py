@@ -0,0 +1,269 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque
+
+import librosa
+import numpy as np
+from pydantic import BaseModel
+
+from autoguitar.dsp.input_stream import InputStream, InputStreamCallbackData
+from autoguitar.dsp.pitch_detector import PitchDetector, Timestamp
+
+logger = logging.getLogger(__name__)
+
+# Width of the transition between the pass band and the stop band of the filters
+TAPER_SEMITONES = 2.0
+
+
+class StringBand(BaseModel):
+    """Where to look for the pitch of one string.
+
+    Note that detect_pitch() discards readings close to max_note, so it should be a
+    few semitones above the highest note the string will be tuned to.
+    """
+
+    min_note: str = "E1"
+    max_note: str = "E3"
+    # If the input has a channel per string (e.g. a hexaphonic pickup), the channel
+    # of this string. If None, the string is separated from the others by keeping
+    # only its frequency band of channel 0.
+    channel: int | None = None
+    # How many harmonics to keep when filtering. YIN is biased on a signal with the
+    # fundamental alone, it needs a few harmonics to be accurate.
+    n_harmonics: int = 4
+
+
+class MultiPitchDetector:
+    """Detects the pitch of several strings from one InputStream.
+
+    Each string gets its own PitchDetector (so its own readings, plausibility checks
+    and on_reading signal), but they share the work that doesn't depend on the
+    string: there's one subscription to the input stream, the audio is fetched once
+    per reading and, for strings that share a channel, one FFT of it is computed and
+    band-limited per string, with the harmonics of the other strings removed.
+
+    Detection is the expensive part and on a Raspberry Pi, there might not be time to
+    run it for every string on every window of audio. Each string wants a reading
+    every `reading_interval_sec`; when several are due, the one that has been waiting
+    the longest goes first (earliest deadline first). If newer audio arrives in the
+    meantime, the remaining strings are processed on that audio instead, and still go
+    first since they're now even more overdue. So when we're short on CPU, all
+    strings slow down equally, rather than some of them never being updated.
+
+    Args:
+        input_stream: Where the audio comes from.
+        bands: One per string.
+        threaded: Like in PitchDetector. If False, detection runs in the input
+            stream callback, which is deterministic with a simulated input stream.
+        reading_interval_sec: How often each string should get a reading. By
+            default, the same rate as a single PitchDetector.
+    """
+
+    def __init__(
+        self,
+        input_stream: InputStream,
+        bands: list[StringBand],
+        threaded: bool = True,
+        reading_interval_sec: float | None = None,
+    ):
+        self.input_stream = input_stream
+        self.bands = bands
+        self.threaded = threaded
+        self.detectors = [
+            PitchDetector(
+                input_stream=input_stream,
+                min_note=band.min_note,
+                max_note=band.max_note,
+                channel=band.channel or 0,
+                subscribe=False,
+            )
+            for band in bands
+        ]
+        self.n_samples_per_reading = self.detectors[0].n_samples_per_reading
+        self.reading_interval_sec = reading_interval_sec
+
+        # In audio (ADC) time, when each string should get its next reading
+        self.next_due: list[float] = [-np.inf] * len(bands)
+        # Audio timestamps of the last few readings per string, to measure the rate
+        self._processed_at: list[Deque[Timestamp]] = [deque(maxlen=20) for _ in bands]
+        # CPU time of the detection per string, exponentially averaged
+        self.mean_detection_sec = [0.0] * len(bands)
+        self._gains: list[np.ndarray | None] = [None] * len(bands)
+
+        self.input_stream.on_reading.subscribe(self._input_stream_callback)
+
+        if not threaded:
+            self.thread = None
+            return
+
+        self._lock = threading.Lock()
+        self._latest_audio: tuple[np.ndarray, Timestamp] | None = None
+        self._has_audio = threading.Event()
+        self.thread = threading.Thread(target=self._process_readings, daemon=True)
+        self.thread.start()
+
+    @property
+    def use_pyin(self) -> bool:
+        return all(detector.use_pyin for detector in self.detectors)
+
+    @use_pyin.setter
+    def use_pyin(self, value: bool):
+        for detector in self.detectors:
+            detector.use_pyin = value
+
+    def get_reading_interval_sec(self) -> float:
+        if self.reading_interval_sec is not None:
+            return self.reading_interval_sec
+
+        assert self.input_stream.stream is not None
+        # Same as the cooldown of PitchDetector
+        return 0.5 * self.n_samples_per_reading / self.input_stream.stream.samplerate
+
+    def get_update_rates(self) -> list[float]:
+        """How many readings per second (of audio) each string has been getting."""
+        rates = []
+        for processed_at in self._processed_at:
+            if len(processed_at) < 2:
+                rates.append(np.nan)
+            else:
+                duration = processed_at[-1] - processed_at[0]
+                rates.append((len(processed_at) - 1) / duration)
+        return rates
+
+    def unsubscribe(self):
+        self.input_stream.on_reading.unsubscribe(self._input_stream_callback)
+
+    def _input_stream_callback(self, callback_data: InputStreamCallbackData):
+        timestamp = callback_data.timestamp
+        if timestamp < min(self.next_due):
+            return  # Nothing to do, don't bother fetching the audio
+
+        y = self.input_stream.get_latest_audio_all_channels(
+            max_n_samples=self.n_samples_per_reading
+        )
+        if len(y) < self.n_samples_per_reading:
+            return
+
+        if not self.threaded:
+            self._process_audio(y, timestamp)
+            return
+
+        # Only the latest audio matters, overwrite whatever wasn't processed yet
+        with self._lock:
+            self._latest_audio = (y, timestamp)
+        self._has_audio.set()
+
+    def _process_readings(self):
+        while self.input_stream.stream is not None:
+            # Use a timeout to re-check whether the input stream has ended
+            if not self._has_audio.wait(timeout=0.5):
+                continue
+
+            with self._lock:
+                latest_audio = self._latest_audio
+                self._latest_audio = None
+                self._has_audio.clear()
+
+            if latest_audio is not None:
+                self._process_audio(*latest_audio)
+
+    def _process_audio(self, y: np.ndarray, timestamp: Timestamp):
+        due = [i for i in range(len(self.bands)) if self.next_due[i] <= timestamp]
+        due.sort(key=lambda i: self.next_due[i])
+        interval_sec = self.get_reading_interval_sec()
+        spectrum = None
+
+        for i in due:
+            start = time.thread_time()
+
+            channel = self.bands[i].channel
+            if channel is not None:
+                y_band = y[:, channel]
+            else:
+                if spectrum is None:
+                    spectrum = np.fft.rfft(y[:, 0], n=2 * len(y))
+                gains = self._get_gains(i) * ~self._get_harmonics_mask(i)
+                y_band = np.fft.irfft(spectrum * gains)[: len(y)]
+
+            self.detectors[i].process_audio(y_band.astype(np.float32), timestamp)
+
+            self.next_due[i] = timestamp + interval_sec
+            self._processed_at[i].append(timestamp)
+            elapsed = time.thread_time() - start
+            self.mean_detection_sec[i] += 0.1 * (elapsed - self.mean_detection_sec[i])
+
+            if self.threaded and self._has_audio.is_set():
+                # Newer audio arrived. The remaining strings are now the most
+                # overdue ones, so they'll be first on the new audio.
+                break
+
+        if sum(self.mean_detection_sec) > interval_sec:
+            logger.debug(
+                f"Detection takes {sum(self.mean_detection_sec):.3f}s for all strings, "
+                f"more than the reading interval of {interval_sec:.3f}s"
+            )
+
+    def _get_frequencies(self) -> np.ndarray:
+        """The frequencies of the FFT bins.
+
+        The FFT is zero-padded to twice the length of the audio, so that filtering
+        doesn't wrap the end of the window around to its start.
+        """
+        assert self.input_stream.stream is not None
+        return np.fft.rfftfreq(
+            2 * self.n_samples_per_reading, d=1 / self.input_stream.stream.samplerate
+        )
+
+    def _get_harmonics_mask(self, i: int) -> np.ndarray:
+        """FFT bins with harmonics of the other strings on the same channel.
+
+        A string's harmonics can be in another string's band, e.g. the second
+        harmonic of a C2 string is in the band of an A2 string. We remove them based
+        on the other strings' latest readings. Until every string has a reading,
+        the readings can be off.
+        """
+        frequencies = self._get_frequencies()
+        bin_width = frequencies[1]
+        mask = np.zeros_like(frequencies, dtype=bool)
+        # Only the harmonics in this string's band matter
+        band_frequencies = frequencies[self._get_gains(i) > 0]
+        low, high = band_frequencies[0], band_frequencies[-1]
+
+        for j, detector in enumerate(self.detectors):
+            if j == i or self.bands[j].channel is not None:
+                continue
+            frequency, _ = detector.get_frequency()
+            if np.isnan(frequency):
+                continue
+
+            first = max(1, int(np.floor(low / frequency)))
+            last = int(np.ceil(high / frequency))
+            for harmonic in np.arange(first, last + 1) * frequency:
+                # Real strings are slightly inharmonic, so leave some room
+                half_width = max(2 * bin_width, 0.03 * harmonic)
+                mask |= np.abs(frequencies - harmonic) <= half_width
+
+        return mask
+
+    def _get_gains(self, i: int) -> np.ndarray:
+        """The band-pass filter of string i, per FFT bin. Computed on first use.
+
+        The edges are tapered over a few semitones. A brick-wall filter would make
+        the filtered signal ring, which biases the pitch estimate.
+        """
+        gains = self._gains[i]
+        if gains is None:
+            band = self.bands[i]
+            log_frequencies = np.log2(np.maximum(self._get_frequencies(), 1e-3))
+            low = np.log2(librosa.note_to_hz(band.min_note))
+            high = np.log2(band.n_harmonics * librosa.note_to_hz(band.max_note))
+            taper = TAPER_SEMITONES / 12
+
+            # 0 outside of the band, 1 inside, raised cosine in between
+            distance_outside = np.maximum(low - log_frequencies, log_frequencies - high)
+            ramp = np.clip(distance_outside / taper, 0, 1)
+            gains = 0.5 * (1 + np.cos(np.pi * ramp))
+            self._gains[i] = gains
+        return gains
@@ -0,0 +1,176 @@
+import logging
+from collections import deque
+from typing import Deque
+
+import numpy as np
+
+from autoguitar.dsp.input_stream import InputStream, InputStreamCallbackData
+from autoguitar.signal import Signal
+
+Timestamp = float  # A result of time.time()
+
+logger = logging.getLogger(__name__)
+
+
+class OnsetDetector:
+    """Detects plucks in real time, from the spectral flux of the incoming audio.
+
+    The audio is cut into overlapping frames every `hop_length` samples. The flux of
+    a frame is how much its (log-compressed) magnitude spectrum is above those of
+    the previous frames, averaged over frequencies up to `max_frequency`. A pluck
+    adds energy to all of the string's partials at once, so the flux jumps, while a
+    ringing string only slowly loses energy. An onset is a frame whose flux rises
+    above the adaptive threshold: the median flux of the last `median_sec`, times
+    `threshold_ratio`, plus `min_flux`.
+
+    For low notes, a frame is only about a period long and neighbouring partials
+    fall into the same frequency bins, so their magnitude fluctuates from frame to
+    frame even without a pluck. Like in find_onset(), we compare with the maximum
+    over the last `hold_frames` frames rather than just the previous one, which
+    keeps these fluctuations from looking like onsets (the "SuperFlux" trick).
+
+    This is cheap enough to run in the input stream callback for every block. The
+    timestamps of the onsets are in the time domain of the input stream (ADC time),
+    accurate to about a hop.
+
+    Args:
+        input_stream: Where the audio comes from.
+        channel: Which channel of the input stream to listen to.
+        frame_length: FFT size, in samples.
+        hop_length: Samples between frames, the resolution of the timestamps.
+        max_frequency: See above. Higher frequencies are mostly noise.
+        hold_frames: See above.
+        threshold_ratio: See above.
+        min_flux: See above. Keeps the noise floor from triggering onsets.
+        median_sec: See above.
+        min_interval_sec: Onsets closer than this to the previous one are ignored,
+            since the flux stays high for a few frames after a pluck.
+        subscribe: If False, don't take audio from the input stream automatically.
+            Call process_block() instead.
+    """
+
+    def __init__(
+        self,
+        input_stream: InputStream,
+        channel: int = 0,
+        frame_length: int = 1024,
+        hop_length: int = 256,
+        max_frequency: float = 2000.0,
+        hold_frames: int = 4,
+        threshold_ratio: float = 3.0,
+        min_flux: float = 0.02,
+        median_sec: float = 0.5,
+        min_interval_sec: float = 0.05,
+        subscribe: bool = True,
+    ):
+        if hop_length > frame_length:
+            raise ValueError("hop_length should be at most frame_length")
+
+        self.input_stream = input_stream
+        self.channel = channel
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.max_frequency = max_frequency
+        self.hold_frames = hold_frames
+        self.threshold_ratio = threshold_ratio
+        self.min_flux = min_flux
+        self.median_sec = median_sec
+        self.min_interval_sec = min_interval_sec
+
+        # (strength, timestamp) of the detected onsets, the strength being the flux
+        self.onsets: Deque[tuple[float, Timestamp]] = deque(maxlen=100)
+        self.on_onset: Signal[tuple[float, Timestamp]] = Signal()
+
+        self._window = np.hanning(frame_length).astype(np.float32)
+        # Samples that haven't been the end of a frame yet, plus the frame_length -
+        # hop_length samples before them that the next frame overlaps with
+        self._samples = np.zeros(0, dtype=np.float32)
+        self._last_spectra: Deque[np.ndarray] = deque(maxlen=hold_frames)
+        self._flux_history: Deque[float] = deque()
+        self._is_above_threshold = False
+        self._last_block_timestamp = -np.inf
+
+        self._subscribed = subscribe
+        if subscribe:
+            self.input_stream.on_reading.subscribe(self.process_block)
+
+    def unsubscribe(self):
+        if self._subscribed:
+            self.input_stream.on_reading.unsubscribe(self.process_block)
+            self._subscribed = False
+
+    def process_block(self, callback_data: InputStreamCallbackData):
+        """Look for onsets in a block of audio from the input stream.
+
+        Blocks that were already processed are ignored, so other detectors can call
+        this to make sure the onset detector is up to date before they look at the
+        onsets, regardless of the order in which the input stream notifies them.
+        """
+        if callback_data.timestamp <= self._last_block_timestamp:
+            return
+        self._last_block_timestamp = callback_data.timestamp
+
+        assert self.input_stream.stream is not None
+        sr = self.input_stream.stream.samplerate
+        if self._flux_history.maxlen is None:
+            # The sample rate is only known once the stream is open
+            n_frames = max(1, int(self.median_sec * sr / self.hop_length))
+            self._flux_history = deque(maxlen=n_frames)
+
+        block = callback_data.indata[:, self.channel].astype(np.float32)
+        samples = np.concatenate([self._samples, block])
+        # The time of the first sample of `samples`
+        start_time = callback_data.timestamp - len(self._samples) / sr
+
+        frame_start = 0
+        while frame_start + self.frame_length <= len(samples):
+            frame = samples[frame_start : frame_start + self.frame_length]
+            # The new audio in this frame, compared to the previous one, is the last
+            # hop. That's where the onset is.
+            hop_time = (
+                start_time + (frame_start + self.frame_length - self.hop_length) / sr
+            )
+            self._process_frame(frame, hop_time, sr)
+            frame_start += self.hop_length
+
+        self._samples = samples[frame_start:]
+
+    def _process_frame(self, frame: np.ndarray, timestamp: Timestamp, sr: float):
+        n_bins = int(self.max_frequency * self.frame_length / sr) + 1
+        spectrum = np.log1p(np.abs(np.fft.rfft(self._window * frame)[:n_bins]))
+        if len(self._last_spectra) < self.hold_frames:
+            self._last_spectra.append(spectrum)
+            return
+
+        reference = np.max(self._last_spectra, axis=0)
+        flux = float(np.mean(np.maximum(spectrum - reference, 0)))
+        self._last_spectra.append(spectrum)
+
+        median_flux = np.median(self._flux_history) if self._flux_history else 0.0
+        self._flux_history.append(flux)
+        threshold = self.threshold_ratio * median_flux + self.min_flux
+
+        was_above_threshold = self._is_above_threshold
+        self._is_above_threshold = flux > threshold
+        if not self._is_above_threshold or was_above_threshold:
+            return
+
+        last_onset_time = self.get_last_onset_time()
+        if (
+            last_onset_time is not None
+            and timestamp - last_onset_time < self.min_interval_sec
+        ):
+            return
+
+        logger.debug(f"Onset at {timestamp:.3f}, flux {flux:.3f}")
+        self.onsets.append((flux, timestamp))
+        self.on_onset.notify((flux, timestamp))
+
+    def get_last_onset_time(self) -> Timestamp | None:
+        if not self.onsets:
+            return None
+        return self.onsets[-1][1]
+
+    def has_onset_between(self, start: Timestamp, end: Timestamp) -> bool:
+        """Whether there was an onset in the time range [start, end]."""
+        return any(start <= timestamp <= end for _, timestamp in self.onsets)
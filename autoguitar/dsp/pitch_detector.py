@@ -8,6 +8,7 @@ import librosa
 import numpy as np
 
 from autoguitar.dsp.input_stream import InputStream, InputStreamCallbackData
+from autoguitar.dsp.onset_detector import OnsetDetector
 from autoguitar.signal import Signal
 
 Timestamp = float  # A result of time.time()
@@ -22,16 +23,54 @@ class PitchDetector:
     run it on a separate thread to avoid input overflow in the InputStream. That
     would mean some blocks would get discarded, which is bad mainly if you want
     to record the incoming audio into a file.
+
+    Args:
+        input_stream: Where the audio comes from.
+        threaded: If False, run the detection directly in the input stream callback
+            instead. The cooldown between readings is based on the audio timestamps
+            rather than wall-clock time, so with a simulated input stream, this
+            makes the readings fully deterministic.
+        min_note: The lowest note we expect the string to be tuned to.
+        max_note: The highest note. A narrower range means fewer octave errors and
+            less work for the detector.
+        channel: Which channel of the input stream the string is on.
+        subscribe: If False, don't take audio from the input stream automatically.
+            Call process_audio() instead, as MultiPitchDetector does.
+        onset_detector: If given, windows of audio that contain an onset are
+            skipped. The attack of a pluck is noisy and the string is briefly
+            sharp, and the audio before the pluck may be of a different pitch, so
+            such readings are often wrong. With frequent plucks (e.g. a tremolo),
+            this can leave no windows to detect the pitch from.
     """
 
-    def __init__(self, input_stream: InputStream):
+    def __init__(
+        self,
+        input_stream: InputStream,
+        threaded: bool = True,
+        min_note: str = "E1",
+        max_note: str = "E3",
+        channel: int = 0,
+        subscribe: bool = True,
+        onset_detector: OnsetDetector | None = None,
+    ):
         self.input_stream = input_stream
-        self.input_stream.on_reading.subscribe(self._input_stream_callback)
+        if subscribe:
+            self.input_stream.on_reading.subscribe(self._input_stream_callback)
 
         self.frequency_readings: Deque[tuple[float, Timestamp]] = deque(maxlen=100)
         self.on_reading: Signal[tuple[float, Timestamp]] = Signal()
         self.n_samples_per_reading = 8192
         self.cooldown_until = 0
+        self.use_pyin = True
+        self.threaded = threaded and subscribe
+        self.min_note = min_note
+        self.max_note = max_note
+        self.channel = channel
+        self.onset_detector = onset_detector
+
+        if not self.threaded:
+            self.thread = None
+            return
 
         # Run the pitch detection itself in a separate thread.
         # We don't care about processing all readings. If we can't keep up, process
@@ -41,6 +80,9 @@ class PitchDetector:
         self.thread = threading.Thread(target=self._process_readings)
         self.thread.start()
 
+    def unsubscribe(self):
+        self.input_stream.on_reading.unsubscribe(self._input_stream_callback)
+
     def _input_stream_callback(self, callback_data: InputStreamCallbackData):
         assert self.input_stream.stream is not None
         assert callback_data.timestamp >= 0, "Expected non-negative timestamp"
@@ -49,6 +91,11 @@ class PitchDetector:
         if timestamp < self.cooldown_until:
             return
 
+        if self._contains_onset(callback_data):
+            # Try again with the next block rather than waiting for the cooldown,
+            # the onset will be out of the window soon
+            return
+
         # If the block size is small, this callback will get called very often.
         # Since it's cost-intensive, we want to throttle it a bit.
         cooldown_coef = 0.5  # Pause length relative to n_samples_per_reading
@@ -60,18 +107,39 @@ class PitchDetector:
 
         # Pitch detection needs a bit more samples to work well, potentially more
         # than the block size
-        y = self.input_stream.get_latest_audio(max_n_samples=self.n_samples_per_reading)
+        y = self.input_stream.get_latest_audio(
+            max_n_samples=self.n_samples_per_reading, channel=self.channel
+        )
         if len(y) < self.n_samples_per_reading:
             # The Yin algorithm might fail if we try to run it on fewer samples with the
             # same parameters
             return
 
+        if not self.threaded:
+            self._process_reading(y, timestamp)
+            return
+
         try:
             self._task_queue.put_nowait((y, timestamp))
         except Full:
             # logger.warning("Pitch detector queue is full, skipping a reading")
             pass
 
+    def _contains_onset(self, callback_data: InputStreamCallbackData) -> bool:
+        """Whether the window ending with this block contains an onset."""
+        if self.onset_detector is None:
+            return False
+
+        assert self.input_stream.stream is not None
+        # The order in which the input stream notifies its subscribers is arbitrary,
+        # so the onset detector might not have seen this block yet
+        self.onset_detector.process_block(callback_data)
+
+        sr = self.input_stream.stream.samplerate
+        end = callback_data.timestamp + callback_data.frames / sr
+        start = end - self.n_samples_per_reading / sr
+        return self.onset_detector.has_onset_between(start, end)
+
     def _process_readings(self):
         while self.input_stream.stream is not None:
             try:
@@ -81,11 +149,28 @@ class PitchDetector:
                 # timeout argument to ensure that the condition is re-checked
                 continue
 
-            sr = self.input_stream.stream.samplerate
-            freq, _ = detect_pitch(y=y, sr=sr, use_pyin=True)
+            self._process_reading(y, timestamp)
+
+    def process_audio(self, y: np.ndarray, timestamp: Timestamp):
+        """Detect the pitch of `y` and publish the reading if it's plausible.
+
+        Only needed with subscribe=False, otherwise this happens automatically.
+        """
+        self._process_reading(y, timestamp)
+
+    def _process_reading(self, y: np.ndarray, timestamp: Timestamp):
+        assert self.input_stream.stream is not None
+        sr = self.input_stream.stream.samplerate
+        freq, _ = detect_pitch(
+            y=y,
+            sr=sr,
+            use_pyin=self.use_pyin,
+            min_note=self.min_note,
+            max_note=self.max_note,
+        )
 
-            if self.is_reading_plausible(freq, timestamp):
-                self._add_reading(freq, timestamp)
+        if self.is_reading_plausible(freq, timestamp):
+            self._add_reading(freq, timestamp)
 
     def is_reading_plausible(self, freq: float, timestamp: float) -> bool:
         """Check if a reading is plausible given past readings.
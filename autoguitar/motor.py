@@ -6,9 +6,12 @@ from dataclasses import dataclass
 from types import TracebackType
 from typing import Optional
 
+import numpy as np
 import requests
 from pydantic import BaseModel
 
+from autoguitar.clock import SYSTEM_CLOCK, Clock
+from autoguitar.step_history import StepHistory
 from autoguitar.time_sync import UnixTimestamp
 from autoguitar.virtual_string import VirtualString
 
@@ -70,6 +73,9 @@ PIN_CONFIGURATIONS = [
     PinConfiguration(step=11, direction=16, disable=19),
     PinConfiguration(step=18, direction=3, disable=12),
 ]
+# To add a motor (e.g. to tune another string), add its pins above and its entries to
+# STEP_TIME_SEC_PER_MOTOR and MICROSTEPPING_PER_MOTOR.
+N_MOTORS = len(PIN_CONFIGURATIONS)
 
 
 class PhysicalMotor(Motor):
@@ -123,13 +129,15 @@ class VirtualMotor(Motor):
         self,
         step_time_sec: float = 0.01,
         virtual_string: Optional[VirtualString] = None,
+        clock: Clock = SYSTEM_CLOCK,
     ):
         self.step_time_sec = step_time_sec
         self.total_steps_taken = 0
         self.virtual_string = virtual_string
+        self.clock = clock
 
     def step(self, forward: bool):
-        time.sleep(self.step_time_sec)
+        self.clock.sleep(self.step_time_sec)
         self.total_steps_taken += 1
 
         if self.virtual_string:
@@ -140,13 +148,20 @@ class VirtualMotor(Motor):
 
 
 class AbstractMotorController(ABC):
-    def __init__(self):
+    def __init__(self, clock: Clock = SYSTEM_CLOCK):
+        self.clock = clock
         self.command_thread = None
         self.stop_event = threading.Event()
 
         self.cur_steps = 0
         self._target_steps = 0
 
+        # Timestamps are from clock.monotonic(), which is time.monotonic() unless we're
+        # simulating. On Linux, time.monotonic() is shared between processes, so we
+        # can compare timestamps from the motor server with ones measured in the
+        # client.
+        self.step_history = StepHistory()
+
     def get_target_steps(self) -> int:
         return self._target_steps
 
@@ -154,30 +169,43 @@ class AbstractMotorController(ABC):
         self.set_target_steps(self.get_target_steps() + steps, wait=wait)
 
     def __enter__(self):
-        self.command_thread = threading.Thread(target=self._command_processing_loop)
-        self.command_thread.start()
+        # Record the starting position so that we can answer position queries
+        # even before the first step
+        self.step_history.append(self.clock.monotonic(), self.cur_steps)
+        self.command_thread = self.clock.start_thread(self._command_processing_loop)
         return self
 
     def __exit__(self, exc_type: type, exc_val: Exception, exc_tb: TracebackType):
         self.stop_event.set()
         assert self.command_thread is not None
-        self.command_thread.join()
+        self.clock.join_thread(self.command_thread)
 
     def _command_processing_loop(self):
         while not self.stop_event.is_set():
             if self.cur_steps == self._target_steps:
-                time.sleep(0.001)
+                self.clock.sleep(0.001)
                 continue
 
             self._process_command()
 
     def wait_until_stopped(self):
         while self.is_moving():
-            time.sleep(0.001)
+            self.clock.sleep(0.001)
 
     def is_moving(self) -> bool:
         return self.cur_steps != self._target_steps
 
+    def get_mean_steps(self, start: float, end: float) -> float | None:
+        """Average position over [start, end], in clock.monotonic() time.
+
+        Returns None if we don't know where the motor was during that time.
+        """
+        return self.step_history.get_mean_steps(start, end)
+
+    def get_steps_range(self, start: float, end: float) -> tuple[int, int] | None:
+        """(min, max) position over [start, end], or None if we don't know."""
+        return self.step_history.get_steps_range(start, end)
+
     @abstractmethod
     def set_target_steps(self, steps: int, wait: bool = False): ...
 
@@ -189,11 +217,25 @@ class AbstractMotorController(ABC):
 
 
 class MotorController(AbstractMotorController):
-    def __init__(self, motor: Motor, max_steps: int):
-        super().__init__()
+    def __init__(
+        self,
+        motor: Motor,
+        max_steps: int,
+        clock: Clock = SYSTEM_CLOCK,
+        initial_steps: int = 0,
+    ):
+        """Moves a motor to target positions in a background thread.
+
+        Args:
+            initial_steps: Where the motor is at the start, e.g. from a
+                PositionJournal. By default, its current position is 0.
+        """
+        super().__init__(clock=clock)
 
         self.motor = motor
         self.max_steps = max_steps
+        self.cur_steps = initial_steps
+        self._target_steps = initial_steps
 
     def set_target_steps(self, steps: int, wait: bool = False):
         self._target_steps = steps
@@ -217,21 +259,32 @@ class MotorController(AbstractMotorController):
         # but now there's a RemoteMotorController instead.
         steps_taken = self.motor.step_multiple(target_steps - self.cur_steps)
         self.cur_steps += steps_taken
+        if steps_taken != 0:
+            self.step_history.append(self.clock.monotonic(), self.cur_steps)
 
     def steps_per_turn(self) -> int:
         return self.motor.steps_per_turn()
 
 
 class RemoteMotorController(AbstractMotorController):
-    def __init__(self, motor_number: int):
-        super().__init__()
+    def __init__(self, motor_number: int, clock: Clock = SYSTEM_CLOCK):
+        super().__init__(clock=clock)
         self.server_url = "http://localhost:8050"
 
         self.motor_number = motor_number
-
-        response = requests.get(f"{self.server_url}/reset")
+        # We only learn about the steps of a move once it's finished, so the step
+        # history is only complete up to this point while moving.
+        self._step_history_synced_at = self.clock.monotonic()
+
+        # Continue from the position the server has, rather than resetting it to 0,
+        # so that positions measured in previous runs (e.g. the strummer calibration)
+        # stay valid
+        response = requests.get(f"{self.server_url}/all_motors_status")
         if response.status_code != 200:
             raise RuntimeError(f"Motor server is not running: {response}")
+        status = AllMotorsStatus.model_validate(response.json())
+        self.cur_steps = status.status[motor_number].cur_steps
+        self._target_steps = self.cur_steps
 
     def set_target_steps(self, steps: int, wait: bool = False):
         self._target_steps = steps
@@ -256,7 +309,28 @@ class RemoteMotorController(AbstractMotorController):
             return
 
         response.raise_for_status()
-        self.cur_steps = response.json()["steps"]
+        response_json = response.json()
+        self.cur_steps = response_json["steps"]
+
+        # The server tells us exactly when each step of the move happened
+        step_history = response_json.get("step_history")
+        if step_history is not None:
+            self.step_history.extend(
+                np.array(step_history["timestamps"]), np.array(step_history["steps"])
+            )
+        else:
+            self.step_history.append(self.clock.monotonic(), self.cur_steps)
+        self._step_history_synced_at = self.clock.monotonic()
+
+    def get_mean_steps(self, start: float, end: float) -> float | None:
+        if self.is_moving() and end > self._step_history_synced_at:
+            return None
+        return super().get_mean_steps(start, end)
+
+    def get_steps_range(self, start: float, end: float) -> tuple[int, int] | None:
+        if self.is_moving() and end > self._step_history_synced_at:
+            return None
+        return super().get_steps_range(start, end)
 
     def _make_request(self, target_steps: int) -> int:
         response = requests.post(
@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from types import TracebackType
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR = Path(__file__).parents[1] / "data" / "state"
+DEFAULT_JOURNAL_PATH = STATE_DIR / "motor_positions.jsonl"
+
+
+class PositionRecord(BaseModel):
+    motor_number: int
+    steps: int
+    # Where the motor was headed. If it's different from `steps`, the record was
+    # written at the start of a move that we don't know finished.
+    target_steps: int
+
+
+class PositionJournal:
+    """Remembers the absolute position of each motor across restarts.
+
+    Stepper motors don't know their own position, so without this, the position of a
+    motor is 0 wherever it happens to be when the program starts, and everything
+    measured relative to it (the strummer calibration, the tuner's model) is lost.
+
+    Each position change is appended as a line and fsync()-ed, so a crash or power
+    loss at any point loses at most the line being written, which load() skips.
+    Before a move, we write where the motor is going, and after it, where it ended
+    up. If we crash in between, the motor stopped somewhere in between, so the
+    position is uncertain; load() warns about it and uses the start of the move.
+
+    The record before a move doesn't need to be fsync()-ed (durable=False), which
+    would delay the move: if a power loss takes it with it, the last record is still
+    the start of the move, which is what load() would use anyway. We only lose the
+    warning. A crash of the process alone loses nothing, the OS has the line.
+
+    Args:
+        path: The journal file.
+        max_records: When the journal gets this long, it is compacted to the last
+            record per motor.
+    """
+
+    def __init__(self, path: Path = DEFAULT_JOURNAL_PATH, max_records: int = 10000):
+        self.path = path
+        self.max_records = max_records
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._n_records = 0
+        self._file = None
+        # Motors move concurrently, each in a request of its own
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        positions = self.load()
+        # Start from a compact journal, which also gets rid of a torn last line
+        self._rewrite(positions)
+        self._file = self.path.open("a")
+        return self
+
+    def __exit__(self, exc_type: type, exc_val: Exception, exc_tb: TracebackType):
+        assert self._file is not None
+        self._file.close()
+        self._file = None
+
+    def load(self) -> dict[int, PositionRecord]:
+        """The last known position of each motor in the journal."""
+        positions: dict[int, PositionRecord] = {}
+        if not self.path.exists():
+            return positions
+
+        with self.path.open() as f:
+            for line in f:
+                try:
+                    record = PositionRecord.model_validate_json(line)
+                except ValidationError:
+                    logger.warning(f"Skipping a corrupted line in {self.path}")
+                    continue
+                positions[record.motor_number] = record
+
+        for record in positions.values():
+            if record.steps != record.target_steps:
+                logger.warning(
+                    f"Motor {record.motor_number} was interrupted while moving from "
+                    f"{record.steps} to {record.target_steps}, its position is "
+                    "uncertain"
+                )
+        return positions
+
+    def get_steps(self, motor_number: int) -> int:
+        """The last known position of a motor, 0 if there is none."""
+        record = self.load().get(motor_number)
+        return record.steps if record is not None else 0
+
+    def record(
+        self,
+        motor_number: int,
+        steps: int,
+        target_steps: int | None = None,
+        durable: bool = True,
+    ):
+        """Write the position of a motor. Returns once it's on disk, if `durable`."""
+        assert self._file is not None, "Use the journal as a context manager"
+        record = PositionRecord(
+            motor_number=motor_number,
+            steps=steps,
+            target_steps=steps if target_steps is None else target_steps,
+        )
+        with self._lock:
+            self._file.write(record.model_dump_json() + "\n")
+            self._file.flush()
+            if durable:
+                os.fsync(self._file.fileno())
+
+            self._n_records += 1
+            if self._n_records >= self.max_records:
+                self._file.close()
+                self._rewrite(self.load())
+                self._file = self.path.open("a")
+
+    def _rewrite(self, positions: dict[int, PositionRecord]):
+        """Atomically replace the journal with the given records."""
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            for record in positions.values():
+                f.write(record.model_dump_json() + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._n_records = len(positions)
@@ -0,0 +1,32 @@
+"""Convert JSONL session logs to the columnar format of tuning/session_columns.py."""
+
+import glob
+from pathlib import Path
+
+import click
+
+from autoguitar.tuning.session_columns import COLUMNAR_DIR, convert_jsonl_session
+
+
+@click.command()
+@click.argument("sessions", nargs=-1)
+@click.option(
+    "--output-dir",
+    type=click.Path(path_type=Path),
+    default=COLUMNAR_DIR,
+    help="A directory per session is created in here.",
+)
+def main(sessions: tuple[str, ...], output_dir: Path):
+    """Convert SESSIONS (default: all of data/tuning_data_selected/)."""
+    patterns = sessions or ("data/tuning_data_selected/*.jsonl",)
+    paths = sorted(Path(p) for pattern in patterns for p in glob.glob(pattern))
+    if not paths:
+        raise click.UsageError(f"No sessions found in {patterns}")
+
+    for path in paths:
+        session_dir = convert_jsonl_session(path, output_dir / path.stem)
+        print(f"{path} -> {session_dir}")
+
+
+if __name__ == "__main__":
+    main()
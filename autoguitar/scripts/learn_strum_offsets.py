@@ -0,0 +1,111 @@
+import logging
+import time
+
+import click
+import librosa
+import numpy as np
+
+from autoguitar.control.strum_offsets import StrumOffsetTable
+from autoguitar.control.strummer import Strummer
+from autoguitar.dsp.input_stream import InputStream
+from autoguitar.motor import RemoteMotorController
+from autoguitar.session_state import (
+    load_session_state,
+    restore_strummer,
+    save_session_state,
+)
+from autoguitar.tuning.tuner import Tuner
+from autoguitar.tuning.tuner_strategy import ModelBasedTunerStrategy
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How close to the target the string has to be before we measure the plucks
+TOLERANCE_CENTS = 20.0
+TUNING_TIMEOUT_SEC = 30.0
+
+
+def wait_until_tuned(tuner: Tuner, strummer: Strummer) -> bool:
+    """Strum every now and then so that the tuner can hear the string."""
+    deadline = time.monotonic() + TUNING_TIMEOUT_SEC
+    while time.monotonic() < deadline:
+        strummer.strum()
+        time.sleep(1.5)
+        frequency, _ = tuner.pitch_detector.get_frequency()
+        if np.isnan(frequency):
+            continue
+        error_cents = 1200 * np.log2(frequency / tuner.target_frequency)
+        logger.info(f"{frequency:.1f} Hz, {error_cents:+.0f} cents off")
+        if abs(error_cents) < TOLERANCE_CENTS:
+            return True
+    return False
+
+
+@click.command()
+@click.option("--min-note", default="E1")
+@click.option("--max-note", default="G#2")
+@click.option("--n-frequencies", default=6, help="How many tunings to measure at.")
+def main(min_note: str, max_note: str, n_frequencies: int):
+    """Learn how the strum positions depend on the tuning, see StrumOffsetTable.
+
+    The string is tuned to frequencies across the playable range, and at each one,
+    we measure where the upstroke and downstroke pluck it. The result is saved with
+    the session state, where main.py picks it up.
+    """
+    session_state = load_session_state()
+    frequencies = np.geomspace(
+        librosa.note_to_hz(min_note), librosa.note_to_hz(max_note), n_frequencies
+    )
+
+    with (
+        InputStream(block_size=512) as input_stream,
+        RemoteMotorController(motor_number=0) as mc0,
+        RemoteMotorController(motor_number=1) as mc1,
+    ):
+        strummer = Strummer(input_stream=input_stream, motor_controller=mc1)
+        restore_strummer(strummer, session_state)
+        # Measure without the old table, so that the strums are where they were
+        # when calibrating
+        strummer.offset_table = None
+
+        tuner_strategy = ModelBasedTunerStrategy(coef=4.35, adaptiveness=0.5)
+        if session_state.tuner_model is not None:
+            tuner_strategy.coef = session_state.tuner_model.coef
+            tuner_strategy.intercept = session_state.tuner_model.intercept
+        tuner = Tuner(
+            input_stream=input_stream,
+            motor_controller=mc0,
+            initial_target_frequency=float(frequencies[0]),
+            tuner_strategy=tuner_strategy,
+        )
+
+        plucks = []
+        for frequency in frequencies:
+            tuner.set_target(float(frequency))
+            if not wait_until_tuned(tuner, strummer):
+                logger.warning(f"Couldn't tune to {frequency:.1f} Hz, skipping")
+                continue
+
+            measured = strummer.measure_plucks()
+            # measure_plucks() leaves the strummer in an unknown state
+            strummer.set_strum_state("upstroke")
+            if measured is None:
+                logger.warning(f"No plucks heard at {frequency:.1f} Hz, skipping")
+                continue
+            up, down = measured
+            logger.info(
+                f"At {up.frequency:.1f} Hz: upstroke pluck at {up.steps}, "
+                f"downstroke pluck at {down.steps}"
+            )
+            plucks.append(measured)
+
+        tuner.unsubscribe()
+
+    table = StrumOffsetTable.from_plucks(plucks, steps_per_turn=mc1.steps_per_turn())
+    print(table)
+    session_state.strum_offsets = table
+    save_session_state(session_state)
+
+
+if __name__ == "__main__":
+    main()
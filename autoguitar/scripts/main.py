@@ -1,17 +1,23 @@
+import contextlib
 import logging
-import time
-from threading import Thread
 
 import click
 import librosa
 import mido
-import numpy as np
 
+from autoguitar.control.strum_scheduler import StrumEvent, StrumPattern, StrumScheduler
 from autoguitar.control.strummer import Strummer
 from autoguitar.dsp.input_stream import InputStream
 from autoguitar.midi_utils import find_midi_input
 from autoguitar.motor import RemoteMotorController
+from autoguitar.session_state import (
+    TunerModelState,
+    load_session_state,
+    restore_strummer,
+    save_session_state,
+)
 from autoguitar.tuning.tuner import Tuner
+from autoguitar.tuning.tuner_strategy import ModelBasedTunerStrategy
 
 logging.basicConfig(level=logging.INFO)
 
@@ -19,6 +25,8 @@ logging.basicConfig(level=logging.INFO)
 MIN_FREQUENCY = librosa.note_to_hz("E1")
 MAX_FREQUENCY = librosa.note_to_hz("G#2")
 INITIAL_TARGET_FREQUENCY = librosa.note_to_hz("E2")
+# For tremolo, strum on every beat and control the speed with the tempo
+TREMOLO_PATTERN = StrumPattern(events=[StrumEvent(beat=0)], beats_per_bar=1)
 
 
 def remap(
@@ -30,7 +38,12 @@ def remap(
 @click.command()
 @click.option("--strummer/--no-strummer", "use_strummer", default=True)
 @click.option("--midi-keyboard/--no-midi-keyboard", "use_midi_keyboard", default=True)
-def main(use_strummer: bool, use_midi_keyboard: bool):
+@click.option(
+    "--recalibrate",
+    is_flag=True,
+    help="Calibrate the strummer even if the saved calibration is still valid.",
+)
+def main(use_strummer: bool, use_midi_keyboard: bool, recalibrate: bool):
     if use_midi_keyboard:
         # Open the virtual input port connected to the sender.
         midi_input_name = find_midi_input()
@@ -48,106 +61,121 @@ def main(use_strummer: bool, use_midi_keyboard: bool):
         RemoteMotorController(motor_number=0) as mc0,
         RemoteMotorController(motor_number=1) as mc1,
     ):
-        # Randomize the motor position for testing purposes
-        mc1.move(
-            np.random.randint(-mc1.steps_per_turn(), mc1.steps_per_turn()), wait=True
-        )
+        # The motor server keeps the motor positions across runs, so what we learned
+        # last time is usually still valid
+        session_state = load_session_state()
 
         if use_strummer:
             strummer = Strummer(input_stream=input_stream, motor_controller=mc1)
-            strummer.calibrate()
+            restore_strummer(strummer, session_state, recalibrate=recalibrate)
         else:
             strummer = None
 
+        tuner_strategy = ModelBasedTunerStrategy(coef=4.35, adaptiveness=0.5)
+        if session_state.tuner_model is not None:
+            tuner_strategy.coef = session_state.tuner_model.coef
+            tuner_strategy.intercept = session_state.tuner_model.intercept
+
         # Create the tuner only after the strummer has been calibrated
         # so that it doesn't move the string while we're calibrating
         tuner = Tuner(
             input_stream=input_stream,
             motor_controller=mc0,
             initial_target_frequency=float(INITIAL_TARGET_FREQUENCY),
+            tuner_strategy=tuner_strategy,
         )
 
-        tremolo_frequency: float | None = None
-
-        def tremolo_loop():
-            while True:
-                freq = tremolo_frequency
-                if freq is not None:
-                    assert 0.1 < freq <= 100
+        if strummer is not None:
+            # The strum positions follow what the string is actually tuned to
+            tuner.pitch_detector.on_reading.subscribe(strummer.on_pitch_reading)
 
-                    strum_start = time.time()
-                    if strummer is not None:
-                        strummer.strum()
-                    strum_end = time.time()
+        tremolo = (
+            StrumScheduler(strummer=strummer, pattern=TREMOLO_PATTERN)
+            if strummer is not None
+            else None
+        )
 
-                    time.sleep(max(0, 1 / freq - (strum_end - strum_start)))
+        try:
+            with tremolo or contextlib.nullcontext():
+                handle_midi_messages(inport, strummer, tremolo, tuner, mc0)
+        finally:
+            session_state.tuner_model = TunerModelState(
+                coef=tuner_strategy.coef, intercept=tuner_strategy.intercept
+            )
+            if strummer is not None:
+                # Could've been adjusted with the MIDI controller
+                session_state.calibration = strummer.calibration
+            save_session_state(session_state)
+
+
+def handle_midi_messages(
+    inport: mido.ports.BaseInput,
+    strummer: Strummer | None,
+    tremolo: StrumScheduler | None,
+    tuner: Tuner,
+    mc0: RemoteMotorController,
+):
+    for msg in inport:
+        if msg.type == "note_on":
+            print(msg)
+            frequency = librosa.midi_to_hz(msg.note)
+
+            while frequency > MAX_FREQUENCY + 1e-3:
+                frequency /= 2
+            while frequency < MIN_FREQUENCY - 1e-3:
+                frequency *= 2
+
+            tuner.set_target(frequency)
+            if strummer is not None and strummer.frequency is None:
+                # Until there's a pitch reading, the target is our best guess
+                strummer.set_frequency(frequency)
+
+            if strummer is not None and (tremolo is None or tremolo.get_bpm() is None):
+                strummer.strum()
+        elif msg.type == "note_off":
+            pass
+            # TODO: mute. The muting is a bit too unreliable atm.
+            # if strummer is not None:
+            #     strummer.mute()
+        elif msg.type == "control_change":
+            if (
+                msg.control in [21, 22]  # knobs 1 and 2 on the Launchkey Mini
+                and strummer
+            ):
+                max_offset = 25
+                offset = round(remap(msg.value, 0, 127, -max_offset, max_offset))
+                if msg.control == 21:
+                    strummer.downstroke_offset = offset
                 else:
-                    time.sleep(0.1)
-
-        tremolo_thread = Thread(target=tremolo_loop)
-        tremolo_thread.start()
-
-        for msg in inport:
-            if msg.type == "note_on":
-                print(msg)
-                frequency = librosa.midi_to_hz(msg.note)
-
-                while frequency > MAX_FREQUENCY + 1e-3:
-                    frequency /= 2
-                while frequency < MIN_FREQUENCY - 1e-3:
-                    frequency *= 2
-
-                tuner.target_frequency = frequency
-
-                if strummer is not None and tremolo_frequency is None:
-                    strummer.strum()
-
-                if readings := tuner.pitch_detector.frequency_readings:
-                    # Fake reading to let the tuner know the target frequency has changed
-                    tuner.on_pitch_reading(readings[-1])
-            elif msg.type == "note_off":
+                    strummer.upstroke_offset = offset
                 pass
-                # TODO: mute. The muting is a bit too unreliable atm.
-                # if strummer is not None:
-                #     strummer.mute()
-            elif msg.type == "control_change":
-                if (
-                    msg.control in [21, 22]  # knobs 1 and 2 on the Launchkey Mini
-                    and strummer
-                ):
-                    max_offset = 25
-                    offset = round(remap(msg.value, 0, 127, -max_offset, max_offset))
-                    if msg.control == 21:
-                        strummer.downstroke_offset = offset
-                    else:
-                        strummer.upstroke_offset = offset
-                    pass
-                elif (
-                    msg.control == 23
-                    and msg.value in [0, 127]
-                    and strummer
-                    and strummer.calibration
-                ):
-                    sign = +1 if msg.value > 64 else -1
-                    strummer.calibration.downstroke_steps += 10 * sign
-                    strummer.calibration.upstroke_steps += 10 * sign
-
-                elif msg.control == 24 and msg.value in [0, 127]:
-                    mc0.move(1000 if msg.value > 64 else -1000, wait=True)
-
-                elif msg.control == 28:  # knob 8 on the Launchkey Mini
-                    # Tremolo
-                    if msg.value < 64:
-                        tremolo_frequency = None
-                    else:
-                        tremolo_exponent = remap(msg.value, 64, 127, 0, 1)
-                        min_freq = 1
-                        max_freq = 50
-                        tremolo_frequency = (
-                            min_freq * (max_freq / min_freq) ** tremolo_exponent
-                        )
-
-        tremolo_thread.join()
+            elif (
+                msg.control == 23
+                and msg.value in [0, 127]
+                and strummer
+                and strummer.calibration
+            ):
+                sign = +1 if msg.value > 64 else -1
+                strummer.calibration.downstroke_steps += 10 * sign
+                strummer.calibration.upstroke_steps += 10 * sign
+
+            elif msg.control == 24 and msg.value in [0, 127]:
+                mc0.move(1000 if msg.value > 64 else -1000, wait=True)
+
+            elif msg.control == 28:  # knob 8 on the Launchkey Mini
+                # Tremolo
+                if tremolo is None:
+                    continue
+                if msg.value < 64:
+                    tremolo.set_bpm(None)
+                else:
+                    tremolo_exponent = remap(msg.value, 64, 127, 0, 1)
+                    min_freq = 1
+                    max_freq = 50
+                    tremolo_frequency = (
+                        min_freq * (max_freq / min_freq) ** tremolo_exponent
+                    )
+                    tremolo.set_bpm(60 * tremolo_frequency)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,18 @@
 import logging
 import time
-from contextlib import asynccontextmanager
-from typing import Annotated, Literal
+from contextlib import ExitStack, asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel, BeforeValidator
-
-from autoguitar.motor import AllMotorsStatus, MotorController, MotorStatus, get_motor
+from pydantic import BaseModel
+
+from autoguitar.motor import (
+    N_MOTORS,
+    AllMotorsStatus,
+    MotorController,
+    MotorStatus,
+    get_motor,
+)
+from autoguitar.position_journal import PositionJournal
 from autoguitar.time_sync import get_network_datetime
 
 logging.basicConfig(level=logging.DEBUG)
@@ -15,38 +21,54 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    motors = [
-        get_motor(motor_number=0),
-        get_motor(motor_number=1),
-    ]
+    with ExitStack() as stack:
+        # Continue from where the motors were when the server last stopped, so that
+        # calibrations and tuner models saved by the clients stay valid
+        journal = stack.enter_context(PositionJournal())
+        motor_controllers = []
+        for i in range(N_MOTORS):
+            steps = journal.get_steps(i)
+            logger.info(f"Motor {i} starts at {steps} steps")
+            journal.record(i, steps)
+            motor_controllers.append(
+                stack.enter_context(
+                    MotorController(
+                        motor=get_motor(motor_number=i),
+                        max_steps=100000,
+                        initial_steps=steps,
+                    )
+                )
+            )
+        yield {"motor_controllers": motor_controllers, "journal": journal}
+
+
+def get_motor_controllers_from_request(request: Request) -> list[MotorController]:
+    return request.state.motor_controllers
+
 
-    with (
-        MotorController(motor=motors[0], max_steps=100000) as mc0,
-        MotorController(motor=motors[1], max_steps=100000) as mc1,
-    ):
-        yield {"mc0": mc0, "mc1": mc1}
+def get_journal_from_request(request: Request) -> PositionJournal:
+    return request.state.journal
 
 
-def get_motor_controllers_from_request(
-    request: Request,
-) -> tuple[MotorController, MotorController]:
-    return request.state.mc0, request.state.mc1
+def get_motor_controller(request: Request, motor_number: int) -> MotorController:
+    mcs = get_motor_controllers_from_request(request)
+    if not 0 <= motor_number < len(mcs):
+        raise HTTPException(status_code=404, detail="Unknown motor number")
+    return mcs[motor_number]
 
 
 app = FastAPI(lifespan=lifespan)
 
 
 class MotorTurn(BaseModel):
-    # BeforeValidator is needed because FastAPI doesn't convert from string to int
-    # automatically when you use `Literal`
-    motor_number: Annotated[Literal[0, 1], BeforeValidator(int)]
+    motor_number: int
     steps: int
     relative: bool = False
 
 
 @app.post("/motor_turn")
 def post_motor_turn(request: Request, motor_turn: MotorTurn):
-    mc = get_motor_controllers_from_request(request)[motor_turn.motor_number]
+    mc = get_motor_controller(request, motor_turn.motor_number)
 
     # if mc.is_moving():
     #     if motor_turn.motor_number == 1:
@@ -62,6 +84,13 @@ def post_motor_turn(request: Request, motor_turn: MotorTurn):
         raise HTTPException(status_code=400, detail="Motor is currently moving")
 
     t1 = time.time()
+    move_start = time.monotonic()
+    journal = get_journal_from_request(request)
+    target_steps = motor_turn.steps + (mc.cur_steps if motor_turn.relative else 0)
+    # No fsync() before the move, see PositionJournal. The one after it covers both.
+    journal.record(
+        motor_turn.motor_number, mc.cur_steps, target_steps=target_steps, durable=False
+    )
 
     if motor_turn.motor_number == 1:
         print("START", motor_turn)
@@ -74,12 +103,27 @@ def post_motor_turn(request: Request, motor_turn: MotorTurn):
         mc.move(motor_turn.steps, wait=True)
     else:
         mc.set_target_steps(motor_turn.steps, wait=True)
+    journal.record(motor_turn.motor_number, mc.cur_steps)
 
     t2 = time.time()
     if motor_turn.motor_number == 1:
         print(f"DONE {(t2 - t1):.3f}", motor_turn)
 
-    return motor_turn.model_dump()
+    return {
+        **motor_turn.model_dump(),
+        # Lets the client know exactly when each step of the move happened.
+        "step_history": mc.step_history.to_json_dict(start=move_start),
+    }
+
+
+@app.get("/step_history")
+def get_step_history(request: Request, motor_number: int, since: float | None = None):
+    """Export the step history of a motor, for the session log.
+
+    Timestamps are from time.monotonic() on the server.
+    """
+    mc = get_motor_controller(request, motor_number)
+    return mc.step_history.to_json_dict(start=since)
 
 
 @app.get("/all_motors_status")
@@ -106,10 +150,14 @@ def health():
 
 @app.get("/reset")
 def reset(request: Request):
-    # If we use the server over multiple runs, we want to reset the motor positions
-    # to 0. Otherwise the first command might make a really big move if the motor
-    # is already at a very high/low position.
-    mc0, mc1 = get_motor_controllers_from_request(request)
-    for mc in [mc0, mc1]:
+    """Declare the current position of every motor to be 0.
+
+    Clients don't do this on startup anymore because positions are kept across runs
+    (see PositionJournal), but it's useful after moving a motor by hand.
+    """
+    journal = get_journal_from_request(request)
+    for i, mc in enumerate(get_motor_controllers_from_request(request)):
         mc.cur_steps = 0
         mc.set_target_steps(0)
+        mc.step_history.append(time.monotonic(), 0)
+        journal.record(i, 0)
@@ -0,0 +1,111 @@
+"""Replay recorded tuning sessions through a tuner strategy, compare to the recording.
+
+See autoguitar/tuning/replay.py for how the replay works.
+"""
+
+import glob
+import logging
+from pathlib import Path
+
+import click
+import numpy as np
+
+from autoguitar.dashboard.dash_app import TELEMETRY_CLIENT
+from autoguitar.tuning.backlash import BacklashModel
+from autoguitar.tuning.replay import ReplayResult, replay_sessions
+from autoguitar.tuning.tuner_strategy import (
+    ModelBasedTunerStrategy,
+    RLSTunerStrategy,
+    TunerStrategy,
+)
+
+logging.basicConfig(level=logging.WARNING)
+logging.getLogger("autoguitar.time_sync").setLevel(logging.ERROR)
+
+COLUMNS = {
+    "fraction_reached": ("Reached", "{:.0%}"),
+    "median_time_to_within_sec": ("Time (s)", "{:.2f}"),
+    "mean_overshoot_cents": ("Overshoot", "{:.1f}"),
+    "commands_per_target": ("Commands", "{:.1f}"),
+    "mean_cpu_time_us": ("CPU (us)", "{:.0f}"),
+    "p99_cpu_time_us": ("CPU p99", "{:.0f}"),
+}
+
+
+def format_row(name: str, result: ReplayResult) -> str:
+    summary = result.get_summary()
+    values = [
+        fmt.format(summary[key]) if not np.isnan(summary[key]) else "-"
+        for key, (_, fmt) in COLUMNS.items()
+    ]
+    return f"{name:<40}" + "".join(f"{v:>11}" for v in values)
+
+
+@click.command()
+@click.argument("sessions", nargs=-1)
+@click.option(
+    "--strategy",
+    type=click.Choice(["model", "rls"]),
+    default="model",
+    help="Fixed-coefficient model or recursive least squares.",
+)
+@click.option("--coef", default=4.35, help="Initial coefficient of the strategy.")
+@click.option("--backlash/--no-backlash", default=False)
+@click.option("--tolerance-cents", default=10.0)
+def main(
+    sessions: tuple[str, ...],
+    strategy: str,
+    coef: float,
+    backlash: bool,
+    tolerance_cents: float,
+):
+    """Replay SESSIONS (default: all of data/tuning_data_selected/)."""
+    # Replayed events would show up on the dashboard as if they were live
+    TELEMETRY_CLIENT.enabled = False
+
+    patterns = sessions or ("data/tuning_data_selected/*.jsonl",)
+    paths = sorted(Path(p) for pattern in patterns for p in glob.glob(pattern))
+
+    def strategy_factory() -> TunerStrategy:
+        backlash_model = BacklashModel() if backlash else None
+        if strategy == "rls":
+            return RLSTunerStrategy(coef=coef, backlash_model=backlash_model)
+        return ModelBasedTunerStrategy(
+            coef=coef, adaptiveness=0.5, backlash_model=backlash_model
+        )
+
+    results = replay_sessions(paths, strategy_factory, tolerance_cents=tolerance_cents)
+    for path in paths:
+        if path not in results:
+            print(f"Skipping {path.name}: no tuner strategy events")
+
+    print(f"{'Session':<40}" + "".join(f"{name:>11}" for name, _ in COLUMNS.values()))
+    for path, (recorded, replayed) in results.items():
+        print(format_row(f"{path.stem[:30]} (recorded)", recorded))
+        print(format_row(f"{path.stem[:30]} (replay)", replayed))
+
+    if results:
+        all_recorded = ReplayResult(
+            targets=[t for r, _ in results.values() for t in r.targets],
+            n_readings=sum(r.n_readings for r, _ in results.values()),
+        )
+        all_replayed = ReplayResult(
+            targets=[t for _, r in results.values() for t in r.targets],
+            n_readings=sum(r.n_readings for _, r in results.values()),
+        )
+        # Sessions where no reading was passed to the strategy have no CPU times
+        mean_cpu_times = [
+            t for _, r in results.values() if (t := r.mean_cpu_time_sec) is not None
+        ]
+        p99_cpu_times = [
+            t for _, r in results.values() if (t := r.p99_cpu_time_sec) is not None
+        ]
+        if mean_cpu_times:
+            all_replayed.mean_cpu_time_sec = float(np.mean(mean_cpu_times))
+            all_replayed.p99_cpu_time_sec = max(p99_cpu_times)
+        print(format_row("All (recorded)", all_recorded))
+        print(format_row("All (replay)", all_replayed))
+
+
+if __name__ == "__main__":
+    main()
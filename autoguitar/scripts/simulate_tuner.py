@@ -0,0 +1,126 @@
+"""Run the tuner and strummer against a simulated string, faster than real time."""
+
+import logging
+
+import click
+import numpy as np
+
+from autoguitar.simulation.string_simulator import StringSimulatorConfig
+from autoguitar.simulation.tuning_benchmark import (
+    get_random_notes,
+    run_tuning_simulation,
+)
+from autoguitar.tuning.backlash import BacklashModel
+from autoguitar.tuning.tuner_strategy import (
+    ModelBasedTunerStrategy,
+    RLSTunerStrategy,
+    TunerStrategy,
+)
+
+logging.basicConfig(level=logging.WARNING)
+logging.getLogger("autoguitar.tuning.tuner").setLevel(logging.INFO)
+logging.getLogger("autoguitar.simulation.tuning_benchmark").setLevel(logging.INFO)
+# There's usually no dashboard running when simulating, and maybe no network
+logging.getLogger("autoguitar.dashboard.telemetry").setLevel(logging.CRITICAL)
+logging.getLogger("autoguitar.time_sync").setLevel(logging.ERROR)
+
+
+@click.command()
+@click.option("--n-notes", default=10, help="Number of random target notes.")
+@click.option("--tolerance-cents", default=10.0)
+@click.option("--timeout-sec", default=10.0, help="Give up on a note after this.")
+@click.option(
+    "--hold-sec", default=1.0, help="Keep playing a note this long after converging."
+)
+@click.option("--seed", default=0)
+@click.option(
+    "--strategy",
+    type=click.Choice(["model", "rls"]),
+    default="model",
+    help="Fixed-coefficient model or recursive least squares.",
+)
+@click.option(
+    "--coef",
+    default=4.35,
+    help="Initial coefficient. The simulated string's is 4.35.",
+)
+@click.option(
+    "--backlash/--no-backlash",
+    default=False,
+    help="Learn a backlash model online to land on the target on the first try.",
+)
+def main(
+    n_notes: int,
+    tolerance_cents: float,
+    timeout_sec: float,
+    hold_sec: float,
+    seed: int,
+    strategy: str,
+    coef: float,
+    backlash: bool,
+):
+    backlash_model = BacklashModel() if backlash else None
+    if strategy == "rls":
+        tuner_strategy: TunerStrategy = RLSTunerStrategy(
+            coef=coef, backlash_model=backlash_model
+        )
+    else:
+        tuner_strategy = ModelBasedTunerStrategy(
+            coef=coef, adaptiveness=0.5, backlash_model=backlash_model
+        )
+
+    results = run_tuning_simulation(
+        tuner_strategy,
+        notes=get_random_notes(n_notes, seed=seed),
+        string_config=StringSimulatorConfig(seed=seed),
+        tolerance_cents=tolerance_cents,
+        timeout_sec=timeout_sec,
+        hold_sec=hold_sec,
+    )
+
+    print(
+        "".join(
+            f"{x:>14}"
+            for x in ["Note", "Target Hz", "First cents", "Final Hz", "Time (s)"]
+        )
+    )
+    for result in results:
+        print(
+            "".join(
+                f"{x:>14}"
+                for x in [
+                    result.note,
+                    f"{result.target_frequency:.2f}",
+                    f"{result.first_error_cents:.1f}",
+                    f"{result.final_frequency:.2f}",
+                    (
+                        f"{result.converged_after_sec:.2f}"
+                        if result.converged_after_sec is not None
+                        else "-"
+                    ),
+                ]
+            )
+        )
+
+    convergence_times = [
+        r.converged_after_sec for r in results if r.converged_after_sec is not None
+    ]
+    print(
+        f"Converged on {len(convergence_times)}/{n_notes} notes, "
+        f"median time {np.median(convergence_times):.2f}s"
+        if convergence_times
+        else "Did not converge on any note."
+    )
+    first_errors_cents = [r.first_error_cents for r in results]
+    n_first_try = sum(abs(x) <= tolerance_cents for x in first_errors_cents)
+    print(
+        f"Landed within tolerance on the first try on {n_first_try}/{n_notes} notes, "
+        f"median abs error {np.median(np.abs(first_errors_cents)):.1f} cents"
+    )
+    print(f"Final strategy: {tuner_strategy}")
+    if backlash_model is not None:
+        print(f"Final backlash model: {backlash_model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import time
 import mido
 import numpy as np
 
+from autoguitar.control.strum_scheduler import StrumEvent, StrumPattern, StrumScheduler
 from autoguitar.control.strummer import Strummer
 from autoguitar.dsp.input_stream import InputStream
 from autoguitar.midi_utils import find_midi_input
@@ -11,6 +12,12 @@ from autoguitar.motor import MotorController, get_motor
 
 logging.basicConfig(level=logging.INFO)
 
+# Strum, mute a third of a beat later
+PATTERN = StrumPattern(
+    events=[StrumEvent(beat=0), StrumEvent(beat=1 / 3, action="mute")],
+    beats_per_bar=1,
+)
+
 
 def main():
     motor = get_motor(motor_number=1)
@@ -39,12 +46,8 @@ def main():
 
         # Play a strumming pattern
         time.sleep(1)
-        sleep = 0.1
-        for _ in range(4):
-            strummer.strum()
-            time.sleep(sleep)
-            strummer.mute()
-            time.sleep(sleep * 2)
+        with StrumScheduler(strummer=strummer, pattern=PATTERN, bpm=200) as scheduler:
+            scheduler.wait_until_bar(4)
 
         if inport is None:
             print("MIDI control not available, exiting.")
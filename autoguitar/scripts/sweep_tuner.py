@@ -0,0 +1,145 @@
+"""Search for good ModelBasedTunerStrategy parameters, see autoguitar/tuning/sweep.py.
+
+Grid search:
+    python -m autoguitar.scripts.sweep_tuner -p coef=4,4.35,5 -p adaptiveness=0.3,0.8
+Random search:
+    python -m autoguitar.scripts.sweep_tuner --random 50 -p coef=3:6 \
+        -p median_smoothing_window=1:5
+"""
+
+import glob
+import logging
+from pathlib import Path
+from typing import Any
+
+import click
+import numpy as np
+
+from autoguitar.tuning.sweep import (
+    DEFAULT_CACHE_DIR,
+    SweepData,
+    get_grid,
+    get_random_configs,
+    rank_results,
+    run_sweep,
+)
+
+logging.basicConfig(level=logging.WARNING)
+logging.getLogger("autoguitar.tuning.sweep").setLevel(logging.INFO)
+logging.getLogger("autoguitar.tuning.tuner").setLevel(logging.WARNING)
+logging.getLogger("autoguitar.dashboard.telemetry").setLevel(logging.CRITICAL)
+logging.getLogger("autoguitar.time_sync").setLevel(logging.ERROR)
+
+
+def parse_value(s: str) -> Any:
+    for parse in [int, float]:
+        try:
+            return parse(s)
+        except ValueError:
+            pass
+    return s
+
+
+def format_float(x: float, spec: str) -> str:
+    return format(x, spec) if np.isfinite(x) else "-"
+
+
+def parse_grid(params: tuple[str, ...]) -> dict[str, list[Any]]:
+    """Parse "name=v1,v2,..." options."""
+    grid = {}
+    for param in params:
+        name, _, values = param.partition("=")
+        grid[name] = [parse_value(v) for v in values.split(",")]
+    return grid
+
+
+def parse_ranges(params: tuple[str, ...]) -> dict[str, tuple[Any, Any]]:
+    """Parse "name=low:high" options."""
+    ranges = {}
+    for param in params:
+        name, _, values = param.partition("=")
+        low, _, high = values.partition(":")
+        ranges[name] = (parse_value(low), parse_value(high))
+    return ranges
+
+
+@click.command()
+@click.option(
+    "--param",
+    "-p",
+    "params",
+    multiple=True,
+    help='"name=v1,v2,..." for grid search, "name=low:high" with --random.',
+)
+@click.option(
+    "--random",
+    "n_random",
+    default=0,
+    help="Sample this many random configurations instead of a grid.",
+)
+@click.option("--seed", default=0)
+@click.option(
+    "--data",
+    type=click.Choice(["sessions", "simulation"]),
+    default="sessions",
+    help="Replay recorded sessions or tune a simulated string.",
+)
+@click.option("--sessions", default="data/tuning_data_selected/*.jsonl")
+@click.option("--n-notes", default=20, help="Number of notes for --data simulation.")
+@click.option("--tolerance-cents", default=10.0)
+@click.option("--workers", default=None, type=int, help="Default: one per CPU.")
+@click.option("--cache-dir", default=str(DEFAULT_CACHE_DIR))
+@click.option("--no-cache", is_flag=True)
+@click.option("--top", default=20, help="How many results to show.")
+def main(
+    params: tuple[str, ...],
+    n_random: int,
+    seed: int,
+    data: str,
+    sessions: str,
+    n_notes: int,
+    tolerance_cents: float,
+    workers: int | None,
+    cache_dir: str,
+    no_cache: bool,
+    top: int,
+):
+    if n_random:
+        configs = get_random_configs(
+            parse_ranges(params), n_configs=n_random, seed=seed
+        )
+    else:
+        configs = get_grid(parse_grid(params))
+
+    sweep_data = SweepData(
+        kind="sessions" if data == "sessions" else "simulation",
+        session_paths=(
+            sorted(Path(p) for p in glob.glob(sessions)) if data == "sessions" else []
+        ),
+        n_notes=n_notes,
+        seed=seed,
+        tolerance_cents=tolerance_cents,
+    )
+    results = run_sweep(
+        configs,
+        sweep_data,
+        max_workers=workers,
+        cache_dir=None if no_cache else Path(cache_dir),
+    )
+
+    columns = ["Reached", "Time (s)", "Error (c)", "Overshoot", "Pareto", "Params"]
+    print("".join(f"{c:>11}" for c in columns[:-1]) + f"  {columns[-1]}")
+    for result, is_optimal in rank_results(results)[:top]:
+        params_str = ", ".join(f"{k}={v:.4g}" for k, v in result.params.items())
+        print(
+            f"{result.fraction_reached:>11.0%}"
+            f"{format_float(result.median_time_to_within_sec, '.2f'):>11}"
+            f"{result.median_abs_error_cents:>11.1f}"
+            f"{format_float(result.mean_overshoot_cents, '.1f'):>11}"
+            f"{'*' if is_optimal else '':>11}"
+            f"  {params_str}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import logging
+import os
+from pathlib import Path
+
+from pydantic import BaseModel, ValidationError
+
+from autoguitar.control.strum_offsets import StrumOffsetTable
+from autoguitar.control.strummer import Calibration, Strummer
+from autoguitar.position_journal import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_STATE_PATH = STATE_DIR / "session_state.json"
+
+
+class TunerModelState(BaseModel):
+    """The parameters of ModelBasedTunerStrategy, see there."""
+
+    coef: float
+    intercept: float | None
+
+
+class SessionState(BaseModel):
+    """What a run of main.py learned that the next one can start from.
+
+    Both the calibration and the tuner model are in motor steps, so they're only
+    valid as long as the motor server keeps the motor positions, see
+    PositionJournal. The calibration is validated on startup; the tuner model adapts
+    to new readings anyway.
+    """
+
+    calibration: Calibration | None = None
+    tuner_model: TunerModelState | None = None
+    # Unlike the calibration, this doesn't depend on the motor positions
+    strum_offsets: StrumOffsetTable | None = None
+
+
+def load_session_state(path: Path = DEFAULT_SESSION_STATE_PATH) -> SessionState:
+    if not path.exists():
+        return SessionState()
+
+    try:
+        return SessionState.model_validate_json(path.read_text())
+    except ValidationError as e:
+        logger.warning(f"Ignoring invalid session state in {path}: {e}")
+        return SessionState()
+
+
+def save_session_state(
+    state: SessionState, path: Path = DEFAULT_SESSION_STATE_PATH
+) -> None:
+    """Save atomically, so that a crash leaves either the old or the new state."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("w") as f:
+        f.write(state.model_dump_json(indent=2))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def restore_strummer(
+    strummer: Strummer, state: SessionState, recalibrate: bool = False
+) -> None:
+    """Use the saved calibration if it's still valid, otherwise calibrate.
+
+    The calibration in `state` is updated and saved.
+    """
+    strummer.offset_table = state.strum_offsets
+    if (
+        recalibrate
+        or state.calibration is None
+        or not strummer.validate_calibration(state.calibration)
+    ):
+        strummer.calibrate()
+    state.calibration = strummer.calibration
+    save_session_state(state)
@@ -0,0 +1,308 @@
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Callable
+
+import numpy as np
+import sounddevice as sd  # pyright: ignore[reportMissingTypeStubs]
+from pydantic import BaseModel
+
+from autoguitar.clock import SYSTEM_CLOCK, Clock
+from autoguitar.dsp.input_stream import InputStream, InputStreamCallbackData
+from autoguitar.motor import STEPS_PER_TURN_WITHOUT_MICROSTEPPING, VirtualMotor
+from autoguitar.virtual_string import PluckedStringVoice
+
+logger = logging.getLogger(__name__)
+
+
+class StringSimulatorConfig(BaseModel):
+    """Physical parameters of the simulated string.
+
+    The defaults are roughly what we measured on the real instrument.
+    """
+
+    # The frequency follows f^2 = coef*x + intercept, see ModelBasedTunerStrategy.
+    coef: float = 4.35
+    intercept: float = 4300.0
+    # How much the intercept changes per second. Negative because the string
+    # slowly stretches and loses tension.
+    intercept_drift_per_sec: float = -2.0
+    # Random walk on top of the drift, in units of f^2 per sqrt(second)
+    intercept_noise: float = 5.0
+
+    # The string is squeezed by the wood, so its tension lags behind the motor.
+    # Empirically, this makes the string a bit higher when approached from below,
+    # and vice versa. This is the total width of the hysteresis loop in steps.
+    hysteresis_steps: float = 20.0
+
+    min_frequency: float = 30.0
+    max_frequency: float = 300.0
+
+    # How quickly the sound of a pluck fades away
+    decay_halftime_sec: float = 0.7
+    attack_sec: float = 0.005
+    n_partials: int = 8
+    amplitude: float = 0.1
+    noise_level: float = 0.002
+    sample_rate: int = 44100
+
+    # Where the pick touches the string, in pick motor steps (modulo one turn)
+    pick_string_position: float = 0.0
+    # How far past the string the pick has to go for it to pluck it, at 100 Hz.
+    # A looser string is held longer by the pick.
+    pick_hold_steps_at_100hz: float = 8.0
+    pick_steps_per_turn: int = STEPS_PER_TURN_WITHOUT_MICROSTEPPING * 2
+
+    seed: int = 0
+
+
+class SimulatedString:
+    """A physical model of the string, driven by the tuning and pick motors.
+
+    Unlike VirtualString, this follows the same steps -> frequency relationship
+    as the real string, including hysteresis and the intercept drifting over time,
+    so that we can run the real tuner and strummer code against it.
+    """
+
+    def __init__(
+        self,
+        config: StringSimulatorConfig | None = None,
+        clock: Clock = SYSTEM_CLOCK,
+    ):
+        self.config = config or StringSimulatorConfig()
+        self.clock = clock
+        self._rng = np.random.default_rng(self.config.seed)
+        self._lock = threading.Lock()
+
+        self.tuning_steps = 0
+        # Position of the string's "loose end", lagging behind the motor
+        self._loose_steps = 0.0
+        self.intercept = self.config.intercept
+        self._last_update_time = clock.monotonic()
+
+        self.pick_steps = 0
+        self._pick_side = -1  # Which side of the string the pick is on
+        self._last_pick_relative_steps = self._get_pick_relative_steps()
+
+        self.pluck_times: list[float] = []
+        self._voice = PluckedStringVoice(
+            sample_rate=self.config.sample_rate,
+            frequency=self.get_frequency(),
+            n_partials=self.config.n_partials,
+            attack_sec=self.config.attack_sec,
+            decay_halftime_sec=self.config.decay_halftime_sec,
+        )
+        self._voice.time_sec = clock.monotonic()
+
+    def get_frequency(self) -> float:
+        """The current frequency of the string, in Hz."""
+        with self._lock:
+            self._update_intercept()
+            effective_steps = 2 * self.tuning_steps - self._loose_steps
+            frequency_squared = self.config.coef * effective_steps + self.intercept
+
+        return float(
+            np.clip(
+                np.sqrt(max(frequency_squared, 0)),
+                self.config.min_frequency,
+                self.config.max_frequency,
+            )
+        )
+
+    def on_tuning_step(self, forward: bool):
+        with self._lock:
+            self.tuning_steps += 1 if forward else -1
+            half_width = self.config.hysteresis_steps / 2
+            self._loose_steps = float(
+                np.clip(
+                    self._loose_steps,
+                    self.tuning_steps - half_width,
+                    self.tuning_steps + half_width,
+                )
+            )
+
+    def on_pick_step(self, forward: bool):
+        with self._lock:
+            self.pick_steps += 1 if forward else -1
+            relative_steps = self._get_pick_relative_steps()
+            wrapped = (
+                abs(relative_steps - self._last_pick_relative_steps)
+                > self.config.pick_steps_per_turn / 2
+            )
+            self._last_pick_relative_steps = relative_steps
+
+        if wrapped:
+            # Went around the far side of the circle, where there is no string
+            self._pick_side = 1 if relative_steps > 0 else -1
+            return
+
+        hold_steps = self.config.pick_hold_steps_at_100hz * (100 / self.get_frequency())
+        if self._pick_side < 0 and relative_steps > hold_steps:
+            self._pick_side = 1
+            self.pluck()
+        elif self._pick_side > 0 and relative_steps < -hold_steps:
+            self._pick_side = -1
+            self.pluck()
+
+    def pluck(self):
+        now = self.clock.monotonic()
+        with self._lock:
+            # If the current block hasn't been rendered yet, the pluck is scheduled
+            # for the right sample within it.
+            self._voice.pluck(now)
+            self.pluck_times.append(now)
+
+    def render(self, start_time: float, n_samples: int) -> np.ndarray:
+        """Synthesize the audio the string produces from `start_time` on.
+
+        Successive calls should be for consecutive time ranges so that the phase
+        stays continuous. The frequency glides towards the current one.
+        """
+        frequency = self.get_frequency()
+        with self._lock:
+            self._voice.time_sec = start_time
+            self._voice.set_frequency(frequency)
+            y = self._voice.render(n_samples)
+
+        y = self.config.amplitude * y
+        y += self._rng.normal(scale=self.config.noise_level, size=n_samples)
+        return y.astype(np.float32)
+
+    def tuning_motor(self, step_time_sec: float = 0.0002) -> VirtualMotor:
+        return SimulatedStringMotor(
+            on_step=self.on_tuning_step, step_time_sec=step_time_sec, clock=self.clock
+        )
+
+    def pick_motor(self, step_time_sec: float = 0.0016) -> VirtualMotor:
+        return SimulatedStringMotor(
+            on_step=self.on_pick_step,
+            step_time_sec=step_time_sec,
+            clock=self.clock,
+            steps_per_turn=self.config.pick_steps_per_turn,
+        )
+
+    def _update_intercept(self):
+        """Apply drift and noise for the time since the last update. Call with the
+        lock held."""
+        now = self.clock.monotonic()
+        dt = now - self._last_update_time
+        if dt <= 0:
+            return
+
+        self.intercept += self.config.intercept_drift_per_sec * dt
+        self.intercept += self.config.intercept_noise * np.sqrt(dt) * self._rng.normal()
+        self._last_update_time = now
+
+    def _get_pick_relative_steps(self) -> float:
+        """Position of the pick relative to the string, in (-turn/2, turn/2]."""
+        turn = self.config.pick_steps_per_turn
+        relative = (self.pick_steps - self.config.pick_string_position) % turn
+        return relative - turn if relative > turn / 2 else relative
+
+
+class SimulatedStringMotor(VirtualMotor):
+    def __init__(
+        self,
+        on_step: Callable[[bool], None],
+        step_time_sec: float,
+        clock: Clock,
+        steps_per_turn: int = STEPS_PER_TURN_WITHOUT_MICROSTEPPING,
+    ):
+        super().__init__(step_time_sec=step_time_sec, clock=clock)
+        self.on_step = on_step
+        self._steps_per_turn = steps_per_turn
+
+    def step(self, forward: bool):
+        super().step(forward)
+        self.on_step(forward)
+
+    def steps_per_turn(self) -> int:
+        return self._steps_per_turn
+
+
+@dataclass
+class SimulatedStreamInfo:
+    """The parts of sd.InputStream that the rest of the code looks at."""
+
+    samplerate: float
+    channels: int = 1
+
+
+class SimulatedInputStream(InputStream):
+    """An InputStream that gets its audio from one or more SimulatedStrings.
+
+    Blocks are produced at the pace given by the clock, so with a SimulatedClock,
+    everything downstream (pitch detection, loudness detection, the tuner...) runs
+    faster than real time without a sound card.
+
+    Args:
+        string: The string, or a list of strings.
+        block_size: Samples per block.
+        clock: The clock to produce blocks by.
+        separate_channels: If True, each string gets its own channel, like with a
+            hexaphonic pickup. Otherwise, the strings are mixed into one channel,
+            like with a single microphone.
+    """
+
+    def __init__(
+        self,
+        string: SimulatedString | list[SimulatedString],
+        block_size: int,
+        clock: Clock = SYSTEM_CLOCK,
+        separate_channels: bool = False,
+    ):
+        super().__init__(block_size=block_size)
+        self.strings = string if isinstance(string, list) else [string]
+        self.string = self.strings[0]
+        self.separate_channels = separate_channels
+        self.samplerate = self.string.config.sample_rate
+        self.clock = clock
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.stream = SimulatedStreamInfo(
+            samplerate=self.samplerate,
+            channels=len(self.strings) if self.separate_channels else 1,
+        )
+        blocks_per_sec = self.samplerate / self.block_size
+        self.readings = deque(maxlen=int(self.history_sec * blocks_per_sec))
+        self.stop_event.clear()
+        self.thread = self.clock.start_thread(self._produce_blocks)
+        return self
+
+    def __exit__(self, exc_type: type, exc_val: Exception, exc_tb: TracebackType):
+        self.stop_event.set()
+        assert self.thread is not None
+        self.clock.join_thread(self.thread)
+        self.stream = None
+
+    def wait_for_initialization(self):
+        self.readings.clear()
+        while not self.readings:
+            self.clock.sleep(self.block_size / self.samplerate)
+
+    def _produce_blocks(self):
+        block_duration = self.block_size / self.samplerate
+
+        while not self.stop_event.is_set():
+            start_time = self.clock.monotonic()
+            self.clock.sleep(block_duration)
+
+            ys = [string.render(start_time, self.block_size) for string in self.strings]
+            if self.separate_channels:
+                indata = np.stack(ys, axis=1)
+            else:
+                indata = np.sum(ys, axis=0)[:, np.newaxis]
+
+            data = InputStreamCallbackData(
+                indata=indata,
+                frames=self.block_size,
+                # Like inputBufferAdcTime: the time of the first sample in the block
+                timestamp=start_time,
+                status=sd.CallbackFlags(),
+            )
+            self.readings.append(data)
+            self.on_reading.notify(data)
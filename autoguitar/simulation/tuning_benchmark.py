@@ -0,0 +1,157 @@
+"""Tune a simulated string to a sequence of notes, faster than real time."""
+
+import logging
+
+import librosa
+import numpy as np
+from pydantic import BaseModel
+
+from autoguitar.clock import SimulatedClock
+from autoguitar.control.strummer import Strummer
+from autoguitar.dsp.pitch_detector import PitchDetector
+from autoguitar.motor import MotorController
+from autoguitar.simulation.string_simulator import (
+    SimulatedInputStream,
+    SimulatedString,
+    StringSimulatorConfig,
+)
+from autoguitar.tuning.tuner import Tuner
+from autoguitar.tuning.tuner_strategy import TunerStrategy
+
+logger = logging.getLogger(__name__)
+
+# The pitch detector can't detect anything below E1, so if we aimed for E1 and
+# undershot, the readings would be clamped to E1 and we'd never notice.
+MIN_NOTE = "F1"
+MAX_NOTE = "G#2"
+RESTRUM_EVERY_SEC = 1.0
+
+
+class NoteResult(BaseModel):
+    note: str
+    target_frequency: float
+    # Where we landed after the first move, before any correction
+    first_error_cents: float
+    final_frequency: float
+    final_error_cents: float
+    # None if we didn't get within tolerance before the timeout
+    converged_after_sec: float | None
+
+
+def get_cents_between_frequencies(f1: float, f2: float) -> float:
+    return float(1200 * np.log2(f2 / f1))
+
+
+def get_random_notes(n_notes: int, seed: int = 0) -> list[int]:
+    rng = np.random.default_rng(seed)
+    notes = rng.integers(
+        librosa.note_to_midi(MIN_NOTE), librosa.note_to_midi(MAX_NOTE) + 1, n_notes
+    )
+    return [int(x) for x in notes]
+
+
+def run_tuning_simulation(
+    tuner_strategy: TunerStrategy,
+    notes: list[int],
+    string_config: StringSimulatorConfig | None = None,
+    tolerance_cents: float = 10.0,
+    timeout_sec: float = 10.0,
+    hold_sec: float = 1.0,
+) -> list[NoteResult]:
+    """Tune a simulated string to each of `notes` (MIDI numbers) in turn.
+
+    Args:
+        tuner_strategy: The strategy under test. It should be freshly created.
+        notes: The target notes, as MIDI numbers.
+        string_config: The simulated string. The default matches the real one.
+        tolerance_cents: How close to the target counts as converged.
+        timeout_sec: Give up on a note after this.
+        hold_sec: Keep playing a note this long after converging. This is also when
+            the strategy gets the stable readings it learns from.
+    """
+    clock = SimulatedClock()
+    string = SimulatedString(
+        config=string_config or StringSimulatorConfig(), clock=clock
+    )
+    results = []
+
+    with (
+        SimulatedInputStream(string, block_size=2048, clock=clock) as input_stream,
+        MotorController(
+            motor=string.tuning_motor(), max_steps=100000, clock=clock
+        ) as mc0,
+        MotorController(
+            motor=string.pick_motor(), max_steps=int(1e9), clock=clock
+        ) as mc1,
+    ):
+        strummer = Strummer(
+            input_stream=input_stream, motor_controller=mc1, clock=clock
+        )
+        strummer.calibrate()
+        logger.info(f"Calibrated strummer at t={clock.monotonic():.1f}s (simulated)")
+
+        # Run inline so that the simulation is deterministic. pYIN is too slow
+        # to run faster than real time. (Larger blocks above are for the same
+        # reason: the loudness detector runs once per block.)
+        pitch_detector = PitchDetector(input_stream=input_stream, threaded=False)
+        pitch_detector.use_pyin = False
+
+        tuner = Tuner(
+            input_stream=input_stream,
+            motor_controller=mc0,
+            initial_target_frequency=string.get_frequency(),
+            tuner_strategy=tuner_strategy,
+            pitch_detector=pitch_detector,
+        )
+
+        for note in notes:
+            target_frequency = float(librosa.midi_to_hz(note))
+            tuner.set_target(target_frequency)
+            start_time = clock.monotonic()
+
+            while mc0.is_moving():
+                clock.sleep(0.01)
+            first_error_cents = get_cents_between_frequencies(
+                target_frequency, string.get_frequency()
+            )
+            last_strum_time = -np.inf
+            converged_at = None
+
+            while clock.monotonic() - start_time < timeout_sec:
+                if clock.monotonic() - last_strum_time >= RESTRUM_EVERY_SEC:
+                    strummer.strum()
+                    last_strum_time = clock.monotonic()
+
+                clock.sleep(0.05)
+                error_cents = get_cents_between_frequencies(
+                    target_frequency, string.get_frequency()
+                )
+                if abs(error_cents) <= tolerance_cents and not mc0.is_moving():
+                    converged_at = clock.monotonic() - start_time
+                    break
+
+            if converged_at is not None:
+                hold_until = clock.monotonic() + hold_sec
+                while clock.monotonic() < hold_until:
+                    if clock.monotonic() - last_strum_time >= RESTRUM_EVERY_SEC:
+                        strummer.strum()
+                        last_strum_time = clock.monotonic()
+                    clock.sleep(0.05)
+
+            results.append(
+                NoteResult(
+                    note=librosa.midi_to_note(note),
+                    target_frequency=target_frequency,
+                    first_error_cents=first_error_cents,
+                    final_frequency=string.get_frequency(),
+                    final_error_cents=get_cents_between_frequencies(
+                        target_frequency, string.get_frequency()
+                    ),
+                    converged_after_sec=converged_at,
+                )
+            )
+
+        tuner.unsubscribe()
+
+    logger.info(f"Total simulated time: {clock.monotonic():.1f}s")
+    return results
@@ -0,0 +1,159 @@
+import threading
+
+import numpy as np
+
+
+class StepHistory:
+    """A ring buffer of (monotonic timestamp, position) pairs, one per motor step.
+
+    The motor controller appends an entry every time it executes a step, so we know
+    exactly where the motor was at any point in the recent past. This matters for
+    the tuner and the strummer because audio readings arrive with a delay: by the
+    time a pitch reading comes in, the motor may have moved on.
+
+    The data is kept in preallocated numpy arrays so that appending is cheap enough
+    to do on the motor thread and exporting is just a slice copy.
+    """
+
+    def __init__(self, capacity: int = 2**16):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = capacity
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._steps = np.zeros(capacity, dtype=np.int64)
+        # Index where the next entry will be written
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, steps: int):
+        """Record that the motor was at `steps` from `timestamp` on.
+
+        Timestamps are expected to be non-decreasing.
+        """
+        with self._lock:
+            self._timestamps[self._head] = timestamp
+            self._steps[self._head] = steps
+            self._head = (self._head + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, timestamps: np.ndarray, steps: np.ndarray):
+        """Append multiple entries at once, e.g. ones received from a remote motor."""
+        for timestamp, step in zip(timestamps, steps):
+            self.append(float(timestamp), int(step))
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._size = 0
+
+    def get_arrays(
+        self, start: float | None = None, end: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get (timestamps, steps) arrays in chronological order.
+
+        Args:
+            start: If given, only return entries with timestamp >= start.
+            end: If given, only return entries with timestamp <= end.
+
+        Returns:
+            Copies of the underlying data, so they're safe to use from any thread.
+        """
+        with self._lock:
+            timestamps, steps = self._ordered()
+            lo = 0 if start is None else np.searchsorted(timestamps, start, "left")
+            hi = (
+                len(timestamps)
+                if end is None
+                else np.searchsorted(timestamps, end, "right")
+            )
+            return timestamps[lo:hi].copy(), steps[lo:hi].copy()
+
+    def get_steps_at(self, timestamp: float) -> int | None:
+        """The position of the motor at the given time.
+
+        Returns None if the timestamp is older than the oldest entry.
+        """
+        with self._lock:
+            timestamps, steps = self._ordered()
+            i = np.searchsorted(timestamps, timestamp, "right") - 1
+            if i < 0:
+                return None
+            return int(steps[i])
+
+    def was_moving(self, start: float, end: float) -> bool:
+        """Whether the motor executed any step in the (start, end] interval.
+
+        Note that if the interval is shorter than the time it takes to do one step,
+        this can return False even if the motor was in the middle of a move.
+        """
+        with self._lock:
+            timestamps, steps = self._ordered()
+            lo = np.searchsorted(timestamps, start, "right")
+            hi = np.searchsorted(timestamps, end, "right")
+            if lo == hi:
+                return False
+            # Entries that don't change the position (e.g. the initial one written
+            # when the controller starts) don't count as movement.
+            previous = steps[lo - 1] if lo > 0 else steps[lo]
+            return bool(np.any(steps[lo:hi] != previous))
+
+    def get_mean_steps(self, start: float, end: float) -> float | None:
+        """The time-weighted average position of the motor over [start, end].
+
+        Useful for pairing the position with a reading computed from an analysis
+        window rather than a single point in time. Returns None if the window
+        starts before the oldest entry.
+        """
+        with self._lock:
+            timestamps, steps = self._ordered()
+            i_start = np.searchsorted(timestamps, start, "right") - 1
+            if i_start < 0:
+                return None
+            if end <= start:
+                return float(steps[i_start])
+
+            i_end = np.searchsorted(timestamps, end, "right")
+            # Each position is held from its timestamp until the next one
+            boundaries = np.append(timestamps[i_start:i_end], end)
+            boundaries[0] = start
+            durations = np.diff(boundaries)
+            return float(np.dot(steps[i_start:i_end], durations) / (end - start))
+
+    def get_steps_range(self, start: float, end: float) -> tuple[int, int] | None:
+        """The (min, max) position of the motor over [start, end].
+
+        Returns None if the window starts before the oldest entry.
+        """
+        with self._lock:
+            timestamps, steps = self._ordered()
+            i_start = np.searchsorted(timestamps, start, "right") - 1
+            if i_start < 0:
+                return None
+            i_end = max(np.searchsorted(timestamps, end, "right"), i_start + 1)
+            window_steps = steps[i_start:i_end]
+            return int(window_steps.min()), int(window_steps.max())
+
+    def to_json_dict(
+        self, start: float | None = None, end: float | None = None
+    ) -> dict[str, list[float] | list[int]]:
+        """Export entries to a JSON-serializable dict, e.g. for the session log."""
+        timestamps, steps = self.get_arrays(start=start, end=end)
+        return {"timestamps": timestamps.tolist(), "steps": steps.tolist()}
+
+    def _ordered(self) -> tuple[np.ndarray, np.ndarray]:
+        """Views/copies of the data in chronological order. Call with the lock held."""
+        if self._size < self.capacity:
+            return self._timestamps[: self._size], self._steps[: self._size]
+
+        # The buffer has wrapped around, the oldest entry is at self._head
+        return (
+            np.concatenate(
+                [self._timestamps[self._head :], self._timestamps[: self._head]]
+            ),
+            np.concatenate([self._steps[self._head :], self._steps[: self._head]]),
+        )
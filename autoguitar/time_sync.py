@@ -1,41 +1,239 @@
-import functools
 import logging
+import os
+import threading
 import time
-from datetime import datetime
-from typing import Annotated
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Deque
 
 import ntplib
 from pydantic import PlainValidator  # pyright: ignore[reportMissingTypeStubs]
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_NTP_SERVER = "pool.ntp.org"
 
-# Only do this once per run to get a consistent timer
-@functools.cache
-def get_ntp_offset_sec() -> float:
-    c = ntplib.NTPClient()
 
-    # Get a bit more precision by averaging multiple requests
-    n_requests = 1  # more can lead to getting blocked by the NTP server
-    offsets = []
-    for _ in range(n_requests):
-        offsets.append(c.request("pool.ntp.org").offset)
-    offset = sum(offsets) / len(offsets)
+class ClockMapping:
+    """A linear mapping between two time domains, estimated from paired samples.
+
+    Two clocks that both measure seconds still run at slightly different rates
+    (drift) and have different origins (offset). Given samples of (source, target)
+    times taken at the same moment, we fit
+        target = source + offset + drift * (source - reference)
+    by least squares over the last `max_samples` samples. Running sums make adding a
+    sample O(1), so this is cheap enough for the audio callback.
+
+    With no samples, the mapping is the identity (plus `initial_offset`).
+    """
+
+    def __init__(self, max_samples: int = 1000, initial_offset: float = 0.0):
+        self.max_samples = max_samples
+        self.initial_offset = initial_offset
+        self._samples: Deque[tuple[float, float]] = deque()
+        self._reference: float | None = None
+        # Running sums of x = source - reference and y = target - source
+        self._sums = [0.0] * 5  # n, x, y, xx, xy
+        self._n_removed = 0
+        self._lock = threading.Lock()
+        # (offset, drift, reference), replaced atomically so that reads need no lock
+        self._params = (initial_offset, 0.0, 0.0)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add_sample(self, source: float, target: float):
+        with self._lock:
+            if self._reference is None:
+                self._reference = source
+
+            self._samples.append((source, target))
+            self._update_sums(source, target, sign=1)
+            if len(self._samples) > self.max_samples:
+                self._update_sums(*self._samples.popleft(), sign=-1)
+                self._n_removed += 1
+                if self._n_removed % self.max_samples == 0:
+                    # Adding and subtracting accumulates rounding errors, and the
+                    # reference gets further and further in the past. Start over.
+                    self._rebuild_sums()
+
+            self._params = self._fit()
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._reference = None
+            self._sums = [0.0] * 5
+            self._n_removed = 0
+            self._params = (self.initial_offset, 0.0, 0.0)
+
+    def __call__(self, source: float) -> float:
+        """Map a time from the source domain to the target domain."""
+        offset, drift, reference = self._params
+        return source + offset + drift * (source - reference)
+
+    def inverse(self, target: float) -> float:
+        """Map a time from the target domain back to the source domain."""
+        offset, drift, reference = self._params
+        return (target - offset + drift * reference) / (1 + drift)
+
+    @property
+    def offset(self) -> float:
+        """The offset at the most recent sample."""
+        offset, drift, reference = self._params
+        latest = self._samples[-1][0] if self._samples else reference
+        return offset + drift * (latest - reference)
+
+    @property
+    def drift(self) -> float:
+        """How many seconds the target clock gains per second of the source clock."""
+        return self._params[1]
+
+    def _update_sums(self, source: float, target: float, sign: int):
+        assert self._reference is not None
+        x = source - self._reference
+        y = target - source
+        for i, value in enumerate([1, x, y, x * x, x * y]):
+            self._sums[i] += sign * value
+
+    def _rebuild_sums(self):
+        self._reference = self._samples[0][0]
+        self._sums = [0.0] * 5
+        for source, target in self._samples:
+            self._update_sums(source, target, sign=1)
+
+    def _fit(self) -> tuple[float, float, float]:
+        n, sx, sy, sxx, sxy = self._sums
+        assert self._reference is not None
+        denominator = n * sxx - sx * sx
+        # Samples spanning almost no time can't tell us anything about the drift
+        if n < 2 or denominator <= 1e-9 * n * n:
+            return (sy / n, 0.0, self._reference)
+
+        drift = (n * sxy - sx * sy) / denominator
+        offset = (sy - drift * sx) / n
+        return (offset, drift, self._reference)
+
+
+class ClockService:
+    """Cheap network timestamps that keep working without network access.
+
+    Timestamps are computed from time.monotonic(), mapped to network time using a
+    ClockMapping. Until the first sync, the mapping is based on the system clock. A
+    background thread periodically asks an NTP server for the offset and adds a
+    sample to the mapping, so that we also track how the local clock drifts.
+
+    Nothing happens on construction, the background thread starts on first use. If
+    the server can't be reached, we log a warning and keep using what we have.
 
-    logger.info(f"Average NTP offset: {offset}")
+    Args:
+        ntp_server: The NTP server to sync with, e.g. a local one on the laptop
+            running the dashboard so that all machines agree. None means don't
+            sync and use the system clock.
+        sync_interval_sec: How often to sync.
+        timeout_sec: Timeout of a single NTP request.
+    """
 
-    return offset
+    def __init__(
+        self,
+        ntp_server: str | None = DEFAULT_NTP_SERVER,
+        sync_interval_sec: float = 600.0,
+        timeout_sec: float = 2.0,
+    ):
+        self.ntp_server = ntp_server
+        self.sync_interval_sec = sync_interval_sec
+        self.timeout_sec = timeout_sec
+
+        self.monotonic_to_network = ClockMapping(
+            max_samples=100, initial_offset=time.time() - time.monotonic()
+        )
+        self.n_successful_syncs = 0
+        self._thread: threading.Thread | None = None
+        self._wake_up = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_ntp_server(self, ntp_server: str | None):
+        """Switch to a different server (or to None for offline) and re-sync."""
+        self.ntp_server = ntp_server
+        self._wake_up.set()
+
+    def network_timestamp(self, monotonic: float | None = None) -> float:
+        """The network time at `monotonic`, or now. Seconds since the epoch."""
+        self._ensure_started()
+        if monotonic is None:
+            monotonic = time.monotonic()
+        return self.monotonic_to_network(monotonic)
+
+    def network_datetime(self, monotonic: float | None = None) -> datetime:
+        return datetime.fromtimestamp(self.network_timestamp(monotonic))
+
+    def network_to_monotonic(self, network_timestamp: float) -> float:
+        return self.monotonic_to_network.inverse(network_timestamp)
+
+    def get_offset_from_system_clock(self) -> float:
+        """Network time minus time.time()."""
+        return self.network_timestamp() - time.time()
+
+    def sync(self) -> bool:
+        """Ask the NTP server for the current time. Returns whether it succeeded."""
+        if self.ntp_server is None:
+            return False
+
+        try:
+            before = time.monotonic()
+            response = ntplib.NTPClient().request(
+                self.ntp_server, timeout=self.timeout_sec
+            )
+            after = time.monotonic()
+        except (ntplib.NTPException, OSError) as e:
+            logger.warning(f"Failed to sync with NTP server {self.ntp_server}: {e}")
+            return False
+
+        # ntplib's offset assumes the network delay is symmetric, i.e. it's the
+        # offset halfway through the request.
+        monotonic = (before + after) / 2
+        network = time.time() - (after - monotonic) + response.offset
+        self.monotonic_to_network.add_sample(monotonic, network)
+        self.n_successful_syncs += 1
+
+        logger.info(
+            f"Synced with {self.ntp_server}: offset from system clock "
+            f"{response.offset:.4f}s, drift {self.monotonic_to_network.drift:.2e}"
+        )
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None or self.ntp_server is None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.sync()
+            self._wake_up.wait(self.sync_interval_sec)
+            self._wake_up.clear()
+
+
+CLOCK_SERVICE = ClockService(
+    # Set to an empty string to work offline
+    ntp_server=os.environ.get("AUTOGUITAR_NTP_SERVER", DEFAULT_NTP_SERVER) or None
+)
+
+
+def get_ntp_offset_sec() -> float:
+    return CLOCK_SERVICE.get_offset_from_system_clock()
 
 
 def get_network_timestamp() -> float:
-    ntp_offset = get_ntp_offset_sec()
-    client_time = time.time()
-    network_time = client_time + ntp_offset
-    return network_time
+    return CLOCK_SERVICE.network_timestamp()
 
 
 def get_network_datetime() -> datetime:
-    return datetime.fromtimestamp(get_network_timestamp())
+    return CLOCK_SERVICE.network_datetime()
 
 
 def unix_to_datetime(v: float | str | datetime) -> datetime:
@@ -48,4 +246,17 @@ def unix_to_datetime(v: float | str | datetime) -> datetime:
     raise ValueError(f"Invalid value: {v!r}")
 
 
+def infer_utc_offset(local: datetime, timestamp: float) -> timedelta:
+    """The UTC offset of a machine whose clock showed the naive `local` at `timestamp`.
+
+    Session logs mix Unix timestamps with naive datetimes in the local time of the
+    machine that recorded them, which is needed to put them on the same timeline.
+    The two times only need to be roughly simultaneous: the offset is rounded to 15
+    minutes, which all UTC offsets are a multiple of.
+    """
+    utc = datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+    quarter_hour = timedelta(minutes=15)
+    return round((local - utc) / quarter_hour) * quarter_hour
+
+
 UnixTimestamp = Annotated[datetime, PlainValidator(unix_to_datetime)]
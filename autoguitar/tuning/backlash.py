@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+from autoguitar.tuning.online_estimation import RecursiveLeastSquares
+
+N_FEATURES = 3
+
+
+class BacklashModel:
+    """Predicts where the string lands relative to the linear model after a move.
+
+    The string is squeezed by the wood, so its tension lags behind the motor: the
+    same number of steps gives a different frequency depending on the direction
+    we came from. For each direction, we model the offset in f^2 (relative to
+    f^2 = coef*x + intercept, see ModelBasedTunerStrategy) as a linear function of
+    - a constant,
+    - the size of the move, saturating at `saturation_steps` (after a long enough
+      move, the string is fully "dragged along" and a longer move doesn't change
+      anything),
+    - the tension before the move, i.e. f^2 where the string started.
+
+    Only differences between the offsets matter: a constant added to both
+    directions is indistinguishable from a change in the intercept.
+
+    Args:
+        saturation_steps: Moves longer than this are treated as equally long.
+        tension_scale: f^2 is divided by this to keep the features similar in size.
+        forgetting_factor: See RecursiveLeastSquares.
+        offset_std: How uncertain the initial constant offsets (zero by default)
+            are, in units of f^2.
+        slope_std: Same for how much the offsets change with the move size and the
+            tension. Lower than offset_std so that with little data, the model
+            sticks to constant offsets.
+        noise_std: Initial guess of the noise of f^2 in the readings.
+    """
+
+    def __init__(
+        self,
+        saturation_steps: float = 300,
+        tension_scale: float = 1e4,
+        forgetting_factor: float = 0.995,
+        offset_std: float = 200.0,
+        slope_std: float = 50.0,
+        noise_std: float = 100.0,
+    ):
+        self.saturation_steps = saturation_steps
+        self.tension_scale = tension_scale
+        self.rls = {
+            direction: RecursiveLeastSquares(
+                initial_theta=np.zeros(N_FEATURES),
+                initial_covariance=np.diag([offset_std, slope_std, slope_std]) ** 2,
+                forgetting_factor=forgetting_factor,
+                initial_noise_variance=noise_std**2,
+            )
+            for direction in [-1, 1]
+        }
+
+    @classmethod
+    def from_dataset(cls, df: pd.DataFrame, **kwargs: float) -> "BacklashModel":
+        """Fit the model to a dataset from tuning.dataset.get_dataset().
+
+        We fit the linear model of the string (including a linear drift over time,
+        because the string stretches) jointly with the offsets. The fitted
+        parameters and their covariances are used as the starting point, so the
+        model can keep adapting online.
+        """
+        model = cls(**kwargs)
+
+        stable = df.loc[df["stable"]]
+        start_steps, start_frequency = _get_move_starts(df)
+        move_steps = stable["steps"].to_numpy() - start_steps
+        # Rows before the first move don't have a previous position
+        has_moved = (move_steps != 0) & ~np.isnan(start_frequency)
+        if not has_moved.any():
+            raise ValueError("Not enough moves in both directions to fit the model")
+        stable = stable.loc[has_moved]
+        move_steps = move_steps[has_moved]
+
+        frequency_squared = stable["frequency"].to_numpy() ** 2
+        start_frequency_squared = start_frequency[has_moved] ** 2
+        time_sec = (stable.index - stable.index[0]).total_seconds().to_numpy()
+        offset_features = np.stack(
+            [
+                model._get_features(m, f2)
+                for m, f2 in zip(move_steps, start_frequency_squared)
+            ]
+        )
+        up = (move_steps > 0)[:, np.newaxis]
+
+        # No global intercept, the constant features of the two directions take
+        # its role. We center them afterwards.
+        X = np.concatenate(
+            [
+                stable["steps"].to_numpy()[:, np.newaxis],
+                time_sec[:, np.newaxis],
+                offset_features * up,
+                offset_features * ~up,
+            ],
+            axis=1,
+        )
+        theta, _, rank, _ = np.linalg.lstsq(X, frequency_squared, rcond=None)
+        if rank < X.shape[1]:
+            raise ValueError("Not enough moves in both directions to fit the model")
+
+        residuals = frequency_squared - X @ theta
+        noise_variance = float(np.mean(residuals**2))
+        covariance = noise_variance * np.linalg.inv(X.T @ X)
+
+        up_theta = theta[2 : 2 + N_FEATURES]
+        down_theta = theta[2 + N_FEATURES :]
+        center = (up_theta[0] + down_theta[0]) / 2
+        up_theta[0] -= center
+        down_theta[0] -= center
+
+        for direction, direction_theta, sl in [
+            (1, up_theta, slice(2, 2 + N_FEATURES)),
+            (-1, down_theta, slice(2 + N_FEATURES, None)),
+        ]:
+            rls = model.rls[direction]
+            rls.theta = direction_theta
+            rls.noise_variance = noise_variance
+            rls.P = covariance[sl, sl] / noise_variance
+
+        return model
+
+    def predict(self, move_steps: float, start_frequency_squared: float) -> float:
+        """The offset in f^2 after moving by `move_steps` from `start_frequency`.
+
+        A move of 0 steps is ambiguous, the caller should use the last actual move
+        instead.
+        """
+        if move_steps == 0:
+            return 0.0
+        rls = self.rls[int(np.sign(move_steps))]
+        return rls.predict(self._get_features(move_steps, start_frequency_squared))
+
+    def update(self, move_steps: float, start_frequency_squared: float, offset: float):
+        """Record that after a move, the string ended up `offset` off the model."""
+        if move_steps == 0:
+            return
+        rls = self.rls[int(np.sign(move_steps))]
+        rls.update(self._get_features(move_steps, start_frequency_squared), offset)
+
+    def _get_features(
+        self, move_steps: float, start_frequency_squared: float
+    ) -> np.ndarray:
+        move_size = min(abs(move_steps), self.saturation_steps) / self.saturation_steps
+        return np.array([1.0, move_size, start_frequency_squared / self.tension_scale])
+
+    def __repr__(self) -> str:
+        return (
+            f"BacklashModel(up={np.round(self.rls[1].theta, 2).tolist()}, "
+            f"down={np.round(self.rls[-1].theta, 2).tolist()})"
+        )
+
+
+def _get_move_starts(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """For each stable row, the steps and frequency where its last move started.
+
+    A move either ends a run of stable rows, in which case it started at the last
+    stable point before the run (last_stable_steps), or happens within the run, when
+    the steps change between two consecutive stable rows, without the motor moving
+    fast enough to make the rows unstable.
+    """
+    is_stable = df["stable"].to_numpy(dtype=bool)
+    first_stable = np.diff(is_stable.astype(int), prepend=0) == 1
+    run_index = np.cumsum(first_stable)[is_stable]
+    stable = df.loc[is_stable]
+
+    steps = stable["steps"].to_numpy(dtype=float)
+    is_run_start = np.diff(run_index, prepend=-1) != 0
+    moved_within_run = ~is_run_start & (np.diff(steps, prepend=np.nan) != 0)
+
+    starts = []
+    for column in ["steps", "frequency"]:
+        values = stable[column].to_numpy(dtype=float)
+        start = np.full(len(stable), np.nan)
+        start[is_run_start] = stable[f"last_stable_{column}"].to_numpy()[is_run_start]
+        start[moved_within_run] = np.roll(values, 1)[moved_within_run]
+        # Until the next move, the rows stay where the last one ended
+        starts.append(pd.Series(start).groupby(run_index).ffill().to_numpy())
+
+    return starts[0], starts[1]
@@ -1,23 +1,67 @@
-import datetime
+import functools
+import glob
+import hashlib
 import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from autoguitar import time_sync
+from autoguitar.time_sync import infer_utc_offset, unix_to_datetime
+
+logger = logging.getLogger(__name__)
+
 DEFAULT_PATH = (
     Path(__file__).parents[2]
     / "data"
     / "tuning_data_selected"
     / "2024-12-05_13-29-29-good.jsonl"
 )
-
-
-def _parse_event(d: dict) -> dict:
-    event = d["event"]
+DEFAULT_SESSIONS = str(DEFAULT_PATH.parent / "*.jsonl")
+DEFAULT_CACHE_DIR = Path(__file__).parents[2] / ".dataset_cache"
+# When the cache gets bigger, the least recently used datasets are removed
+MAX_CACHE_SIZE_BYTES = 500 * 2**20
+
+
+def _get_utc_offset(json_lines: list[dict]) -> timedelta | None:
+    """The UTC offset of the machine that recorded a session.
+
+    Newer sessions have Unix timestamps for the tuner events but naive local
+    datetimes for the rest. Converting the former with the UTC offset of the machine
+    that loads the session would shift them relative to the latter, so we use the
+    offset that the session was recorded with. None if there are no Unix timestamps.
+    """
+    for d in json_lines:
+        timestamp = d.get("value", {}).get("network_timestamp")
+        if isinstance(timestamp, float):
+            added_at = datetime.fromisoformat(d["added_at_network_timestamp"])
+            return infer_utc_offset(added_at, timestamp)
+    return None
+
+
+def _to_datetime(v: float | str, utc_offset: timedelta | None) -> datetime:
+    if isinstance(v, float) and utc_offset is not None:
+        return datetime.fromtimestamp(v, timezone.utc).replace(tzinfo=None) + utc_offset
+    return unix_to_datetime(v)
+
+
+def _parse_event(d: dict, utc_offset: timedelta | None = None) -> dict | None:
+    """Parse a line of a session log. Returns None for events we don't use."""
+    if "event" in d:
+        # Sessions from before events had a kind
+        event = d["event"]
+    elif d["kind"] in ["tuner", "all_motors_status"]:
+        event = d["value"]
+    else:
+        return None
 
     res = {
-        "timestamp": datetime.datetime.fromisoformat(event["network_timestamp"]),
+        "timestamp": _to_datetime(event["network_timestamp"], utc_offset),
     }
     if "frequency" in event:
         res["frequency"] = event["frequency"]
@@ -37,45 +81,52 @@ def _get_derivative(series: pd.Series) -> pd.Series:
 
 
 def _propagate_from_last_stable(df: pd.DataFrame, column: str) -> pd.Series:
-    x = df.copy()
-    # There are typically multiple stable points after one another.
-    # Get the first one of each sequence
-    x["first_stable"] = x["stable"].astype(int).diff(1) == 1
-    # Number the sequences. Unstable points after a stable series still belong to it.
-    x["sequence_index"] = x["first_stable"].cumsum()
-    last_stable = pd.Series(np.nan, index=x.index, dtype=float)
-
-    for i, row in x.iterrows():
-        # Find the last stable point before the current one.
-        # Don't include the current sequence.
-        previous_stable_points = x.loc[
-            (x["sequence_index"] < row["sequence_index"]) & x["stable"]
-        ]
-        if previous_stable_points.empty:
-            continue
+    """For each row, the value of `column` at the last stable point before it.
 
-        last_position = previous_stable_points.iloc[-1].name
-        last_stable[i] = x.loc[last_position, column]
+    There are typically multiple stable points after one another. Each such sequence
+    starts at its first stable point, and the unstable points after it still belong
+    to it. The points of a sequence get the value at the last stable point of the
+    sequence before, not of their own.
+    """
+    stable = df["stable"].to_numpy(dtype=bool)
+    values = df[column].to_numpy(dtype=float)
 
-    return last_stable
+    first_stable = np.diff(stable.astype(int), prepend=stable[:1]) == 1
+    sequence_index = np.cumsum(first_stable)
 
+    # The last stable point of each sequence that has one
+    stable_positions = np.flatnonzero(stable)
+    if stable_positions.size == 0:
+        return pd.Series(np.nan, index=df.index, dtype=float)
+    stable_sequences = sequence_index[stable_positions]
+    is_last = np.append(stable_sequences[1:] != stable_sequences[:-1], True)
+    last_positions = stable_positions[is_last]
+    last_sequences = stable_sequences[is_last]
 
-def _get_loose_steps(df: pd.DataFrame, max_difference: int) -> pd.Series:
-    df = df.copy()
-    loose_steps = pd.Series(np.nan, index=df.index)
-    loose_steps.iloc[0] = df.iloc[0]["steps"]
+    # The last of those from a sequence before each row's
+    i = np.searchsorted(last_sequences, sequence_index, side="left") - 1
+    last_stable = np.where(i >= 0, values[last_positions[np.maximum(i, 0)]], np.nan)
+
+    return pd.Series(last_stable, index=df.index, dtype=float)
 
-    last_loose_steps = df.iloc[0]["steps"]
 
-    for i, row in df.iloc[1:].iterrows():
-        last_loose_steps = np.clip(
-            last_loose_steps,
-            row["steps"] - max_difference,
-            row["steps"] + max_difference,
+def _get_loose_steps(df: pd.DataFrame, max_difference: int) -> pd.Series:
+    steps = df["steps"].to_numpy(dtype=float)
+    loose_steps = np.empty_like(steps)
+    if len(steps) == 0:
+        return pd.Series(loose_steps, index=df.index)
+
+    # Each value depends on the previous one, so this can't be vectorized, but a
+    # loop over a numpy array is fast enough
+    last_loose_steps = steps[0]
+    for i, cur_steps in enumerate(steps):
+        last_loose_steps = min(
+            max(last_loose_steps, cur_steps - max_difference),
+            cur_steps + max_difference,
         )
         loose_steps[i] = last_loose_steps
 
-    return loose_steps
+    return pd.Series(loose_steps, index=df.index)
 
 
 def get_dataset(
@@ -84,14 +135,135 @@ def get_dataset(
     # It matters less when predicting frequency directly,
     # the model probably just ignores it
     loose_steps_max_difference: int = 300,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
 ) -> pd.DataFrame:
+    """Load a session and derive the features the tuner models are fit on.
+
+    The result is cached in `cache_dir` (None disables caching), keyed by a hash of
+    the contents of the session, the parameters and the code of this module, so
+    the cache never needs to be cleared by hand.
+    """
     if path is None:
         path = DEFAULT_PATH
+    if cache_dir is None:
+        return _load_dataset(path, loose_steps_max_difference)
+
+    key = get_cache_key(path, loose_steps_max_difference=loose_steps_max_difference)
+    cache_path = cache_dir / f"{key}.pkl"
+    df = _read_from_cache(cache_path)
+    if df is not None:
+        return df
+
+    df = _load_dataset(path, loose_steps_max_difference)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Atomically, in case another process is loading the same dataset
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, cache_path)
+    evict_from_cache(cache_dir, MAX_CACHE_SIZE_BYTES)
+
+    return df
+
+
+def get_datasets(
+    sessions: str | list[Path] = DEFAULT_SESSIONS,
+    loose_steps_max_difference: int = 300,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Load several sessions with get_dataset() in a process pool and concatenate them.
+
+    Each row gets a "session" column with the name of its session's file. The
+    train/test split is per session, so every session is represented in both and
+    in each of them, the test data comes after the training data.
+
+    Args:
+        sessions: A glob pattern or a list of paths. By default, all of
+            data/tuning_data_selected/.
+        loose_steps_max_difference: See get_dataset().
+        cache_dir: See get_dataset().
+        max_workers: Size of the process pool. None means one per CPU.
+    """
+    if isinstance(sessions, str):
+        paths = sorted(Path(p) for p in glob.glob(sessions))
+    else:
+        paths = list(sessions)
+    if not paths:
+        raise ValueError(f"No sessions found in {sessions}")
+
+    load = functools.partial(
+        get_dataset,
+        loose_steps_max_difference=loose_steps_max_difference,
+        cache_dir=cache_dir,
+    )
+    if len(paths) == 1 or max_workers == 1:
+        dfs = [load(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            dfs = list(executor.map(load, paths))
+
+    return pd.concat(
+        [df.assign(session=path.stem) for path, df in zip(paths, dfs)],
+    )
+
+
+def get_cache_key(path: Path, **params: int) -> str:
+    h = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+    # Hash the contents, not the path, so that moving files around doesn't
+    # invalidate the cache but re-recording a session does
+    h.update(hashlib.sha256(path.read_bytes()).digest())
+    # The code that the dataset depends on: this module and the timestamp parsing
+    for module_path in [Path(__file__), Path(time_sync.__file__)]:
+        h.update(hashlib.sha256(module_path.read_bytes()).digest())
+    # Pickles from other versions of pandas can't always be read
+    h.update(pd.__version__.encode())
+    return h.hexdigest()
+
+
+def _read_from_cache(cache_path: Path) -> pd.DataFrame | None:
+    """The cached dataset, or None if it's not in the cache or can't be read."""
+    try:
+        # Mark as recently used, for evict_from_cache(). Unlike touch(), this
+        # doesn't create the file if another process has just evicted it.
+        os.utime(cache_path)
+        return pd.read_pickle(cache_path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # E.g. a truncated file. It would fail every time, so remove it.
+        logger.warning(f"Removing unreadable {cache_path} from the dataset cache: {e}")
+        cache_path.unlink(missing_ok=True)
+        return None
+
+
+def evict_from_cache(cache_dir: Path, max_size_bytes: int):
+    """Remove the least recently used datasets until the cache is small enough."""
+    entries = []
+    for path in cache_dir.glob("*.pkl"):
+        try:
+            entries.append((path, path.stat()))
+        except FileNotFoundError:
+            # Another process, e.g. another worker of get_datasets(), evicted it
+            continue
+    entries.sort(key=lambda entry: entry[1].st_mtime)
+    total_size = sum(stat.st_size for _, stat in entries)
+
+    for path, stat in entries:
+        if total_size <= max_size_bytes:
+            break
+        logger.info(f"Removing {path} from the dataset cache")
+        path.unlink(missing_ok=True)
+        total_size -= stat.st_size
+
 
+def _load_dataset(path: Path, loose_steps_max_difference: int) -> pd.DataFrame:
     with path.open() as f:
         json_lines = [json.loads(d) for d in f.readlines()]
 
-    df = pd.DataFrame([_parse_event(d) for d in json_lines])
+    utc_offset = _get_utc_offset(json_lines)
+    events = [_parse_event(d, utc_offset) for d in json_lines]
+    df = pd.DataFrame([event for event in events if event is not None])
 
     df.loc[df["frequency"].notna(), "timestamp"] -= pd.Timedelta("150ms")
 
@@ -0,0 +1,113 @@
+import logging
+
+import librosa
+from pydantic import BaseModel
+
+from autoguitar.dsp.input_stream import InputStream
+from autoguitar.dsp.multi_pitch_detector import MultiPitchDetector, StringBand
+from autoguitar.motor import AbstractMotorController
+from autoguitar.tuning.tuner import Tuner
+from autoguitar.tuning.tuner_strategy import ModelBasedTunerStrategy, TunerStrategy
+
+logger = logging.getLogger(__name__)
+
+
+class StringConfig(BaseModel):
+    band: StringBand = StringBand()
+    # Defaults to the middle of the band
+    initial_target_frequency: float | None = None
+
+
+class MultiStringTuner:
+    """Keeps several strings tuned at once, from a single audio input.
+
+    Each string has its own Tuner, strategy and motor. Pitch detection is shared
+    through a MultiPitchDetector, which also decides which string gets analyzed when
+    there isn't enough CPU for all of them.
+
+    Args:
+        input_stream: The audio of all strings, mixed into one channel or with a
+            channel per string, see StringBand.
+        motor_controllers: The tuning motor of each string.
+        strings: Where to look for each string's pitch.
+        tuner_strategies: One per string. Defaults to ModelBasedTunerStrategy, which
+            should only be used for strings similar to the one it was fitted on.
+        threaded: See MultiPitchDetector.
+        reading_interval_sec: See MultiPitchDetector.
+    """
+
+    def __init__(
+        self,
+        input_stream: InputStream,
+        motor_controllers: list[AbstractMotorController],
+        strings: list[StringConfig],
+        tuner_strategies: list[TunerStrategy] | None = None,
+        threaded: bool = True,
+        reading_interval_sec: float | None = None,
+    ):
+        if len(motor_controllers) != len(strings):
+            raise ValueError(
+                f"Got {len(motor_controllers)} motor controllers "
+                f"for {len(strings)} strings"
+            )
+        if tuner_strategies is None:
+            tuner_strategies = [
+                ModelBasedTunerStrategy(coef=4.35, adaptiveness=0.5) for _ in strings
+            ]
+
+        self.strings = strings
+        self.pitch_detector = MultiPitchDetector(
+            input_stream=input_stream,
+            bands=[string.band for string in strings],
+            threaded=threaded,
+            reading_interval_sec=reading_interval_sec,
+        )
+        self.tuners = [
+            Tuner(
+                input_stream=input_stream,
+                motor_controller=motor_controller,
+                initial_target_frequency=_get_initial_target_frequency(string),
+                tuner_strategy=tuner_strategy,
+                pitch_detector=pitch_detector,
+            )
+            for string, motor_controller, tuner_strategy, pitch_detector in zip(
+                strings,
+                motor_controllers,
+                tuner_strategies,
+                self.pitch_detector.detectors,
+                strict=True,
+            )
+        ]
+
+    def __len__(self) -> int:
+        return len(self.tuners)
+
+    def set_target(self, string_index: int, frequency: float):
+        self.tuners[string_index].set_target(frequency)
+
+    def set_targets(self, frequencies: list[float | None]):
+        """Set the target of each string. None leaves the string's target as is."""
+        for tuner, frequency in zip(self.tuners, frequencies, strict=True):
+            if frequency is not None:
+                tuner.set_target(frequency)
+
+    def get_frequencies(self) -> list[float]:
+        """The last frequency reading of each string."""
+        return [
+            detector.get_frequency()[0] for detector in self.pitch_detector.detectors
+        ]
+
+    def unsubscribe(self):
+        for tuner in self.tuners:
+            tuner.unsubscribe()
+        self.pitch_detector.unsubscribe()
+
+
+def _get_initial_target_frequency(string: StringConfig) -> float:
+    if string.initial_target_frequency is not None:
+        return string.initial_target_frequency
+
+    # Geometric mean, i.e. the middle in terms of notes
+    low = librosa.note_to_hz(string.band.min_note)
+    high = librosa.note_to_hz(string.band.max_note)
+    return float((low * high) ** 0.5)
@@ -0,0 +1,107 @@
+import numpy as np
+
+
+class RecursiveLeastSquares:
+    """Online linear regression y = theta . phi with exponential forgetting.
+
+    Each update is O(n^2) in the number of parameters (here 2), independent of how
+    many observations we've seen. Old observations are down-weighted by
+    `forgetting_factor` per update, so the estimate tracks parameters that change
+    slowly over time, like the string stretching.
+
+    Args:
+        initial_theta: Initial parameter estimate.
+        initial_covariance: Covariance of the initial estimate. Large values mean
+            we don't trust it and the first observations will override it.
+        forgetting_factor: From 0 to 1. An observation from n updates ago has
+            weight forgetting_factor**n. 1 means never forget.
+        initial_noise_variance: Guess of the observation noise variance, refined
+            as observations come in.
+        max_innovation_std: Prediction errors larger than this many standard
+            deviations are clipped, so that a single outlier can't ruin the
+            estimate.
+        max_covariance_trace: Without new information (e.g. the motor doesn't
+            move), forgetting would make the covariance grow without bound. We
+            stop forgetting once its trace reaches this value. If None, the trace
+            of the initial covariance is used.
+    """
+
+    def __init__(
+        self,
+        initial_theta: np.ndarray,
+        initial_covariance: np.ndarray,
+        forgetting_factor: float = 0.98,
+        initial_noise_variance: float = 1.0,
+        max_innovation_std: float = 4.0,
+        max_covariance_trace: float | None = None,
+    ):
+        if not 0 < forgetting_factor <= 1:
+            raise ValueError("forgetting_factor must be in (0, 1]")
+
+        self.theta = np.asarray(initial_theta, dtype=np.float64).copy()
+        self.noise_variance = initial_noise_variance
+        # We keep P such that the parameter covariance is P * noise_variance
+        self.P = np.asarray(initial_covariance, dtype=np.float64) / (
+            initial_noise_variance
+        )
+        self.forgetting_factor = forgetting_factor
+        self.max_innovation_std = max_innovation_std
+        self.max_covariance_trace = (
+            max_covariance_trace
+            if max_covariance_trace is not None
+            else float(np.trace(initial_covariance))
+        )
+        self.n_updates = 0
+
+    def predict(self, phi: np.ndarray) -> float:
+        return float(np.dot(self.theta, phi))
+
+    def update(self, phi: np.ndarray, y: float) -> float:
+        """Incorporate the observation y ~ theta . phi.
+
+        Returns:
+            The prediction error before the update.
+        """
+        phi = np.asarray(phi, dtype=np.float64)
+        innovation = y - self.predict(phi)
+
+        P_phi = self.P @ phi
+        gain_denominator = self.forgetting_factor + phi @ P_phi
+        predicted_std = np.sqrt(self.noise_variance * (1 + phi @ P_phi))
+
+        clipped_innovation = float(
+            np.clip(
+                innovation,
+                -self.max_innovation_std * predicted_std,
+                self.max_innovation_std * predicted_std,
+            )
+        )
+
+        gain = P_phi / gain_denominator
+        self.theta = self.theta + gain * clipped_innovation
+
+        forgetting_factor = (
+            self.forgetting_factor
+            if np.trace(self.get_covariance()) < self.max_covariance_trace
+            else 1.0
+        )
+        self.P = (self.P - np.outer(gain, P_phi)) / forgetting_factor
+        # Keep P symmetric despite rounding errors
+        self.P = (self.P + self.P.T) / 2
+
+        # Exponentially weighted estimate of the noise, using the same forgetting
+        self.noise_variance = (
+            self.forgetting_factor * self.noise_variance
+            + (1 - self.forgetting_factor) * clipped_innovation**2
+        )
+        self.n_updates += 1
+
+        return innovation
+
+    def get_covariance(self) -> np.ndarray:
+        """Covariance matrix of the current parameter estimate."""
+        return self.P * self.noise_variance
+
+    def get_std(self) -> np.ndarray:
+        """Standard deviation of each parameter estimate."""
+        return np.sqrt(np.diag(self.get_covariance()))
@@ -0,0 +1,323 @@
+"""Replay recorded tuning sessions through a TunerStrategy, offline.
+
+A session log contains one `model_based_tuner_strategy` event per pitch reading that
+was passed to the strategy: the frequency, the motor position and the target. We
+replay these readings in order, but the motor follows the commands of the strategy
+under test rather than the recorded ones.
+
+If the replayed motor is somewhere else than it was in the recording, the string
+would have sounded different. We account for that with the model
+f^2 = coef*x + intercept (see ModelBasedTunerStrategy): moving by dx changes f^2 by
+coef*dx. Everything else (drift, noise, bad readings) is kept as it was recorded.
+When the strategy under test behaves exactly like the recorded one, the replay
+reproduces the recording.
+"""
+
+import bisect
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+from pydantic import BaseModel
+
+from autoguitar.motor import STEP_TIME_SEC_PER_MOTOR
+from autoguitar.time_sync import unix_to_datetime
+from autoguitar.tuning.tuner_strategy import TunerStrategy
+
+
+class SessionReading(BaseModel):
+    # Seconds since the first reading of the session
+    time_sec: float
+    frequency: float
+    target_frequency: float
+    steps: int
+    # What the recorded strategy told the motor to do
+    recorded_target_steps: int
+    # The recorded strategy's estimate of how steps relate to frequency
+    coef: float
+
+
+class TargetMetrics(BaseModel):
+    """How well we reached a single target frequency."""
+
+    target_frequency: float
+    # Time between the target changing and the first reading within tolerance
+    time_to_within_sec: float | None
+    # How far past the target we went, in the direction we were coming from
+    overshoot_cents: float
+    final_error_cents: float
+    n_motor_commands: int
+
+
+class ReplayResult(BaseModel):
+    targets: list[TargetMetrics]
+    n_readings: int
+    n_skipped_readings: int = 0
+    # CPU time of get_target_steps() per reading that was passed to the strategy.
+    # None if not measured, e.g. for the recording itself.
+    mean_cpu_time_sec: float | None = None
+    p99_cpu_time_sec: float | None = None
+
+    def get_summary(self) -> dict[str, float]:
+        times = [t.time_to_within_sec for t in self.targets]
+        reached = [t for t in times if t is not None]
+        return {
+            "n_targets": len(self.targets),
+            "fraction_reached": len(reached) / len(times) if times else np.nan,
+            "median_time_to_within_sec": (
+                float(np.median(reached)) if reached else np.nan
+            ),
+            "mean_overshoot_cents": float(
+                np.mean([t.overshoot_cents for t in self.targets])
+            ),
+            "commands_per_target": float(
+                np.mean([t.n_motor_commands for t in self.targets])
+            ),
+            "mean_cpu_time_us": _to_us(self.mean_cpu_time_sec),
+            "p99_cpu_time_us": _to_us(self.p99_cpu_time_sec),
+        }
+
+
+def _to_us(sec: float | None) -> float:
+    return np.nan if sec is None else sec * 1e6
+
+
+def load_session(path: Path) -> list[SessionReading]:
+    """Load the readings that were passed to the tuner strategy during a session.
+
+    Returns an empty list for sessions that don't contain strategy events, e.g. the
+    ones recorded before we logged them.
+    """
+    events = []
+    with path.open() as f:
+        for line in f:
+            d = json.loads(line)
+            if d.get("kind") == "model_based_tuner_strategy":
+                events.append(d["value"])
+
+    # Events can arrive out of order because of network delays
+    events.sort(key=lambda v: v["network_timestamp"])
+    if not events:
+        return []
+
+    start = unix_to_datetime(events[0]["network_timestamp"])
+    return [
+        SessionReading(
+            time_sec=(unix_to_datetime(v["network_timestamp"]) - start).total_seconds(),
+            frequency=v["frequency"],
+            target_frequency=v["target_frequency"],
+            steps=v["cur_steps"],
+            recorded_target_steps=int(v["estimated_target_steps"]),
+            coef=v["coef"],
+        )
+        for v in events
+    ]
+
+
+class _ReplayMotor:
+    """Where the motor would be, given when it was told to go where."""
+
+    def __init__(self, initial_steps: int, step_time_sec: float):
+        self.step_time_sec = step_time_sec
+        # Parallel lists of commands: time, position at that time, target
+        self._times = [-np.inf]
+        self._positions = [float(initial_steps)]
+        self._targets = [float(initial_steps)]
+
+    def set_target_steps(self, time_sec: float, target_steps: int):
+        position = self.get_position(time_sec)
+        self._times.append(time_sec)
+        self._positions.append(position)
+        self._targets.append(float(target_steps))
+
+    def get_target_steps(self) -> int:
+        return int(self._targets[-1])
+
+    def get_position(self, time_sec: float) -> float:
+        i = bisect.bisect_right(self._times, time_sec) - 1
+        position, target = self._positions[i], self._targets[i]
+        max_distance = (time_sec - self._times[i]) / self.step_time_sec
+        return position + np.clip(target - position, -max_distance, max_distance)
+
+
+def _get_cents(frequency: float, target_frequency: float) -> float:
+    return float(1200 * np.log2(frequency / target_frequency))
+
+
+def _get_target_metrics(
+    times: list[float],
+    frequencies: list[float],
+    target_frequency: float,
+    n_motor_commands: int,
+    tolerance_cents: float,
+) -> TargetMetrics:
+    errors = [_get_cents(f, target_frequency) for f in frequencies]
+    time_to_within_sec = next(
+        (t - times[0] for t, e in zip(times, errors) if abs(e) <= tolerance_cents),
+        None,
+    )
+    # If we started below the target, overshooting means going above it
+    direction = np.sign(errors[0])
+    overshoot_cents = max(0.0, max(-direction * e for e in errors))
+
+    return TargetMetrics(
+        target_frequency=target_frequency,
+        time_to_within_sec=time_to_within_sec,
+        overshoot_cents=float(overshoot_cents),
+        final_error_cents=errors[-1],
+        n_motor_commands=n_motor_commands,
+    )
+
+
+def _split_by_target(
+    readings: list[SessionReading],
+) -> list[tuple[int, int]]:
+    """(start, end) index ranges of consecutive readings with the same target."""
+    boundaries = [0]
+    for i in range(1, len(readings)):
+        if readings[i].target_frequency != readings[i - 1].target_frequency:
+            boundaries.append(i)
+    boundaries.append(len(readings))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def get_recorded_metrics(
+    readings: list[SessionReading], tolerance_cents: float = 10.0
+) -> ReplayResult:
+    """The metrics of the session as it was recorded, as a baseline."""
+    targets = []
+    for start, end in _split_by_target(readings):
+        segment = readings[start:end]
+        commands = [segment[0].recorded_target_steps] + [
+            r.recorded_target_steps for r in segment
+        ]
+        n_motor_commands = int(np.sum(np.diff(commands) != 0))
+        targets.append(
+            _get_target_metrics(
+                [r.time_sec for r in segment],
+                [r.frequency for r in segment],
+                segment[0].target_frequency,
+                n_motor_commands,
+                tolerance_cents,
+            )
+        )
+    return ReplayResult(targets=targets, n_readings=len(readings))
+
+
+def replay_session(
+    readings: list[SessionReading],
+    strategy: TunerStrategy,
+    coef: float | None = None,
+    tolerance_cents: float = 10.0,
+    step_time_sec: float = STEP_TIME_SEC_PER_MOTOR[0],
+    reading_window_sec: float = 8192 / 44100,
+    max_steps_per_reading: int = 100,
+) -> ReplayResult:
+    """Replay the readings of a session through `strategy`.
+
+    Args:
+        readings: From load_session().
+        strategy: The strategy under test. It should be freshly created, since
+            strategies keep state between readings.
+        coef: Used to adjust the recorded frequencies to where the replayed motor
+            is, see the module docstring. If None, use the coefficient the recorded
+            strategy used.
+        tolerance_cents: How close to the target counts as reached.
+        step_time_sec: How long the tuning motor takes per step.
+        reading_window_sec: The length of audio a pitch reading is computed from.
+        max_steps_per_reading: Like in Tuner, readings during which the motor
+            moved more than this are skipped.
+    """
+    if not readings:
+        return ReplayResult(targets=[], n_readings=0)
+
+    if coef is None:
+        coef = float(np.median([r.coef for r in readings]))
+
+    motor = _ReplayMotor(readings[0].steps, step_time_sec=step_time_sec)
+    targets = []
+    cpu_times = []
+    n_skipped_readings = 0
+
+    for start, end in _split_by_target(readings):
+        times = []
+        frequencies = []
+        n_motor_commands = 0
+
+        for reading in readings[start:end]:
+            t = reading.time_sec
+            window_start = motor.get_position(t - reading_window_sec)
+            window_end = motor.get_position(t)
+            steps = (window_start + window_end) / 2
+
+            frequency_squared = reading.frequency**2 + coef * (steps - reading.steps)
+            frequency = float(np.sqrt(max(frequency_squared, 1.0)))
+            times.append(t)
+            frequencies.append(frequency)
+
+            if abs(window_end - window_start) > max_steps_per_reading:
+                n_skipped_readings += 1
+                continue
+
+            cpu_time_start = time.thread_time()
+            target_steps = strategy.get_target_steps(
+                frequency, reading.target_frequency, t, round(steps)
+            )
+            cpu_times.append(time.thread_time() - cpu_time_start)
+
+            if target_steps != motor.get_target_steps():
+                motor.set_target_steps(t, target_steps)
+                n_motor_commands += 1
+
+        targets.append(
+            _get_target_metrics(
+                times,
+                frequencies,
+                readings[start].target_frequency,
+                n_motor_commands,
+                tolerance_cents,
+            )
+        )
+
+    return ReplayResult(
+        targets=targets,
+        n_readings=len(readings),
+        n_skipped_readings=n_skipped_readings,
+        mean_cpu_time_sec=float(np.mean(cpu_times)) if cpu_times else None,
+        p99_cpu_time_sec=float(np.percentile(cpu_times, 99)) if cpu_times else None,
+    )
+
+
+def replay_sessions(
+    paths: list[Path],
+    strategy_factory: Callable[[], TunerStrategy],
+    tolerance_cents: float = 10.0,
+    **kwargs: Any,
+) -> dict[Path, tuple[ReplayResult, ReplayResult]]:
+    """Replay multiple sessions, each with a fresh strategy.
+
+    Args:
+        paths: The session logs.
+        strategy_factory: Makes the strategy to replay each session with.
+        tolerance_cents: See replay_session().
+        kwargs: Passed to replay_session().
+
+    Returns:
+        For each session that contains strategy events, the (recorded, replayed)
+        results.
+    """
+    results = {}
+    for path in paths:
+        readings = load_session(path)
+        if not readings:
+            continue
+
+        recorded = get_recorded_metrics(readings, tolerance_cents=tolerance_cents)
+        replayed = replay_session(
+            readings, strategy_factory(), tolerance_cents=tolerance_cents, **kwargs
+        )
+        results[path] = (recorded, replayed)
+
+    return results
@@ -0,0 +1,218 @@
+"""A columnar on-disk format for recorded sessions, and a converter from JSONL.
+
+The JSONL logs written by EventStorage have to be parsed line by line, including
+nested JSON and ISO timestamps, to get at any of the data. In the columnar format, a
+session is a directory with a subdirectory per event kind and one .npy file per
+column in it:
+
+    <session>/
+        meta.json
+        tuner/
+            network_timestamp.npy
+            frequency.npy
+        all_motors_status/
+            network_timestamp.npy
+            motor_0_cur_steps.npy
+            ...
+
+Timestamps are Unix seconds (float64). Within a kind, the rows are sorted by
+network_timestamp, which serves as the time index: a time range is found by binary
+search, and since the files are memory-mapped, reading it only touches that part
+of the columns that were asked for.
+"""
+
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from pydantic import BaseModel
+
+from autoguitar.time_sync import infer_utc_offset, unix_to_datetime
+
+FORMAT_VERSION = 1
+COLUMNAR_DIR = Path(__file__).parents[2] / "data" / "tuning_data_columnar"
+
+TIME_COLUMN = "network_timestamp"
+TIMESTAMP_COLUMNS = ["network_timestamp", "added_at_network_timestamp"]
+
+
+class KindMeta(BaseModel):
+    n_rows: int
+    columns: list[str]
+
+
+class SessionMeta(BaseModel):
+    format_version: int = FORMAT_VERSION
+    source: str
+    kinds: dict[str, KindMeta]
+
+
+def _get_utc_offset(lines: list[dict]) -> timedelta | None:
+    """The UTC offset of the machine that recorded a session, if we can tell.
+
+    The naive datetimes in the logs are in the recording's local time, not in that
+    of the machine converting them. Newer sessions also have Unix timestamps, which
+    tell us the offset.
+    """
+    for d in lines:
+        timestamp = d.get("value", {}).get(TIME_COLUMN)
+        if isinstance(timestamp, float):
+            added_at = datetime.fromisoformat(d["added_at_network_timestamp"])
+            return infer_utc_offset(added_at, timestamp)
+    return None
+
+
+def _to_unix(v: float | str, utc_offset: timedelta | None) -> float:
+    if isinstance(v, str) and utc_offset is not None:
+        utc = datetime.fromisoformat(v) - utc_offset
+        return utc.replace(tzinfo=timezone.utc).timestamp()
+    return unix_to_datetime(v).timestamp()
+
+
+def _parse_line(d: dict, utc_offset: timedelta | None) -> tuple[str, dict[str, Any]]:
+    """The kind of an event and its values, flattened to one level."""
+    if "event" in d:
+        # Sessions from before events had a kind
+        value = d["event"]
+        kind = "tuner" if "frequency" in value else "all_motors_status"
+    else:
+        value = d["value"]
+        kind = d["kind"]
+
+    row: dict[str, Any] = {}
+    for key, v in value.items():
+        if key == "status":
+            for motor_status in v:
+                motor_number = motor_status["motor_number"]
+                for field, field_value in motor_status.items():
+                    if field != "motor_number":
+                        row[f"motor_{motor_number}_{field}"] = field_value
+        else:
+            row[key] = v
+
+    row["added_at_network_timestamp"] = d["added_at_network_timestamp"]
+    for column in TIMESTAMP_COLUMNS:
+        row[column] = _to_unix(row[column], utc_offset)
+
+    return kind, row
+
+
+def _to_array(values: list[Any]) -> np.ndarray:
+    """Integers stay integers unless some are missing, which become NaN."""
+    present = [v for v in values if v is not None]
+    if len(present) == len(values) and all(
+        isinstance(v, int) and not isinstance(v, bool) for v in present
+    ):
+        return np.array(values, dtype=np.int64)
+    if all(isinstance(v, (int, float)) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return np.array(["" if v is None else str(v) for v in values])
+
+
+def convert_jsonl_session(jsonl_path: Path, output_dir: Path | None = None) -> Path:
+    """Convert a JSONL session log to the columnar format.
+
+    Args:
+        jsonl_path: The session log, as written by EventStorage.
+        output_dir: Where to write the session. By default, a directory named like
+            the log in data/tuning_data_columnar/.
+
+    Returns:
+        The directory of the converted session.
+    """
+    if output_dir is None:
+        output_dir = COLUMNAR_DIR / jsonl_path.stem
+
+    # If we're overwriting a session, it's incomplete until we're done
+    (output_dir / "meta.json").unlink(missing_ok=True)
+
+    with jsonl_path.open() as f:
+        lines = [json.loads(line) for line in f]
+    utc_offset = _get_utc_offset(lines)
+
+    rows_by_kind: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for d in lines:
+        kind, row = _parse_line(d, utc_offset)
+        rows_by_kind[kind].append(row)
+
+    kinds = {}
+    for kind, rows in rows_by_kind.items():
+        # Events arrive out of order because of network delays
+        rows.sort(key=lambda row: row[TIME_COLUMN])
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+
+        kind_dir = output_dir / kind
+        kind_dir.mkdir(parents=True, exist_ok=True)
+        for column in columns:
+            np.save(
+                kind_dir / f"{column}.npy", _to_array([r.get(column) for r in rows])
+            )
+        kinds[kind] = KindMeta(n_rows=len(rows), columns=columns)
+
+    # Written last, so that a session without it is known to be incomplete
+    meta = SessionMeta(source=jsonl_path.name, kinds=kinds)
+    (output_dir / "meta.json").write_text(meta.model_dump_json(indent=2))
+    return output_dir
+
+
+class ColumnarSession:
+    """Reads a session in the columnar format, see the module docstring."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        meta_path = path / "meta.json"
+        if not meta_path.exists():
+            raise FileNotFoundError(f"No columnar session in {path}")
+
+        self.meta = SessionMeta.model_validate_json(meta_path.read_text())
+        if self.meta.format_version != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported format version {self.meta.format_version} in {path}"
+            )
+
+    def get_kinds(self) -> list[str]:
+        return list(self.meta.kinds)
+
+    def get_columns(self, kind: str) -> list[str]:
+        return self.meta.kinds[kind].columns
+
+    def _load_column(self, kind: str, column: str) -> np.ndarray:
+        if column not in self.get_columns(kind):
+            raise KeyError(f"No column {column!r} for {kind!r} events in {self.path}")
+        return np.load(self.path / kind / f"{column}.npy", mmap_mode="r")
+
+    def read(
+        self,
+        kind: str,
+        columns: list[str] | None = None,
+        start: float | None = None,
+        end: float | None = None,
+    ) -> dict[str, np.ndarray]:
+        """Read some columns of the events of one kind, optionally in a time range.
+
+        Args:
+            kind: Which events.
+            columns: Which columns, all of them by default.
+            start: Only events with network_timestamp >= start (Unix seconds).
+            end: Only events with network_timestamp < end.
+
+        Returns:
+            The columns, as arrays of the same length.
+        """
+        if kind not in self.meta.kinds:
+            return {column: np.zeros(0) for column in columns or []}
+        if columns is None:
+            columns = self.get_columns(kind)
+
+        times = self._load_column(kind, TIME_COLUMN)
+        i_start = 0 if start is None else int(np.searchsorted(times, start, "left"))
+        i_end = len(times) if end is None else int(np.searchsorted(times, end, "left"))
+
+        return {
+            # Copy so that the file can be closed
+            column: np.array(self._load_column(kind, column)[i_start:i_end])
+            for column in columns
+        }
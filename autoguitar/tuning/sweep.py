@@ -0,0 +1,250 @@
+"""Evaluate many tuner strategy configurations in parallel.
+
+Each configuration is a dict of keyword arguments for ModelBasedTunerStrategy, e.g.
+{"coef": 4.35, "adaptiveness": 0.5}. It's evaluated either by replaying recorded
+sessions (see replay.py) or by tuning a simulated string. Results are cached on disk,
+keyed by a hash of the configuration and the data, so rerunning a sweep with a few
+new configurations only evaluates those.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+
+from autoguitar.dashboard.dash_app import TELEMETRY_CLIENT
+from autoguitar.simulation.string_simulator import StringSimulatorConfig
+from autoguitar.simulation.tuning_benchmark import (
+    get_random_notes,
+    run_tuning_simulation,
+)
+from autoguitar.tuning.replay import replay_sessions
+from autoguitar.tuning.tuner_strategy import ModelBasedTunerStrategy
+
+logger = logging.getLogger(__name__)
+
+Params = dict[str, Any]
+
+DEFAULT_CACHE_DIR = Path(".sweep_cache")
+
+
+class SweepData(BaseModel):
+    """What to evaluate the configurations on."""
+
+    kind: Literal["sessions", "simulation"]
+    # For "sessions"
+    session_paths: list[Path] = []
+    # For "simulation"
+    n_notes: int = 20
+    seed: int = 0
+
+    tolerance_cents: float = 10.0
+
+    def get_hash(self) -> str:
+        h = hashlib.sha256(self.model_dump_json(exclude={"session_paths"}).encode())
+        # Hash the contents, not the paths, so that moving files around doesn't
+        # invalidate the cache but re-recording a session does
+        for path in sorted(self.session_paths):
+            h.update(hashlib.sha256(path.read_bytes()).digest())
+        return h.hexdigest()
+
+
+class SweepResult(BaseModel):
+    # Configurations that never converge have infinite times, keep them in the cache
+    model_config = ConfigDict(ser_json_inf_nan="constants")
+
+    params: Params
+    n_targets: int
+    fraction_reached: float
+    median_time_to_within_sec: float
+    # Accuracy: how far from the target we end up
+    median_abs_error_cents: float
+    mean_overshoot_cents: float = np.nan
+
+
+def get_grid(param_grid: dict[str, list[Any]]) -> list[Params]:
+    """All combinations of the given parameter values."""
+    names = list(param_grid.keys())
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(param_grid[name] for name in names))
+    ]
+
+
+def get_random_configs(
+    param_ranges: dict[str, tuple[float, float]], n_configs: int, seed: int = 0
+) -> list[Params]:
+    """Sample configurations uniformly. Ranges with integer bounds give integers."""
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n_configs):
+        params = {}
+        for name, (low, high) in param_ranges.items():
+            if isinstance(low, int) and isinstance(high, int):
+                params[name] = int(rng.integers(low, high + 1))
+            else:
+                params[name] = float(rng.uniform(low, high))
+        configs.append(params)
+    return configs
+
+
+def get_cache_key(params: Params, data_hash: str) -> str:
+    params_json = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(f"{params_json}\n{data_hash}".encode()).hexdigest()
+
+
+def _init_worker():
+    # Evaluations would show up on the dashboard as if they were live. Only in the
+    # workers, so that the caller's telemetry keeps working.
+    TELEMETRY_CLIENT.enabled = False
+
+
+def evaluate_config(params: Params, data: SweepData) -> SweepResult:
+    if data.kind == "sessions":
+        return _evaluate_on_sessions(params, data)
+    else:
+        return _evaluate_on_simulation(params, data)
+
+
+def _evaluate_on_sessions(params: Params, data: SweepData) -> SweepResult:
+    results = replay_sessions(
+        data.session_paths,
+        lambda: ModelBasedTunerStrategy(**params),
+        tolerance_cents=data.tolerance_cents,
+    )
+    targets = [t for _, replayed in results.values() for t in replayed.targets]
+    times = [t.time_to_within_sec for t in targets]
+    reached = [t for t in times if t is not None]
+
+    return SweepResult(
+        params=params,
+        n_targets=len(targets),
+        fraction_reached=len(reached) / len(targets) if targets else 0.0,
+        median_time_to_within_sec=float(np.median(reached)) if reached else np.inf,
+        median_abs_error_cents=(
+            float(np.median([abs(t.final_error_cents) for t in targets]))
+            if targets
+            else np.inf
+        ),
+        mean_overshoot_cents=(
+            float(np.mean([t.overshoot_cents for t in targets])) if targets else np.nan
+        ),
+    )
+
+
+def _evaluate_on_simulation(params: Params, data: SweepData) -> SweepResult:
+    notes = run_tuning_simulation(
+        ModelBasedTunerStrategy(**params),
+        notes=get_random_notes(data.n_notes, seed=data.seed),
+        string_config=StringSimulatorConfig(seed=data.seed),
+        tolerance_cents=data.tolerance_cents,
+    )
+    reached = [
+        n.converged_after_sec for n in notes if n.converged_after_sec is not None
+    ]
+
+    return SweepResult(
+        params=params,
+        n_targets=len(notes),
+        fraction_reached=len(reached) / len(notes) if notes else 0.0,
+        median_time_to_within_sec=float(np.median(reached)) if reached else np.inf,
+        median_abs_error_cents=float(
+            np.median([abs(n.final_error_cents) for n in notes])
+        ),
+    )
+
+
+def run_sweep(
+    configs: list[Params],
+    data: SweepData,
+    max_workers: int | None = None,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
+) -> list[SweepResult]:
+    """Evaluate `configs` on `data` in a process pool, skipping cached ones.
+
+    Args:
+        configs: Keyword arguments for ModelBasedTunerStrategy.
+        data: What to evaluate on.
+        max_workers: Size of the process pool. None means one per CPU.
+        cache_dir: Where to cache results. None disables caching.
+
+    Returns:
+        The results in the same order as `configs`.
+    """
+    data_hash = data.get_hash()
+    keys = [get_cache_key(params, data_hash) for params in configs]
+    results: dict[str, SweepResult] = {}
+
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for key in keys:
+            path = cache_dir / f"{key}.json"
+            if path.exists():
+                results[key] = SweepResult.model_validate_json(path.read_text())
+
+    to_evaluate = {key: params for key, params in zip(keys, configs)}
+    to_evaluate = {k: v for k, v in to_evaluate.items() if k not in results}
+    logger.info(
+        f"Evaluating {len(to_evaluate)} configurations, "
+        f"{len(configs) - len(to_evaluate)} cached"
+    )
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker
+    ) as executor:
+        futures = {
+            executor.submit(evaluate_config, params, data): key
+            for key, params in to_evaluate.items()
+        }
+        for i, future in enumerate(as_completed(futures)):
+            key = futures[future]
+            result = future.result()
+            results[key] = result
+            logger.info(f"[{i + 1}/{len(futures)}] {result}")
+
+            # Write as we go so that an interrupted sweep isn't lost
+            if cache_dir is not None:
+                (cache_dir / f"{key}.json").write_text(result.model_dump_json())
+
+    return [results[key] for key in keys]
+
+
+def get_pareto_front(results: list[SweepResult]) -> list[bool]:
+    """Whether each result is not beaten on both speed and accuracy by another one.
+
+    Only results that reach as many targets as the best one are considered.
+    """
+    best_fraction = max((r.fraction_reached for r in results), default=0.0)
+    is_optimal = []
+    for r in results:
+        dominated = r.fraction_reached < best_fraction or any(
+            other.fraction_reached >= best_fraction
+            and other.median_time_to_within_sec <= r.median_time_to_within_sec
+            and other.median_abs_error_cents <= r.median_abs_error_cents
+            and (
+                other.median_time_to_within_sec < r.median_time_to_within_sec
+                or other.median_abs_error_cents < r.median_abs_error_cents
+            )
+            for other in results
+        )
+        is_optimal.append(not dominated)
+    return is_optimal
+
+
+def rank_results(results: list[SweepResult]) -> list[tuple[SweepResult, bool]]:
+    """Sort by targets reached, then speed, then accuracy. Mark the Pareto front."""
+    pairs = list(zip(results, get_pareto_front(results)))
+    return sorted(
+        pairs,
+        key=lambda pair: (
+            -pair[0].fraction_reached,
+            pair[0].median_time_to_within_sec,
+            pair[0].median_abs_error_cents,
+        ),
+    )
@@ -23,11 +23,25 @@ class Tuner:
         motor_controller: AbstractMotorController,
         initial_target_frequency: float = 100,
         tuner_strategy: TunerStrategy | None = None,
+        pitch_detector: PitchDetector | None = None,
+        max_steps_per_reading: int = 100,
     ):
+        """Keep the string tuned to a target frequency.
+
+        Args:
+            max_steps_per_reading: Readings during which the motor moved more than
+                this are discarded. Below that, the reading is paired with the
+                average motor position over the audio it was computed from, so we
+                can keep tuning while the motor is moving.
+        """
         self.input_stream = input_stream
-        self.pitch_detector = PitchDetector(input_stream=input_stream)
+        if pitch_detector is None:
+            self.pitch_detector = PitchDetector(input_stream=input_stream)
+        else:
+            self.pitch_detector = pitch_detector
         self.motor_controller = motor_controller
         self.target_frequency = initial_target_frequency
+        self.max_steps_per_reading = max_steps_per_reading
 
         if tuner_strategy is None:
             # self.tuner_strategy: TunerStrategy = ProportionalTunerStrategy(
@@ -48,21 +62,22 @@ class Tuner:
         if np.isnan(frequency):
             return
 
-        if self.motor_controller.is_moving():
-            logger.debug("Still moving, skipping...")
+        reading_steps = self._get_reading_steps(timestamp)
+        if reading_steps is None:
+            logger.debug("Motor moved too much during the reading, skipping...")
             return
 
         target_steps = self.tuner_strategy.get_target_steps(
             frequency,
             self.target_frequency,
             timestamp,
-            self.motor_controller.cur_steps,
+            reading_steps,
         )
 
         logger.debug(
             f"Frequency: {frequency:.2f} Hz,\t"
             f"Target frequency: {self.target_frequency:.2f} Hz,\t"
-            f"Cur steps: {self.motor_controller.cur_steps},\t"
+            f"Reading steps: {reading_steps},\t"
             f"Target steps: {target_steps},\t",
         )
 
@@ -71,6 +86,49 @@ class Tuner:
 
         self.motor_controller.set_target_steps(target_steps)
 
+    def _get_reading_steps(self, timestamp: Timestamp) -> int | None:
+        """The motor position that a pitch reading corresponds to.
+
+        The pitch detector analyzes a window of audio that ends with the block
+        starting at `timestamp`. By the time the reading arrives, the motor might
+        be somewhere else, so we look up where it was during that window.
+
+        Returns None if the position is unknown or changed too much.
+        """
+        assert self.input_stream.stream is not None
+        sr = self.input_stream.stream.samplerate
+        end = self.input_stream.adc_to_monotonic(
+            timestamp + self.input_stream.block_size / sr
+        )
+        start = end - self.pitch_detector.n_samples_per_reading / sr
+
+        steps_range = self.motor_controller.get_steps_range(start, end)
+        if steps_range is None:
+            return None
+        if steps_range[1] - steps_range[0] > self.max_steps_per_reading:
+            return None
+
+        mean_steps = self.motor_controller.get_mean_steps(start, end)
+        return None if mean_steps is None else round(mean_steps)
+
+    def set_target(self, frequency: float):
+        """Change the target frequency and start moving towards it immediately.
+
+        If the strategy has a model of the string, we move to where it predicts the
+        target frequency is without waiting for a pitch reading. Otherwise, we re-use
+        the last reading to let the strategy react to the new target.
+        """
+        self.target_frequency = frequency
+
+        target_steps = self.tuner_strategy.get_feedforward_steps(
+            frequency, self.motor_controller.cur_steps
+        )
+        if target_steps is not None:
+            logger.debug(f"Feedforward to {target_steps} steps for {frequency:.2f} Hz")
+            self.motor_controller.set_target_steps(target_steps)
+        elif readings := self.pitch_detector.frequency_readings:
+            self.on_pitch_reading(readings[-1])
+
     def send_update_to_server(self, frequency: float, target_steps: int):
         try:
             requests.post(
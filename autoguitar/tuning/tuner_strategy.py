@@ -4,11 +4,12 @@ from collections import deque
 from typing import Deque
 
 import numpy as np
-from sklearn.linear_model import LinearRegression
 
 from autoguitar.dashboard.dash_app import post_event
 from autoguitar.dsp.pitch_detector import Timestamp
 from autoguitar.time_sync import get_network_timestamp
+from autoguitar.tuning.backlash import BacklashModel
+from autoguitar.tuning.online_estimation import RecursiveLeastSquares
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,17 @@ class TunerStrategy(ABC):
     ) -> int:
         """Calculate the target number of steps to set for the motor."""
 
+    def get_feedforward_steps(
+        self, target_frequency: float, cur_steps: int
+    ) -> int | None:
+        """Where to move the motor right away when the target frequency changes.
+
+        Called before any new pitch readings are available. Strategies that don't
+        have a model of the string can't do better than waiting for readings, so
+        they return None.
+        """
+        return None
+
 
 class ProportionalTunerStrategy(TunerStrategy):
     def __init__(self, max_n_steps: int, speed: float, max_error_cents: float = 10):
@@ -77,6 +89,8 @@ class ModelBasedTunerStrategy(TunerStrategy):
         intercept: float | None = None,
         slack_correction_cents: int = 0,
         adaptiveness: float = 0.8,
+        backlash_model: BacklashModel | None = None,
+        median_smoothing_window: int = 3,
     ):
         """Tune the string using a model that estimates the rotation -> Hz function.
 
@@ -101,8 +115,14 @@ class ModelBasedTunerStrategy(TunerStrategy):
             adaptiveness: How quickly to change the model parameters based on new
                 incoming readings. From 0 to 1, where 0 means never change and 1
                 means always use the last estimate.
+            backlash_model: A learned, direction-aware replacement for
+                slack_correction_cents. If given, slack_correction_cents is ignored
+                and the backlash model is updated online after every move.
+            median_smoothing_window: How many of the last readings to take the
+                median of when estimating the intercept. The string is also only
+                considered stable if this many readings agree.
         """
-        self.median_smoothing_window = 3
+        self.median_smoothing_window = median_smoothing_window
         self.readings: Deque[tuple[float, int, Timestamp]] = deque(
             maxlen=self.median_smoothing_window
         )
@@ -113,6 +133,18 @@ class ModelBasedTunerStrategy(TunerStrategy):
         self.intercept: float | None = intercept
         self.slack_correction_cents = slack_correction_cents
         self.adaptiveness = adaptiveness
+        self.backlash_model = backlash_model
+
+        # Readings are considered stable if the motor didn't move and the frequency
+        # didn't vary by more than this over the last few readings.
+        self.max_stable_cents = 5.0
+        # (steps, frequency) from the last time the string was stable, and the
+        # (steps, starting frequency) of the move that got it there. Needed for the
+        # backlash model.
+        self._settled: tuple[int, float] | None = None
+        self._last_move: tuple[int, float] = (0, 0.0)
+        # The intercept before the readings from the current move started coming in
+        self._intercept_before_move: float | None = None
 
     @classmethod
     def from_readings(
@@ -120,6 +152,7 @@ class ModelBasedTunerStrategy(TunerStrategy):
         readings: list[tuple[int, float]],
         coef: float | None = None,
         slack_correction_cents: int = 0,
+        backlash_model: BacklashModel | None = None,
     ):
         """Estimate the model parameters from (steps, frequency) pairs.
 
@@ -129,15 +162,15 @@ class ModelBasedTunerStrategy(TunerStrategy):
                 Otherwise, estimate the coefficient as well.
         """
         if coef is None:
-            model = LinearRegression()
-            X = np.array([steps for steps, _ in readings])[:, np.newaxis]
+            X = np.array([steps for steps, _ in readings])
             # We fit the model to f^2 = coef*x + intercept, see __init__.
             y = np.array([freq**2 for _, freq in readings])
-            model.fit(X, y)
+            fitted_coef, fitted_intercept = np.polyfit(X, y, deg=1)
             return cls(
-                coef=model.coef_[0],
-                intercept=float(model.intercept_),
+                coef=float(fitted_coef),
+                intercept=float(fitted_intercept),
                 slack_correction_cents=slack_correction_cents,
+                backlash_model=backlash_model,
             )
         else:
             intercepts = [
@@ -151,6 +184,7 @@ class ModelBasedTunerStrategy(TunerStrategy):
                 coef=coef,
                 intercept=intercept,
                 slack_correction_cents=slack_correction_cents,
+                backlash_model=backlash_model,
             )
 
     def estimate_intercept(self) -> float | None:
@@ -160,18 +194,31 @@ class ModelBasedTunerStrategy(TunerStrategy):
 
         estimates = [
             _estimate_intercept_from_reading(reading, coef=self.coef)
+            - self._get_backlash_offset()
             for reading in list(self.readings)[-self.median_smoothing_window :]
         ]
         return float(np.median(estimates))
 
-    def get_target_steps_raw(
-        self, target_frequency: float, *, with_slack_correction: bool
-    ) -> int:
+    def is_stable(self) -> bool:
+        """Whether the last few readings are all from a string at rest."""
+        if len(self.readings) < self.median_smoothing_window:
+            return False
+
+        frequencies = [frequency for frequency, _, _ in self.readings]
+        steps = {cur_steps for _, cur_steps, _ in self.readings}
+        spread_cents = 1200 * np.log2(max(frequencies) / min(frequencies))
+
+        return len(steps) == 1 and spread_cents <= self.max_stable_cents
+
+    def update_model(self) -> float | None:
+        """Update the model parameters based on the latest readings.
+
+        Returns:
+            The intercept estimated from the latest readings alone, if available.
+        """
         current_intercept = self.estimate_intercept()
 
         if self.intercept is None:
-            if current_intercept is None:
-                return 0  # Wait for more readings
             self.intercept = current_intercept
         else:
             # print(f"{self.intercept=:.2f} vs {current_intercept=:.2f}")
@@ -191,14 +238,23 @@ class ModelBasedTunerStrategy(TunerStrategy):
                     f"{self.intercept=:.2f} vs {current_intercept=:.2f}"
                 )
 
-        if with_slack_correction:
-            target_frequency = self._correct_for_slack(
-                target_frequency, target_frequency
-            )
+        return current_intercept
 
-        estimated_target_steps = (1 / self.coef) * (
-            target_frequency**2 - self.intercept
-        )
+    def get_target_steps_raw(
+        self, target_frequency: float, *, with_slack_correction: bool
+    ) -> int:
+        current_intercept = self.update_model()
+        if self.intercept is None:
+            return 0  # Wait for more readings
+
+        if self.backlash_model is not None:
+            estimated_target_steps = self._get_steps_with_backlash(target_frequency)
+        else:
+            if with_slack_correction and self.readings:
+                target_frequency = self._correct_for_slack(
+                    self.readings[-1][0], target_frequency
+                )
+            estimated_target_steps = self._get_steps_for_frequency(target_frequency)
 
         instant_intercept = _estimate_intercept_from_reading(
             self.readings[-1], coef=self.coef
@@ -236,6 +292,7 @@ class ModelBasedTunerStrategy(TunerStrategy):
 
         # Old readings get removed by the queue's maxlen
         self.readings.append((frequency, cur_steps, timestamp))
+        self._update_backlash_model()
 
         target_steps = self.get_target_steps_raw(
             target_frequency, with_slack_correction=True
@@ -243,6 +300,111 @@ class ModelBasedTunerStrategy(TunerStrategy):
 
         return int(target_steps)
 
+    def get_feedforward_steps(
+        self, target_frequency: float, cur_steps: int
+    ) -> int | None:
+        """Jump straight to where the model says the target frequency is.
+
+        The pitch readings only need to correct the last few cents afterwards.
+        """
+        if self.intercept is None:
+            return None
+
+        if self.backlash_model is not None:
+            return int(self._get_steps_with_backlash(target_frequency, cur_steps))
+
+        if self.readings and self.readings[-1][1] == cur_steps:
+            current_frequency = self.readings[-1][0]
+        else:
+            current_frequency = self._get_frequency_for_steps(cur_steps)
+
+        target_frequency = self._correct_for_slack(current_frequency, target_frequency)
+        return int(self._get_steps_for_frequency(target_frequency))
+
+    def _get_steps_for_frequency(self, frequency: float, offset: float = 0.0) -> float:
+        """Invert the model: x = (1/coef)*(f^2 - intercept), see __init__.
+
+        Args:
+            offset: Where the string lands relative to the model, in units of f^2,
+                see BacklashModel.
+        """
+        assert self.intercept is not None
+        return (1 / self.coef) * (frequency**2 - self.intercept - offset)
+
+    def _get_steps_with_backlash(
+        self, target_frequency: float, cur_steps: int | None = None
+    ) -> float:
+        """Where to move so that the string lands at the target frequency.
+
+        The backlash offset depends on the move, which depends on the offset, so we
+        iterate. The offset changes slowly with the move size, so this converges
+        quickly.
+        """
+        if self._settled is not None:
+            start_steps, start_frequency = self._settled
+        else:
+            if cur_steps is None:
+                cur_steps = self.readings[-1][1] if self.readings else 0
+            start_steps = cur_steps
+            start_frequency = self._get_frequency_for_steps(cur_steps)
+
+        steps = self._get_steps_for_frequency(target_frequency)
+        for _ in range(3):
+            move_steps = round(steps - start_steps)
+            offset = self._get_backlash_offset(move_steps, start_frequency)
+            steps = self._get_steps_for_frequency(target_frequency, offset)
+
+        return steps
+
+    def _get_backlash_offset(
+        self, move_steps: int = 0, start_frequency: float = 0.0
+    ) -> float:
+        """The predicted backlash offset in f^2 after a move of `move_steps`.
+
+        If the move is zero, the string stays where the last move left it.
+        """
+        if self.backlash_model is None:
+            return 0.0
+        if move_steps == 0:
+            move_steps, start_frequency = self._last_move
+        return self.backlash_model.predict(move_steps, start_frequency**2)
+
+    def _update_backlash_model(self):
+        """If the string has settled after a move, see where it landed."""
+        frequency, cur_steps, _ = self.readings[-1]
+        if (
+            self._settled is not None
+            and cur_steps != self._settled[0]
+            and self._intercept_before_move is None
+        ):
+            # The intercept will start adapting to the new position, so remember
+            # what it was. That's what we compare to once the string settles.
+            self._intercept_before_move = self.intercept
+
+        if not self.is_stable():
+            return
+
+        if self._settled is None or cur_steps == self._settled[0]:
+            self._settled = (cur_steps, frequency)
+            return
+
+        start_steps, start_frequency = self._settled
+        move_steps = cur_steps - start_steps
+        self._settled = (cur_steps, frequency)
+        self._last_move = (move_steps, start_frequency)
+        intercept_before_move = self._intercept_before_move
+        self._intercept_before_move = None
+
+        if self.backlash_model is not None and intercept_before_move is not None:
+            # The intercept is kept relative to the "center" of the backlash, so the
+            # difference from the model is exactly what the backlash model predicts.
+            offset = frequency**2 - (self.coef * cur_steps + intercept_before_move)
+            self.backlash_model.update(move_steps, start_frequency**2, offset)
+
+    def _get_frequency_for_steps(self, steps: float) -> float:
+        assert self.intercept is not None
+        return float(np.sqrt(max(self.coef * steps + self.intercept, 0)))
+
     def _correct_for_slack(
         self,
         frequency: float,
@@ -272,6 +434,127 @@ class ModelBasedTunerStrategy(TunerStrategy):
         return f"ModelBasedTunerStrategy(coef={self.coef}, intercept={self.intercept})"
 
 
+class RLSTunerStrategy(ModelBasedTunerStrategy):
+    def __init__(
+        self,
+        coef: float = 13.5,
+        intercept: float | None = None,
+        slack_correction_cents: int = 0,
+        forgetting_factor: float = 0.99,
+        coef_std: float = 1.0,
+        intercept_std: float = 500.0,
+        noise_std: float = 50.0,
+        max_stable_cents: float = 5.0,
+        backlash_model: BacklashModel | None = None,
+    ):
+        """Like ModelBasedTunerStrategy, but estimates both coef and intercept.
+
+        The parameters are fitted with recursive least squares, so each reading
+        costs the same regardless of how long we've been running, and old readings
+        are gradually forgotten as the string stretches.
+
+        Only readings where the string is stable are used: the motor must not have
+        moved and the frequency must not have changed much over the last few
+        readings. Otherwise, we'd be fitting to the string still settling.
+
+        Args:
+            coef: Initial guess of the coefficient.
+            intercept: Initial guess of the intercept. If None, it is computed from
+                the first stable reading, assuming `coef` is right.
+            slack_correction_cents: See ModelBasedTunerStrategy.
+            forgetting_factor: From 0 to 1, how much weight the previous readings
+                keep after each new one. 0.99 means the last ~100 stable readings
+                matter.
+            coef_std: How uncertain the initial coefficient is.
+            intercept_std: How uncertain the initial intercept is.
+            noise_std: Initial guess of the noise of f^2 in the readings.
+            max_stable_cents: How much the frequency can vary between readings for
+                them to be considered stable.
+            backlash_model: See ModelBasedTunerStrategy.
+        """
+        super().__init__(
+            coef=coef,
+            intercept=intercept,
+            slack_correction_cents=slack_correction_cents,
+            backlash_model=backlash_model,
+        )
+        self.forgetting_factor = forgetting_factor
+        self.coef_std = coef_std
+        self.intercept_std = intercept_std
+        self.noise_std = noise_std
+        self.max_stable_cents = max_stable_cents
+
+        self.rls: RecursiveLeastSquares | None = None
+        self._last_used_reading: tuple[float, int, Timestamp] | None = None
+
+    def update_model(self) -> float | None:
+        if not self.readings or self.readings[-1] is self._last_used_reading:
+            # Not a new reading, e.g. get_target_steps_raw() called repeatedly
+            return None
+        self._last_used_reading = self.readings[-1]
+
+        if not self.is_stable():
+            return None
+
+        frequency, cur_steps, _ = self.readings[-1]
+        if self.rls is None:
+            self.rls = self._init_rls(cur_steps, frequency)
+
+        # We fit the model to f^2 = coef*x + intercept, see ModelBasedTunerStrategy.
+        self.rls.update(
+            np.array([cur_steps, 1.0]),
+            frequency**2 - self._get_backlash_offset(),
+        )
+        coef, intercept = self.rls.theta
+
+        if coef <= 0:
+            # Can happen if all the readings so far are from nearly the same
+            # position. Keep the old coefficient until we get more informative data.
+            logger.warning(f"RLS estimated a non-positive coef={coef:.2f}, ignoring")
+        else:
+            self.coef = float(coef)
+            self.intercept = float(intercept)
+
+        return _estimate_intercept_from_reading(self.readings[-1], coef=self.coef)
+
+    def get_std(self) -> tuple[float, float] | None:
+        """Standard deviation of the (coef, intercept) estimates, if available."""
+        if self.rls is None:
+            return None
+        coef_std, intercept_std = self.rls.get_std()
+        return float(coef_std), float(intercept_std)
+
+    def _init_rls(self, cur_steps: int, frequency: float) -> RecursiveLeastSquares:
+        coef_var = self.coef_std**2
+        if self.intercept is None:
+            self.intercept = (
+                frequency**2 - self.coef * cur_steps - self._get_backlash_offset()
+            )
+            # The intercept was computed using the coef, so an error in the coef
+            # means a correlated error in the intercept.
+            covariance = np.array(
+                [
+                    [coef_var, -cur_steps * coef_var],
+                    [
+                        -cur_steps * coef_var,
+                        cur_steps**2 * coef_var + self.noise_std**2,
+                    ],
+                ]
+            )
+        else:
+            covariance = np.diag([coef_var, self.intercept_std**2])
+
+        return RecursiveLeastSquares(
+            initial_theta=np.array([self.coef, self.intercept]),
+            initial_covariance=covariance,
+            forgetting_factor=self.forgetting_factor,
+            initial_noise_variance=self.noise_std**2,
+        )
+
+    def __repr__(self) -> str:
+        return f"RLSTunerStrategy(coef={self.coef}, intercept={self.intercept})"
+
+
 def cents_to_frequency_ratio(cents: float) -> float:
     """Convert a number of cents to a frequency ratio.
 
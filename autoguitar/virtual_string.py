@@ -1,12 +1,14 @@
 import time
+from pathlib import Path
 from types import TracebackType
-from typing import Any
+from typing import Any, Literal, overload
 
 import numpy as np
 
 # Weirdly, the generated stubs give less info than when we just keep it this way,
 # e.g. `sd.CallbackFlags` is not recognized. Something to do with CFFI.
 import sounddevice as sd  # pyright: ignore[reportMissingTypeStubs]
+from pydantic import BaseModel
 
 
 def remap(value: float, *, x1: float, x2: float, y1: float, y2: float):
@@ -27,58 +29,257 @@ class Envelope:
         self.pluck_start_volume = 0.0
 
     def pluck(self, t: float):
-        self.pluck_start_volume = self(t)
+        self.pluck_start_volume = float(self(t))
         self.pluck_time_sec = t
 
-    def __call__(self, t: float):
-        time_since_pluck = t - self.pluck_time_sec
-
-        if time_since_pluck < 0:
-            return 0
-
-        if time_since_pluck < self.attack_sec:
-            # Attack
-            return remap(
-                time_since_pluck,
-                x1=0,
-                x2=self.attack_sec,
-                y1=self.pluck_start_volume,
-                y2=1,
-            )
+    @overload
+    def __call__(self, t: float) -> float: ...
+
+    @overload
+    def __call__(self, t: np.ndarray) -> np.ndarray: ...
+
+    def __call__(self, t: float | np.ndarray) -> float | np.ndarray:
+        """Evaluate the envelope at time `t`, which can also be an array of times."""
+        time_since_pluck = np.asarray(t, dtype=np.float64) - self.pluck_time_sec
+
+        attack = remap(
+            time_since_pluck,
+            x1=0,
+            x2=self.attack_sec,
+            y1=self.pluck_start_volume,
+            y2=1,
+        )
+        decay = np.exp(
+            -np.maximum(time_since_pluck - self.attack_sec, 0)
+            / self.decay_halftime_sec
+            * np.log(2)
+        )
+        value = np.where(
+            time_since_pluck < 0,
+            0.0,
+            np.where(time_since_pluck < self.attack_sec, attack, decay),
+        )
+
+        if np.ndim(t) == 0:
+            return float(value)
+        return value
+
+
+class PluckedStringVoice:
+    """A vectorized modal synthesizer for a single plucked string.
+
+    The sound is a sum of decaying partials. Higher partials decay faster and are
+    slightly sharp (inharmonicity), like on a real string. Frequency changes glide
+    exponentially so that retuning the string while it rings sounds natural.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 44100,
+        frequency: float = 110.0,
+        n_partials: int = 8,
+        attack_sec: float = 0.003,
+        decay_halftime_sec: float = 0.7,
+        # Partial k decays (1 + partial_damping*(k-1)) times faster than the first
+        partial_damping: float = 0.4,
+        inharmonicity: float = 1e-4,
+        # Relative position of the pick along the string, affects the timbre
+        pluck_position: float = 0.2,
+        glide_sec: float = 0.01,
+    ):
+        self.sample_rate = sample_rate
+        self.envelope = Envelope(
+            attack_sec=attack_sec, decay_halftime_sec=decay_halftime_sec
+        )
+        self.glide_sec = glide_sec
+
+        k = np.arange(1, n_partials + 1)
+        self._partial_ratios = k * np.sqrt(1 + inharmonicity * k**2)
+        self._partial_decay_exponents = 1 + partial_damping * (k - 1)
+        # Plucking excites partials that don't have a node at the pluck position
+        amplitudes = np.abs(np.sin(np.pi * k * pluck_position)) / k
+        self._partial_amplitudes = amplitudes / amplitudes.sum()
+
+        self.time_sec = 0.0
+        self._frequency = frequency
+        self._target_frequency = frequency
+        self._phases = np.zeros(n_partials)
+        self._scheduled_plucks: list[float] = []
+
+    @property
+    def frequency(self) -> float:
+        """The current frequency, which might still be gliding to the target."""
+        return self._frequency
+
+    @property
+    def target_frequency(self) -> float:
+        return self._target_frequency
+
+    def set_frequency(self, frequency: float, glide: bool = True):
+        self._target_frequency = frequency
+        if not glide:
+            self._frequency = frequency
+
+    def pluck(self, t: float | None = None):
+        """Pluck the string at time `t`, or at the current time if not given.
+
+        `t` can be in the future relative to `time_sec`, in which case the pluck
+        happens at the right sample during a later render() call.
+        """
+        if t is None or t <= self.time_sec:
+            self.envelope.pluck(self.time_sec)
         else:
-            # Decay
-            return np.exp(
-                -(time_since_pluck - self.attack_sec)
-                / self.decay_halftime_sec
-                * np.log(2)
-            )
+            self._scheduled_plucks.append(t)
+            self._scheduled_plucks.sort()
+
+    def render(self, n_samples: int) -> np.ndarray:
+        """Synthesize the next `n_samples` samples, continuing from the last call."""
+        out = np.empty(n_samples, dtype=np.float64)
+        pos = 0
+        while pos < n_samples:
+            end = n_samples
+            if self._scheduled_plucks:
+                pluck_sample = round(
+                    (self._scheduled_plucks[0] - self.time_sec) * self.sample_rate
+                )
+                if pluck_sample <= 0:
+                    self.envelope.pluck(self._scheduled_plucks.pop(0))
+                    continue
+                end = min(end, pos + pluck_sample)
+
+            out[pos:end] = self._render_segment(end - pos)
+            pos = end
+
+        return out
+
+    def _render_segment(self, n_samples: int) -> np.ndarray:
+        sr = self.sample_rate
+        t = self.time_sec + np.arange(n_samples) / sr
+
+        # Exponential glide towards the target frequency
+        if self.glide_sec > 0:
+            decay = np.exp(-np.arange(1, n_samples + 1) / (self.glide_sec * sr))
+        else:
+            decay = np.zeros(n_samples)
+        frequency = self._target_frequency + (
+            self._frequency - self._target_frequency
+        ) * np.concatenate([[1.0], decay[:-1]])
+        self._frequency = float(
+            self._target_frequency
+            + (self._frequency - self._target_frequency) * decay[-1]
+        )
+
+        # Cumulative phase so that there's no "jump" (a click) between calls
+        phase_increments = 2 * np.pi * frequency / sr
+        phases = self._phases[:, np.newaxis] + np.outer(
+            self._partial_ratios, np.cumsum(phase_increments)
+        )
+        self._phases = phases[:, -1] % (2 * np.pi)
+
+        envelope = self.envelope(t)
+        self.time_sec += n_samples / sr
+
+        if envelope.max() < 1e-6:
+            # Long after the last pluck, skip the expensive part
+            return np.zeros(n_samples)
+
+        partial_envelopes = (
+            envelope[np.newaxis, :] ** self._partial_decay_exponents[:, np.newaxis]
+        )
+        y = (
+            self._partial_amplitudes[:, np.newaxis] * partial_envelopes * np.sin(phases)
+        ).sum(axis=0)
+
+        return y
+
+
+class SynthEvent(BaseModel):
+    time_sec: float
+    voice: int = 0
+    kind: Literal["pluck", "set_frequency"]
+    frequency: float | None = None
+
+
+class PluckedStringSynth:
+    """A polyphonic plucked-string synthesizer with one voice per string."""
+
+    def __init__(
+        self, n_voices: int = 1, sample_rate: int = 44100, **voice_kwargs: Any
+    ):
+        self.sample_rate = sample_rate
+        self.voices = [
+            PluckedStringVoice(sample_rate=sample_rate, **voice_kwargs)
+            for _ in range(n_voices)
+        ]
+
+    def render(self, n_samples: int) -> np.ndarray:
+        return np.sum([voice.render(n_samples) for voice in self.voices], axis=0)
+
+    def render_offline(
+        self, events: list[SynthEvent], duration_sec: float, block_size: int = 4096
+    ) -> np.ndarray:
+        """Render a sequence of events to audio, much faster than real time.
+
+        Events are applied at the exact sample they fall on. The rendering itself
+        happens in blocks of `block_size` to keep memory usage bounded.
+        """
+        n_samples = int(duration_sec * self.sample_rate)
+        out = np.zeros(n_samples)
+
+        pos = 0
+        for event in sorted(events, key=lambda e: e.time_sec):
+            event_sample = min(round(event.time_sec * self.sample_rate), n_samples)
+            self._render_into(out, pos, event_sample, block_size)
+            pos = max(pos, event_sample)
+            self._apply_event(event)
+        self._render_into(out, pos, n_samples, block_size)
+
+        return out
+
+    def _render_into(self, out: np.ndarray, start: int, end: int, block_size: int):
+        for block_start in range(start, end, block_size):
+            block_end = min(block_start + block_size, end)
+            out[block_start:block_end] = self.render(block_end - block_start)
+
+    def _apply_event(self, event: SynthEvent):
+        voice = self.voices[event.voice]
+        if event.frequency is not None:
+            # Set the frequency right away if plucking, glide otherwise
+            voice.set_frequency(event.frequency, glide=event.kind == "set_frequency")
+        if event.kind == "pluck":
+            voice.pluck()
+
+
+def write_wav(path: str | Path, y: np.ndarray, sample_rate: int = 44100):
+    import soundfile as sf
+
+    peak = np.abs(y).max()
+    if peak > 1:
+        y = y / peak
+    sf.write(path, y.astype(np.float32), sample_rate)
 
 
 class VirtualString:
     def __init__(self):
-        self.last_time_sec = 0
-        self.pluck_time_sec = -100
-        self._frequency = 440.0
         self.sample_rate = 44100
-        self.last_phase: float = 0.0
+        self.voice = PluckedStringVoice(sample_rate=self.sample_rate, frequency=440.0)
         self.stream = sd.OutputStream(
             samplerate=self.sample_rate,
             channels=1,
             callback=self._audio_callback,
             blocksize=4096,
         )
-        self.envelope = Envelope(attack_sec=0.03, decay_halftime_sec=0.5)
 
     def pluck(self):
-        self.envelope.pluck(self.last_time_sec)
+        self.voice.pluck()
 
     def set_frequency(self, frequency: float):
         if frequency < 100 or frequency > 10000:
             raise ValueError("Frequency must be between 100 and 10000 Hz")
-        self._frequency = frequency
+        self.voice.set_frequency(frequency)
 
     def shift_frequency(self, shift: float):
-        self.set_frequency(self._frequency + shift)
+        self.set_frequency(self.voice.target_frequency + shift)
 
     def _audio_callback(
         self,
@@ -87,25 +288,9 @@ class VirtualString:
         time: Any,  # see sounddevice docs
         status: sd.CallbackFlags,
     ):
-        # We compute the cumulative phase so that there isn't a "jump"
-        # from one frame to another - that would cause a clicking sound.
-        angular_freq = np.full(
-            (frames,), 2 * np.pi * self._frequency / self.sample_rate
-        )
-        phase = np.cumsum(angular_freq) + self.last_phase
-
-        # Shift the time so that the phase is continuous
-        envelope_time = (
-            np.arange(frames) + time.outputBufferDacTime * self.sample_rate
-        ) / self.sample_rate
-
-        envelope_value = [self.envelope(x) for x in envelope_time]
-        assert (np.abs(envelope_value) <= 1).all()
-
-        outdata[:, 0] = 0.1 * np.sin(phase).astype(np.float32) * envelope_value
-
-        self.last_time_sec = time.outputBufferDacTime
-        self.last_phase = phase[-1]
+        y = self.voice.render(frames)
+        assert (np.abs(y) <= 1).all()
+        outdata[:, 0] = 0.1 * y.astype(np.float32)
 
     def __enter__(self):
         self.stream.start()
@@ -118,8 +303,6 @@ class VirtualString:
 
 if __name__ == "__main__":
     with VirtualString() as vs:
-        # hack: small initial delay so that self.last_time is already initialized
-        time.sleep(0.01)
         vs.pluck()
         while True:
             vs.set_frequency(440 + 440 * np.random.rand())
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from autoguitar.tuning.backlash import BacklashModel
+from autoguitar.tuning.dataset import get_dataset
+
+
+def _get_offset(move_steps: float) -> float:
+    """Ground truth: up-moves land high, down-moves land low, short moves less so."""
+    return np.sign(move_steps) * 50 * min(abs(move_steps), 100) / 100
+
+
+def test_backlash_model_learns_online():
+    rng = np.random.default_rng(0)
+    model = BacklashModel(saturation_steps=100, forgetting_factor=1.0, noise_std=10)
+
+    for _ in range(200):
+        move_steps = rng.integers(-300, 300)
+        start_frequency_squared = rng.uniform(3000, 8000)
+        offset = _get_offset(move_steps) + rng.normal(scale=5)
+        model.update(move_steps, start_frequency_squared, offset)
+
+    for move_steps in [-200, -50, 50, 200]:
+        assert abs(model.predict(move_steps, 5000) - _get_offset(move_steps)) < 5
+
+    assert model.predict(0, 5000) == 0
+
+
+def test_backlash_model_from_dataset():
+    rng = np.random.default_rng(0)
+    n = 300
+    steps = rng.integers(-500, 500, size=n).astype(float)
+    last_stable_steps = np.concatenate([[np.nan], steps[:-1]])
+    time_sec = np.arange(n) * 2.0
+
+    frequency_squared = 4.35 * steps + 6000 - 0.5 * time_sec
+    frequency_squared += [_get_offset(m) for m in steps - last_stable_steps]
+    frequency_squared += rng.normal(scale=5, size=n)
+    frequency = np.sqrt(frequency_squared)
+
+    df = pd.DataFrame(
+        {
+            "steps": steps,
+            "frequency": frequency,
+            "stable": True,
+            "last_stable_steps": last_stable_steps,
+            "last_stable_frequency": np.concatenate([[np.nan], frequency[:-1]]),
+        },
+        index=pd.Timestamp("2025-01-01") + pd.to_timedelta(time_sec, unit="s"),
+    ).iloc[1:]
+
+    model = BacklashModel.from_dataset(df, saturation_steps=100)
+
+    # The model is only determined up to a constant, so compare differences
+    predicted_difference = model.predict(200, 6000) - model.predict(-200, 6000)
+    assert abs(predicted_difference - 100) < 10
+
+
+def test_backlash_model_from_single_stable_run():
+    # Moves so slow that the whole session is one stable run
+    rng = np.random.default_rng(0)
+    positions = np.cumsum(rng.integers(-200, 200, size=30)).astype(float)
+    steps = np.repeat(positions, 10)
+    moves = np.repeat(np.diff(positions, prepend=positions[0]), 10)
+    frequency_squared = 4.35 * steps + 6000
+    frequency_squared += [_get_offset(m) for m in moves]
+    df = pd.DataFrame(
+        {
+            "steps": steps,
+            "frequency": np.sqrt(frequency_squared),
+            "stable": True,
+            "last_stable_steps": np.nan,
+            "last_stable_frequency": np.nan,
+        },
+        index=pd.date_range("2025-01-01", periods=len(steps), freq="100ms"),
+    )
+
+    model = BacklashModel.from_dataset(df, saturation_steps=100)
+    assert model.predict(100, 6000) > model.predict(-100, 6000)
+
+    with pytest.raises(ValueError, match="Not enough moves"):
+        BacklashModel.from_dataset(df.assign(steps=0.0))
+
+
+def test_backlash_model_from_session():
+    path = (
+        Path(__file__).parents[1]
+        / "data"
+        / "tuning_data_selected"
+        / "2025-02-18_15-16-36-motor-wait.jsonl"
+    )
+    model = BacklashModel.from_dataset(get_dataset(path, cache_dir=None))
+
+    # Up-moves land higher than down-moves
+    assert model.predict(300, 6000) > model.predict(-300, 6000)
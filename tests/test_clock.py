@@ -0,0 +1,32 @@
+from autoguitar.clock import SimulatedClock
+
+
+def test_simulated_clock_sleep_is_instant():
+    clock = SimulatedClock()
+    clock.sleep(3600)
+    assert clock.monotonic() == 3600
+
+
+def test_simulated_clock_interleaves_threads():
+    clock = SimulatedClock()
+    events: list[tuple[float, str]] = []
+
+    def worker():
+        for _ in range(3):
+            clock.sleep(1.0)
+            events.append((clock.monotonic(), "worker"))
+
+    thread = clock.start_thread(worker)
+    for _ in range(2):
+        clock.sleep(1.5)
+        events.append((clock.monotonic(), "main"))
+    clock.join_thread(thread)
+
+    assert events == [
+        (1.0, "worker"),
+        (1.5, "main"),
+        (2.0, "worker"),
+        # Both wake up at 3.0, but the main thread went to sleep first
+        (3.0, "main"),
+        (3.0, "worker"),
+    ]
@@ -0,0 +1,77 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+from autoguitar.dashboard import dash_app
+from autoguitar.dashboard.event_storage import EventStorage
+
+
+@pytest.fixture
+def storage(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    storage = EventStorage(log_dir=tmp_path, autostart=False)
+    monkeypatch.setattr(dash_app, "EVENT_STORAGE", storage)
+    yield storage
+    storage.close()
+
+
+def test_batch_endpoint(storage: EventStorage):
+    client = dash_app.server.test_client()
+    events = [{"kind": "tuner", "value": {"i": i}} for i in range(300)]
+
+    response = client.post("/api/events", json={"events": events[:100]})
+    assert response.json == {"n_received": 100}
+
+    # A bare list, compressed
+    response = client.post(
+        "/api/events",
+        data=gzip.compress(json.dumps(events[100:]).encode()),
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert response.json == {"n_received": 200}
+
+    assert [event.value["i"] for event in storage.get_events()] == list(range(300))
+
+
+def test_batch_endpoint_rejects_invalid_batches(storage: EventStorage):
+    client = dash_app.server.test_client()
+    events = [
+        {"kind": "tuner", "value": {}},
+        {"kind": "not a kind", "value": {}},
+    ]
+
+    response = client.post("/api/events", json=events)
+    assert response.status_code == 400
+    # Nothing is added, not even the valid event
+    assert storage.get_events() == []
+
+    response = client.post(
+        "/api/events",
+        data=b"not gzip",
+        headers={"Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 400
+
+
+def test_batch_endpoint_limits_size(
+    storage: EventStorage, monkeypatch: pytest.MonkeyPatch
+):
+    client = dash_app.server.test_client()
+    monkeypatch.setattr(dash_app, "MAX_REQUEST_SIZE_BYTES", 1000)
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+    # Compresses to a few bytes
+    events = [{"kind": "tuner", "value": {"padding": " " * 2000}}]
+    data = gzip.compress(json.dumps(events).encode())
+    assert len(data) < 100
+    response = client.post("/api/events", data=data, headers=headers)
+    assert response.status_code == 413
+
+    truncated = gzip.compress(b"[]")[:-10]
+    response = client.post("/api/events", data=truncated, headers=headers)
+    assert response.status_code == 400
+    assert storage.get_events() == []
+
+    response = client.post("/api/events", data=b" " * (2 * 32 * 2**20))
+    assert response.status_code == 413
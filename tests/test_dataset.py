@@ -0,0 +1,210 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from autoguitar import time_sync
+from autoguitar.tuning.dataset import (
+    _get_loose_steps,  # pyright: ignore[reportPrivateUsage]
+    _propagate_from_last_stable,  # pyright: ignore[reportPrivateUsage]
+    evict_from_cache,
+    get_cache_key,
+    get_dataset,
+    get_datasets,
+)
+
+SESSION_PATH = (
+    Path(__file__).parents[1]
+    / "data"
+    / "tuning_data_selected"
+    / "2025-01-24_15-48-06.jsonl"
+)
+
+
+# The original, quadratic implementations, as a reference
+def _propagate_from_last_stable_reference(df: pd.DataFrame, column: str) -> pd.Series:
+    x = df.copy()
+    x["first_stable"] = x["stable"].astype(int).diff(1) == 1
+    x["sequence_index"] = x["first_stable"].cumsum()
+    last_stable = pd.Series(np.nan, index=x.index, dtype=float)
+
+    for i, row in x.iterrows():
+        previous_stable_points = x.loc[
+            (x["sequence_index"] < row["sequence_index"]) & x["stable"]
+        ]
+        if previous_stable_points.empty:
+            continue
+
+        last_position = previous_stable_points.iloc[-1].name
+        last_stable[i] = x.loc[last_position, column]
+
+    return last_stable
+
+
+def _get_loose_steps_reference(df: pd.DataFrame, max_difference: int) -> pd.Series:
+    df = df.copy()
+    loose_steps = pd.Series(np.nan, index=df.index)
+    loose_steps.iloc[0] = df.iloc[0]["steps"]
+
+    last_loose_steps = df.iloc[0]["steps"]
+
+    for i, row in df.iloc[1:].iterrows():
+        last_loose_steps = np.clip(
+            last_loose_steps,
+            row["steps"] - max_difference,
+            row["steps"] + max_difference,
+        )
+        loose_steps[i] = last_loose_steps
+
+    return loose_steps
+
+
+def _get_random_df(seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = 300
+    return pd.DataFrame(
+        {
+            # Runs of stable and unstable points
+            "stable": np.repeat(rng.random(n // 5) < 0.5, 5),
+            "steps": np.cumsum(rng.integers(-100, 100, size=n)).astype(float),
+        },
+        index=pd.date_range("2025-01-01", periods=n, freq="100ms"),
+    )
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("all_unstable", [False, True])
+def test_matches_reference_on_random_data(seed: int, all_unstable: bool):
+    df = _get_random_df(seed)
+    if all_unstable:
+        # A session that never settles
+        df["stable"] = False
+    pd.testing.assert_series_equal(
+        _propagate_from_last_stable(df, "steps"),
+        _propagate_from_last_stable_reference(df, "steps"),
+    )
+    pd.testing.assert_series_equal(
+        _get_loose_steps(df, max_difference=50),
+        _get_loose_steps_reference(df, max_difference=50),
+    )
+
+
+def test_matches_reference_on_session():
+    df = get_dataset(SESSION_PATH, cache_dir=None)
+    for column in ["steps", "frequency"]:
+        pd.testing.assert_series_equal(
+            _propagate_from_last_stable(df, column),
+            _propagate_from_last_stable_reference(df, column),
+        )
+    pd.testing.assert_series_equal(
+        _get_loose_steps(df, max_difference=300),
+        _get_loose_steps_reference(df, max_difference=300),
+    )
+
+
+@pytest.mark.parametrize("tz", ["UTC", "Europe/Prague", "America/New_York"])
+def test_mixed_timestamps_dont_depend_on_local_time_zone(
+    tz: str, monkeypatch: pytest.MonkeyPatch
+):
+    # Motor events have naive datetimes in the recording's local time (CET), the
+    # tuner events have Unix timestamps
+    path = SESSION_PATH.parent / "2025-02-18_15-16-36-motor-wait.jsonl"
+    monkeypatch.setenv("TZ", tz)
+    time.tzset()
+    try:
+        df = get_dataset(path, cache_dir=None)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    # In the local time of the recording, like the motor events
+    start = pd.Timestamp("2025-02-18 15:16:39")
+    assert abs(df.index[0] - start) < pd.Timedelta("1min")
+    # If the two were an hour apart, the steps would be interpolated to a constant
+    assert df["steps"].nunique() > 100
+    assert df["stable"].mean() < 0.9
+
+
+def test_dataset_cache(tmp_path: Path):
+    cache_dir = tmp_path / "cache"
+    df = get_dataset(SESSION_PATH, cache_dir=cache_dir)
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+
+    pd.testing.assert_frame_equal(get_dataset(SESSION_PATH, cache_dir=cache_dir), df)
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+
+    # Different parameters or contents are cached separately
+    get_dataset(SESSION_PATH, loose_steps_max_difference=100, cache_dir=cache_dir)
+    copy_path = tmp_path / "session.jsonl"
+    lines = SESSION_PATH.read_text().splitlines(keepends=True)
+    copy_path.write_text("".join(lines[:-10]))
+    get_dataset(copy_path, cache_dir=cache_dir)
+    assert len(list(cache_dir.glob("*.pkl"))) == 3
+
+    sizes = sorted(p.stat().st_size for p in cache_dir.glob("*.pkl"))
+    evict_from_cache(cache_dir, max_size_bytes=sum(sizes) - 1)
+    assert len(list(cache_dir.glob("*.pkl"))) == 2
+
+
+def test_cache_key_depends_on_timestamp_parsing(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    key = get_cache_key(SESSION_PATH, loose_steps_max_difference=300)
+
+    changed_time_sync = tmp_path / "time_sync.py"
+    changed_time_sync.write_text(Path(time_sync.__file__).read_text() + "\n# changed")
+    monkeypatch.setattr(time_sync, "__file__", str(changed_time_sync))
+    assert get_cache_key(SESSION_PATH, loose_steps_max_difference=300) != key
+
+
+def test_dataset_cache_recovers_from_bad_entries(tmp_path: Path):
+    df = get_dataset(SESSION_PATH, cache_dir=tmp_path)
+    (cache_path,) = tmp_path.glob("*.pkl")
+
+    # Truncated, or created empty after it was evicted
+    for contents in [cache_path.read_bytes()[:100], b""]:
+        cache_path.write_bytes(contents)
+        pd.testing.assert_frame_equal(get_dataset(SESSION_PATH, cache_dir=tmp_path), df)
+        assert cache_path.stat().st_size > 100
+
+    # Evicted by another process in the meantime
+    cache_path.unlink()
+    pd.testing.assert_frame_equal(get_dataset(SESSION_PATH, cache_dir=tmp_path), df)
+
+
+def test_evict_from_cache_skips_entries_evicted_concurrently(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    for i in range(3):
+        (tmp_path / f"{i}.pkl").write_bytes(b"x" * 100)
+
+    # Another process removes an entry after we've listed the directory
+    glob = Path.glob
+
+    def glob_and_evict(self: Path, pattern: str):
+        paths = list(glob(self, pattern))
+        paths[0].unlink()
+        return paths
+
+    monkeypatch.setattr(Path, "glob", glob_and_evict)
+    evict_from_cache(tmp_path, max_size_bytes=100)
+    monkeypatch.undo()
+
+    assert len(list(tmp_path.glob("*.pkl"))) == 1
+
+
+def test_get_datasets():
+    paths = [
+        SESSION_PATH,
+        SESSION_PATH.parent / "2025-02-18_15-12-07-limit-10.jsonl",
+    ]
+    df = get_datasets(paths, cache_dir=None, max_workers=2)
+
+    assert list(df["session"].unique()) == [path.stem for path in paths]
+    for path in paths:
+        session_df = df.loc[df["session"] == path.stem].drop(columns="session")
+        pd.testing.assert_frame_equal(session_df, get_dataset(path, cache_dir=None))
+        # Every session has its own train/test split
+        assert set(session_df["split"]) == {"train", "test"}
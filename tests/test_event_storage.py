@@ -0,0 +1,49 @@
+import time
+from pathlib import Path
+
+from autoguitar.dashboard.event_storage import AnnotatedEvent, EventStorage
+
+
+def _read_log(path: Path) -> list[AnnotatedEvent]:
+    return [AnnotatedEvent.model_validate_json(line) for line in path.open()]
+
+
+def test_event_storage_writes_in_batches(tmp_path: Path):
+    with EventStorage(
+        log_dir=tmp_path, flush_batch_size=100, fsync_policy="batch"
+    ) as storage:
+        for i in range(1000):
+            storage.add_event(kind="tuner", value={"i": i})
+
+    logged = _read_log(storage.log_file_path)
+    assert [event.value["i"] for event in logged] == list(range(1000))
+
+    stats = storage.get_stats()
+    assert stats.n_ingested == stats.n_written == 1000
+    assert stats.n_dropped == 0
+    # Not one write per event
+    assert 1 <= stats.n_flushes <= 20
+    assert stats.n_fsyncs == stats.n_flushes
+
+
+def test_event_storage_is_bounded(tmp_path: Path):
+    storage = EventStorage(log_dir=tmp_path, max_events=10, autostart=False)
+    for i in range(25):
+        storage.add_event(kind="tuner", value={"i": i})
+
+    assert [event.value["i"] for event in storage.get_events()] == list(range(15, 25))
+    assert storage.get_stats().n_evicted == 15
+
+    # Only evicted from memory, not from the log
+    storage.close()
+    assert len(_read_log(storage.log_file_path)) == 25
+
+
+def test_event_storage_retention(tmp_path: Path):
+    storage = EventStorage(log_dir=tmp_path, retention_sec=0.05, autostart=False)
+    storage.add_event(kind="tuner", value={"i": 0})
+    time.sleep(0.1)
+    storage.add_event(kind="tuner", value={"i": 1})
+
+    assert [event.value["i"] for event in storage.get_events()] == [1]
+    storage.close()
@@ -1,18 +1,23 @@
-import time
+import pytest
 
+from autoguitar.clock import SimulatedClock
 from autoguitar.motor import MotorController, VirtualMotor
 
 
 def test_motor_controller_basic():
-    with MotorController(motor=VirtualMotor(step_time_sec=0.001), max_steps=100) as mc:
+    clock = SimulatedClock()
+    motor = VirtualMotor(step_time_sec=0.001, clock=clock)
+    with MotorController(motor=motor, max_steps=100, clock=clock) as mc:
         mc.move(10)
-        time.sleep(0.1)
+        clock.sleep(0.1)
 
     assert mc.cur_steps == 10
 
 
 def test_motor_controller_no_sleep():
-    with MotorController(motor=VirtualMotor(step_time_sec=0.001), max_steps=1000) as mc:
+    clock = SimulatedClock()
+    motor = VirtualMotor(step_time_sec=0.001, clock=clock)
+    with MotorController(motor=motor, max_steps=1000, clock=clock) as mc:
         mc.move(1000)
 
     # We didn't sleep at all, so the thread should terminate before it gets
@@ -21,40 +26,63 @@ def test_motor_controller_no_sleep():
 
 
 def test_motor_controller_max_steps():
-    step_time_sec = 0.001
-    motor = VirtualMotor(step_time_sec=step_time_sec)
+    clock = SimulatedClock()
+    motor = VirtualMotor(step_time_sec=0.001, clock=clock)
 
-    with MotorController(motor=motor, max_steps=10) as mc:
+    with MotorController(motor=motor, max_steps=10, clock=clock) as mc:
         mc.move(15)
-        time.sleep(0.1)
+        clock.sleep(0.1)
     assert mc.cur_steps == 10
 
-    with MotorController(motor=motor, max_steps=10) as mc:
+    with MotorController(motor=motor, max_steps=10, clock=clock) as mc:
         mc.move(-15)
-        time.sleep(0.1)
+        clock.sleep(0.1)
     assert mc.cur_steps == -10
 
 
 def test_motor_controller_step_tracking():
-    with MotorController(motor=VirtualMotor(step_time_sec=0.001), max_steps=5) as mc:
+    clock = SimulatedClock()
+    motor = VirtualMotor(step_time_sec=0.001, clock=clock)
+    with MotorController(motor=motor, max_steps=5, clock=clock) as mc:
         mc.move(4)
         mc.move(3)  # we cap at 5
         mc.move(-7)
-        time.sleep(0.1)
+        clock.sleep(0.1)
         assert mc.get_target_steps() == -2
         assert mc.cur_steps == -2
         mc.move(-100)
-        time.sleep(0.1)
+        clock.sleep(0.1)
         assert mc.get_target_steps() == -5
         assert mc.cur_steps == -5
 
 
 def test_motor_controller_saving_steps():
-    motor = VirtualMotor(step_time_sec=0.001)
-    with MotorController(motor=motor, max_steps=1000) as mc:
+    clock = SimulatedClock()
+    motor = VirtualMotor(step_time_sec=0.001, clock=clock)
+    with MotorController(motor=motor, max_steps=1000, clock=clock) as mc:
         mc.move(40)
         mc.move(-20)
-        time.sleep(0.1)
+        clock.sleep(0.1)
         # We don't move backwards and forwards because `target_steps` gets modified
         # before all of the steps are executed, so we only do one move.
         assert motor.total_steps_taken == 20
+
+
+def test_motor_controller_step_history():
+    clock = SimulatedClock()
+    motor = VirtualMotor(step_time_sec=0.001, clock=clock)
+    with MotorController(motor=motor, max_steps=100, clock=clock) as mc:
+        mc.move(5)
+        mc.wait_until_stopped()
+        end = clock.monotonic()
+        clock.sleep(0.1)
+
+    timestamps, steps = mc.step_history.get_arrays()
+    # The first entry is the starting position
+    assert steps.tolist() == [0, 1, 2, 3, 4, 5]
+    assert timestamps[-1] <= end
+    # Each step takes 1ms, so the timestamps are exact with a simulated clock
+    assert timestamps[1:] == pytest.approx([0.001, 0.002, 0.003, 0.004, 0.005])
+    assert mc.step_history.get_steps_at(0.0025) == 2
+    assert mc.step_history.was_moving(0, end)
+    assert not mc.step_history.was_moving(end, end + 0.1)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from autoguitar.clock import SimulatedClock
+from autoguitar.dsp.multi_pitch_detector import MultiPitchDetector, StringBand
+from autoguitar.simulation.string_simulator import (
+    SimulatedInputStream,
+    SimulatedString,
+    StringSimulatorConfig,
+)
+
+BANDS = [
+    StringBand(min_note="A1", max_note="F2"),
+    StringBand(min_note="G#2", max_note="D3"),
+]
+
+
+def _get_strings(clock: SimulatedClock) -> list[SimulatedString]:
+    strings = []
+    for seed, intercept in enumerate([4300.0, 110.0**2]):
+        config = StringSimulatorConfig(
+            intercept=intercept, intercept_drift_per_sec=0, intercept_noise=0, seed=seed
+        )
+        strings.append(SimulatedString(config=config, clock=clock))
+    return strings
+
+
+@pytest.mark.parametrize("separate_channels", [False, True])
+def test_multi_pitch_detector_separates_strings(separate_channels: bool):
+    clock = SimulatedClock()
+    strings = _get_strings(clock)
+    bands = [
+        band.model_copy(update={"channel": i if separate_channels else None})
+        for i, band in enumerate(BANDS)
+    ]
+
+    with SimulatedInputStream(
+        strings, block_size=2048, clock=clock, separate_channels=separate_channels
+    ) as input_stream:
+        detector = MultiPitchDetector(input_stream, bands=bands, threaded=False)
+        detector.use_pyin = False
+
+        for string in strings:
+            string.pluck()
+        # With one channel, the strings need a reading of each other to remove
+        # each other's harmonics, so the first readings can be off
+        clock.sleep(2.0)
+        detector.unsubscribe()
+
+    for string, string_detector in zip(strings, detector.detectors):
+        frequency, _ = string_detector.get_frequency()
+        assert frequency == pytest.approx(string.get_frequency(), rel=0.01)
+
+    # Both strings get readings at the same rate
+    rates = detector.get_update_rates()
+    assert rates[0] == pytest.approx(rates[1])
+    assert not np.isnan(rates[0])
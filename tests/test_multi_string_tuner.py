@@ -0,0 +1,57 @@
+from contextlib import ExitStack
+
+import pytest
+
+from autoguitar.clock import SimulatedClock
+from autoguitar.dashboard.dash_app import TELEMETRY_CLIENT
+from autoguitar.dsp.multi_pitch_detector import StringBand
+from autoguitar.motor import MotorController
+from autoguitar.simulation.string_simulator import (
+    SimulatedInputStream,
+    SimulatedString,
+    StringSimulatorConfig,
+)
+from autoguitar.tuning.multi_string_tuner import MultiStringTuner, StringConfig
+
+
+def test_multi_string_tuner_tunes_all_strings(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(TELEMETRY_CLIENT, "enabled", False)
+    clock = SimulatedClock()
+    strings = [
+        SimulatedString(
+            config=StringSimulatorConfig(intercept=intercept, seed=i), clock=clock
+        )
+        for i, intercept in enumerate([4300.0, 110.0**2])
+    ]
+    string_configs = [
+        StringConfig(band=StringBand(min_note="A1", max_note="F2")),
+        StringConfig(band=StringBand(min_note="G#2", max_note="D3")),
+    ]
+    target_frequencies = [69.3, 116.54]  # C#2, A#2
+
+    with ExitStack() as stack:
+        input_stream = stack.enter_context(
+            SimulatedInputStream(strings, block_size=2048, clock=clock)
+        )
+        motor_controllers = [
+            stack.enter_context(
+                MotorController(
+                    motor=string.tuning_motor(), max_steps=10000, clock=clock
+                )
+            )
+            for string in strings
+        ]
+        tuner = MultiStringTuner(
+            input_stream, motor_controllers, string_configs, threaded=False
+        )
+        tuner.pitch_detector.use_pyin = False
+
+        tuner.set_targets(target_frequencies)
+        for _ in range(4):
+            for string in strings:
+                string.pluck()
+            clock.sleep(1.0)
+        tuner.unsubscribe()
+
+    for string, target_frequency in zip(strings, target_frequencies):
+        assert string.get_frequency() == pytest.approx(target_frequency, rel=0.01)
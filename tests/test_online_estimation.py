@@ -0,0 +1,48 @@
+import numpy as np
+
+from autoguitar.tuning.online_estimation import RecursiveLeastSquares
+
+
+def test_rls_converges_to_least_squares():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-1000, 1000, size=500)
+    y = 4.35 * x + 4300 + rng.normal(scale=20, size=len(x))
+
+    rls = RecursiveLeastSquares(
+        initial_theta=np.array([1.0, 0.0]),
+        initial_covariance=np.diag([100.0, 1e8]),
+        forgetting_factor=1.0,
+        initial_noise_variance=400.0,
+    )
+    for xi, yi in zip(x, y):
+        rls.update(np.array([xi, 1.0]), yi)
+
+    expected = np.polyfit(x, y, deg=1)
+    np.testing.assert_allclose(rls.theta, expected, rtol=1e-3)
+
+    coef_std, intercept_std = rls.get_std()
+    assert abs(rls.theta[0] - 4.35) < 3 * coef_std
+    assert abs(rls.theta[1] - 4300) < 3 * intercept_std
+    assert abs(np.sqrt(rls.noise_variance) - 20) < 5
+
+
+def test_rls_tracks_drift_and_ignores_outliers():
+    rng = np.random.default_rng(0)
+    rls = RecursiveLeastSquares(
+        initial_theta=np.array([4.35, 4300.0]),
+        initial_covariance=np.diag([1.0, 100.0**2]),
+        forgetting_factor=0.95,
+        initial_noise_variance=400.0,
+    )
+
+    intercept = 4300.0
+    for i in range(1000):
+        intercept -= 1.0  # The string stretches
+        x = rng.uniform(-1000, 1000)
+        y = 4.35 * x + intercept + rng.normal(scale=20)
+        if i % 100 == 50:
+            y += 1e5  # E.g. the pitch detector picked up an octave
+        rls.update(np.array([x, 1.0]), y)
+
+    assert abs(rls.theta[0] - 4.35) < 0.1
+    assert abs(rls.theta[1] - intercept) < 50
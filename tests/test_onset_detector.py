@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from autoguitar.clock import SimulatedClock
+from autoguitar.dsp.onset_detector import OnsetDetector
+from autoguitar.dsp.pitch_detector import PitchDetector
+from autoguitar.simulation.string_simulator import (
+    SimulatedInputStream,
+    SimulatedString,
+    StringSimulatorConfig,
+)
+
+
+def _get_string(clock: SimulatedClock, frequency: float) -> SimulatedString:
+    config = StringSimulatorConfig(
+        intercept=frequency**2, intercept_drift_per_sec=0, intercept_noise=0
+    )
+    return SimulatedString(config=config, clock=clock)
+
+
+@pytest.mark.parametrize("frequency", [42.0, 80.0, 150.0])
+def test_onset_detector_finds_plucks(frequency: float):
+    clock = SimulatedClock()
+    string = _get_string(clock, frequency)
+    rng = np.random.default_rng(0)
+
+    with SimulatedInputStream(string, block_size=2048, clock=clock) as input_stream:
+        detector = OnsetDetector(input_stream)
+        onset_times = []
+        detector.on_onset.subscribe(lambda onset: onset_times.append(onset[1]))
+
+        clock.sleep(0.5)
+        for _ in range(6):
+            # Including plucks while the string is still ringing
+            string.pluck()
+            clock.sleep(rng.uniform(0.3, 0.8))
+        detector.unsubscribe()
+
+    assert len(onset_times) == len(string.pluck_times)
+    errors = np.array(onset_times) - np.array(string.pluck_times)
+    # Much better than the block size
+    assert np.all(np.abs(errors) < 0.015)
+
+
+def test_pitch_detector_skips_onsets():
+    clock = SimulatedClock()
+    string = _get_string(clock, 80.0)
+
+    with SimulatedInputStream(string, block_size=512, clock=clock) as input_stream:
+        onset_detector = OnsetDetector(input_stream)
+        pitch_detector = PitchDetector(
+            input_stream, threaded=False, onset_detector=onset_detector
+        )
+        pitch_detector.use_pyin = False
+        reading_times = []
+        pitch_detector.on_reading.subscribe(
+            lambda reading: reading_times.append(reading[1])
+        )
+
+        for _ in range(3):
+            string.pluck()
+            clock.sleep(0.6)
+        pitch_detector.unsubscribe()
+        onset_detector.unsubscribe()
+
+    assert reading_times
+    window_sec = pitch_detector.n_samples_per_reading / input_stream.samplerate
+    block_sec = input_stream.block_size / input_stream.samplerate
+    for reading_time in reading_times:
+        window_end = reading_time + block_sec
+        for pluck_time in string.pluck_times:
+            assert not window_end - window_sec <= pluck_time <= window_end
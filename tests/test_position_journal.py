@@ -0,0 +1,74 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from autoguitar.position_journal import PositionJournal
+
+
+def test_position_journal_survives_restart(tmp_path: Path):
+    path = tmp_path / "positions.jsonl"
+
+    with PositionJournal(path) as journal:
+        journal.record(0, 100)
+        journal.record(1, 5)
+        journal.record(0, 100, target_steps=250)
+        journal.record(0, 250)
+
+    assert PositionJournal(path).get_steps(0) == 250
+    assert PositionJournal(path).get_steps(1) == 5
+    assert PositionJournal(path).get_steps(2) == 0
+
+    # Crash in the middle of a move and while writing a line
+    with PositionJournal(path) as journal:
+        journal.record(1, 5, target_steps=-50)
+    with path.open("a") as f:
+        f.write('{"motor_number": 0, "ste')
+
+    positions = PositionJournal(path).load()
+    assert positions[0].steps == 250
+    # We don't know whether the move finished, so use where it started
+    assert positions[1].steps == 5
+    assert positions[1].target_steps == -50
+
+    # Opening the journal again gets rid of the torn line
+    with PositionJournal(path) as journal:
+        journal.record(0, 300)
+    assert PositionJournal(path).get_steps(0) == 300
+
+
+def test_position_journal_compacts(tmp_path: Path):
+    path = tmp_path / "positions.jsonl"
+
+    with PositionJournal(path, max_records=10) as journal:
+        for steps in range(25):
+            journal.record(0, steps)
+            journal.record(1, -steps)
+
+    assert len(path.read_text().splitlines()) < 10
+    assert PositionJournal(path).get_steps(0) == 24
+    assert PositionJournal(path).get_steps(1) == -24
+
+
+def test_position_journal_fsyncs_only_durable_records(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    path = tmp_path / "positions.jsonl"
+    fsyncs = []
+    fsync = os.fsync
+
+    def counting_fsync(fd: int):
+        fsyncs.append(fd)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", counting_fsync)
+
+    with PositionJournal(path) as journal:
+        fsyncs.clear()
+        journal.record(0, 0, target_steps=100, durable=False)
+        assert fsyncs == []
+        # Still written, in case the process crashes
+        assert PositionJournal(path).load()[0].target_steps == 100
+
+        journal.record(0, 100)
+        assert len(fsyncs) == 1
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from autoguitar.dashboard.dash_app import TELEMETRY_CLIENT
+from autoguitar.tuning.replay import (
+    SessionReading,
+    get_recorded_metrics,
+    replay_session,
+)
+from autoguitar.tuning.tuner_strategy import ModelBasedTunerStrategy
+
+COEF = 4.35
+INTERCEPT = 3000.0
+
+
+def _make_readings() -> list[SessionReading]:
+    """A string that obeys the model exactly and a motor that never moves."""
+    readings = []
+    for i, target_frequency in enumerate([65.41, 77.78, 58.27]):
+        for j in range(30):
+            readings.append(
+                SessionReading(
+                    time_sec=i * 10 + j * 0.2,
+                    frequency=float(np.sqrt(INTERCEPT)),
+                    target_frequency=target_frequency,
+                    steps=0,
+                    recorded_target_steps=0,
+                    coef=COEF,
+                )
+            )
+    return readings
+
+
+def test_replay_reaches_targets(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(TELEMETRY_CLIENT, "enabled", False)
+    readings = _make_readings()
+
+    recorded = get_recorded_metrics(readings)
+    assert len(recorded.targets) == 3
+    assert all(t.time_to_within_sec is None for t in recorded.targets)
+    assert all(t.n_motor_commands == 0 for t in recorded.targets)
+
+    result = replay_session(
+        readings, ModelBasedTunerStrategy(coef=COEF, adaptiveness=0.5)
+    )
+    assert len(result.targets) == 3
+    for target in result.targets:
+        assert target.time_to_within_sec is not None
+        assert abs(target.final_error_cents) < 1
+        assert target.n_motor_commands >= 1
+    assert result.mean_cpu_time_sec is not None and result.mean_cpu_time_sec > 0
+    # Not measured for the recording
+    assert np.isnan(recorded.get_summary()["mean_cpu_time_us"])
+
+
+def test_replay_detects_overshoot(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(TELEMETRY_CLIENT, "enabled", False)
+    readings = _make_readings()
+
+    # A too-low coefficient makes the strategy overshoot
+    result = replay_session(
+        readings, ModelBasedTunerStrategy(coef=COEF / 2, adaptiveness=0.5)
+    )
+    assert result.targets[1].overshoot_cents > 10
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from autoguitar.dashboard.layout import get_extend_data
+from autoguitar.dashboard.series_window import SeriesWindow
+
+START = datetime(2024, 12, 5, 13, 0, 0)
+
+
+def test_series_window_returns_new_points():
+    window = SeriesWindow(names=["a", "b"], window_sec=30.0)
+    for i in range(10):
+        window.add_point("a" if i % 2 == 0 else "b", START + timedelta(seconds=i), i)
+
+    seen = window.get_last_sequence_number()
+    assert window.get_points("a")[1] == [0, 2, 4, 6, 8]
+
+    window.add_point("a", START + timedelta(seconds=10), 10)
+    window.add_point("b", START + timedelta(seconds=11), 11)
+    assert window.get_points("a", after=seen)[1] == [10]
+    assert window.get_points("b", after=seen)[1] == [11]
+    assert window.get_points("b", after=seen, until=seen + 1)[1] == []
+
+
+def test_series_window_drops_old_points():
+    window = SeriesWindow(names=["a", "b"], window_sec=30.0)
+    for i in range(100):
+        window.add_point("a", START + timedelta(seconds=i), i)
+    window.add_point("b", START + timedelta(seconds=50), -1)
+
+    x, y = window.get_points("a")
+    assert y == list(range(69, 100))
+    assert x[0] == START + timedelta(seconds=69)
+    # Relative to the latest point of any series
+    assert window.get_points("b") == ([], [])
+    assert window.get_lengths() == [31, 0]
+
+
+def test_get_extend_data():
+    window = SeriesWindow(names=["a", "b"], window_sec=30.0)
+    window.add_point("a", START, 1.0)
+    seen = window.get_last_sequence_number()
+    window.add_point("a", START + timedelta(seconds=1), 2.0)
+    window.add_point("b", START + timedelta(seconds=1), 3.0)
+
+    update, trace_indices, max_points = get_extend_data(
+        window, after=seen, until=window.get_last_sequence_number()
+    )
+    assert update["y"] == [[2.0], [3.0]]
+    assert trace_indices == [0, 1]
+    assert max_points == {"x": [2, 1], "y": [2, 1]}
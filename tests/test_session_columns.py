@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from autoguitar.tuning.session_columns import ColumnarSession, convert_jsonl_session
+
+LINES = [
+    # Out of order, like after network delays
+    {
+        "added_at_network_timestamp": "2025-02-18T15:34:37.000",
+        "kind": "tuner",
+        "value": {"frequency": 66.0, "network_timestamp": 1739889276.9},
+    },
+    {
+        "added_at_network_timestamp": "2025-02-18T15:34:36.800",
+        "kind": "tuner",
+        "value": {"frequency": 65.0, "network_timestamp": 1739889276.8},
+    },
+    {
+        "added_at_network_timestamp": "2025-02-18T15:34:37.100",
+        "kind": "all_motors_status",
+        "value": {
+            "network_timestamp": 1739889277.0,
+            "status": [
+                {"motor_number": 0, "cur_steps": -540, "target_steps": -500},
+                {"motor_number": 1, "cur_steps": 0, "target_steps": 0},
+            ],
+        },
+    },
+    # The format from before events had a kind
+    {
+        "added_at_network_timestamp": "2025-02-18T15:34:37.300",
+        "event": {"frequency": 67.0, "network_timestamp": 1739889277.2},
+    },
+]
+
+
+@pytest.fixture
+def session(tmp_path: Path) -> ColumnarSession:
+    jsonl_path = tmp_path / "session.jsonl"
+    jsonl_path.write_text("".join(json.dumps(line) + "\n" for line in LINES))
+    return ColumnarSession(convert_jsonl_session(jsonl_path, tmp_path / "columnar"))
+
+
+def test_read_columns(session: ColumnarSession):
+    assert set(session.get_kinds()) == {"tuner", "all_motors_status"}
+
+    tuner = session.read("tuner", columns=["frequency"])
+    np.testing.assert_array_equal(tuner["frequency"], [65.0, 66.0, 67.0])
+
+    motors = session.read("all_motors_status")
+    assert motors["motor_0_cur_steps"].dtype == np.int64
+    np.testing.assert_array_equal(motors["motor_0_target_steps"], [-500])
+
+
+def test_read_time_range(session: ColumnarSession):
+    tuner = session.read("tuner", start=1739889276.85, end=1739889277.2)
+    np.testing.assert_array_equal(tuner["frequency"], [66.0])
+    assert set(tuner) == set(session.get_columns("tuner"))
+
+    with pytest.raises(KeyError):
+        session.read("tuner", columns=["cur_steps"])
+
+
+def test_naive_datetimes_are_in_the_recording_time_zone(session: ColumnarSession):
+    # The tuner events say the session was recorded in UTC+1, whatever the time
+    # zone of the machine that converted it
+    tuner = session.read(
+        "tuner", columns=["network_timestamp", "added_at_network_timestamp"]
+    )
+    delays = tuner["added_at_network_timestamp"] - tuner["network_timestamp"]
+    assert np.all((0 <= delays) & (delays < 1))
@@ -0,0 +1,54 @@
+import pytest
+
+from autoguitar.step_history import StepHistory
+
+
+def test_step_history_position_queries():
+    history = StepHistory()
+    history.append(1.0, 0)
+    history.append(2.0, 1)
+    history.append(3.0, 2)
+
+    assert history.get_steps_at(0.5) is None
+    assert history.get_steps_at(1.0) == 0
+    assert history.get_steps_at(2.5) == 1
+    assert history.get_steps_at(100) == 2
+
+    assert history.was_moving(1.5, 2.5)
+    assert not history.was_moving(3.0, 4.0)
+    assert not history.was_moving(0.0, 1.0)  # the initial entry isn't a move
+
+
+def test_step_history_wraps_around():
+    history = StepHistory(capacity=4)
+    for i in range(10):
+        history.append(float(i), i)
+
+    assert len(history) == 4
+    timestamps, steps = history.get_arrays()
+    assert timestamps.tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert steps.tolist() == [6, 7, 8, 9]
+
+    assert history.get_steps_at(7.5) == 7
+    assert history.get_steps_at(5.0) is None
+    assert history.to_json_dict(start=8.0) == {
+        "timestamps": [8.0, 9.0],
+        "steps": [8, 9],
+    }
+
+
+def test_step_history_window_queries():
+    history = StepHistory()
+    history.append(0.0, 0)
+    history.append(1.0, 10)
+    history.append(3.0, 20)
+
+    # Half of the window at 0, half at 10
+    assert history.get_mean_steps(0.5, 1.5) == pytest.approx(5.0)
+    assert history.get_mean_steps(1.0, 5.0) == pytest.approx(15.0)
+    assert history.get_mean_steps(2.0, 2.0) == 10
+    assert history.get_mean_steps(-1.0, 1.0) is None
+
+    assert history.get_steps_range(0.5, 3.5) == (0, 20)
+    assert history.get_steps_range(1.5, 2.5) == (10, 10)
+    assert history.get_steps_range(-1.0, 1.0) is None
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from autoguitar.clock import SimulatedClock
+from autoguitar.simulation.string_simulator import (
+    SimulatedInputStream,
+    SimulatedString,
+    StringSimulatorConfig,
+)
+
+
+def _get_string(**kwargs: float) -> SimulatedString:
+    config = StringSimulatorConfig(
+        intercept_drift_per_sec=0, intercept_noise=0, **kwargs
+    )
+    return SimulatedString(config=config, clock=SimulatedClock())
+
+
+def test_simulated_string_follows_model():
+    string = _get_string(hysteresis_steps=0)
+    for _ in range(100):
+        string.on_tuning_step(forward=True)
+
+    config = string.config
+    expected = np.sqrt(config.coef * 100 + config.intercept)
+    assert string.get_frequency() == pytest.approx(expected)
+
+
+def test_simulated_string_hysteresis():
+    string = _get_string(hysteresis_steps=20)
+    for _ in range(100):
+        string.on_tuning_step(forward=True)
+    from_below = string.get_frequency()
+
+    for _ in range(100):
+        string.on_tuning_step(forward=True)
+    for _ in range(100):
+        string.on_tuning_step(forward=False)
+    from_above = string.get_frequency()
+
+    # Same motor position, but approaching from below gives a higher frequency
+    assert string.tuning_steps == 100
+    assert from_below > from_above
+
+
+def test_simulated_string_pick_plucks_when_crossing():
+    string = _get_string()
+    for _ in range(5):
+        string.on_pick_step(forward=True)
+    assert string.pluck_times == []
+
+    for _ in range(20):
+        string.on_pick_step(forward=True)
+    assert len(string.pluck_times) == 1
+
+    # The pick has to go back past the string to pluck again
+    for _ in range(10):
+        string.on_pick_step(forward=False)
+    assert len(string.pluck_times) == 1
+    for _ in range(30):
+        string.on_pick_step(forward=False)
+    assert len(string.pluck_times) == 2
+
+
+def test_simulated_input_stream_produces_audio():
+    clock = SimulatedClock()
+    string = SimulatedString(clock=clock)
+    block_size = 512
+
+    with SimulatedInputStream(string, block_size=block_size, clock=clock) as stream:
+        string.pluck()
+        clock.sleep(0.5)
+
+    n_blocks = len(stream.readings)
+    assert n_blocks == pytest.approx(0.5 * 44100 / block_size, abs=1)
+    timestamps = [reading.timestamp for reading in stream.readings]
+    assert np.diff(timestamps) == pytest.approx(block_size / 44100)
+
+    y = stream.get_latest_audio(max_n_samples=8192)
+    assert np.abs(y).max() > 0.02  # the noise level is 0.002
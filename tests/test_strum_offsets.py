@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from autoguitar.clock import SimulatedClock
+from autoguitar.control.strum_offsets import (
+    Pluck,
+    StrumOffsetTable,
+    estimate_pluck_frequency,
+)
+from autoguitar.control.strummer import UPSTROKE_BASE_OFFSET, Strummer
+from autoguitar.motor import MotorController
+from autoguitar.simulation.string_simulator import (
+    SimulatedInputStream,
+    SimulatedString,
+    StringSimulatorConfig,
+)
+
+
+def test_offset_table_interpolates():
+    def pluck(steps: int, frequency: float) -> Pluck:
+        return Pluck(steps=steps, loudness=1.0, frequency=frequency)
+
+    table = StrumOffsetTable.from_plucks(
+        [
+            (pluck(410, 100.0), pluck(-10, 100.0)),
+            # On another turn of the pick
+            (pluck(20, 50.0), pluck(380, 50.0)),
+        ],
+        steps_per_turn=400,
+    )
+    assert table.frequencies == [50.0, 100.0]
+    assert table.upstroke_steps == [0.0, -10.0]
+    assert table.downstroke_steps == [0.0, 10.0]
+
+    assert table.get_offsets(50.0, reference_frequency=100.0) == (10.0, -10.0)
+    up, down = table.get_offsets(50 * 2**0.5, reference_frequency=50.0)
+    assert (up, down) == pytest.approx((-5.0, 5.0))
+    # Clamped outside of the range
+    assert table.get_offsets(200.0, reference_frequency=20.0) == (-10.0, 10.0)
+
+
+def test_estimate_pluck_frequency():
+    sr = 44100
+    y = np.sin(2 * np.pi * 82.0 * np.arange(8192) / sr)
+    assert estimate_pluck_frequency(y, sr=sr) == pytest.approx(82.0, rel=0.01)
+    # Too short to tell
+    assert np.isnan(estimate_pluck_frequency(y[:3000], sr=sr))
+
+
+def test_strum_offsets_follow_tuning():
+    clock = SimulatedClock()
+    config = StringSimulatorConfig(intercept_drift_per_sec=0, intercept_noise=0)
+    string = SimulatedString(config=config, clock=clock)
+
+    def tune(frequency: float):
+        string.intercept = frequency**2
+
+    with (
+        SimulatedInputStream(string, block_size=2048, clock=clock) as input_stream,
+        MotorController(
+            motor=string.pick_motor(), max_steps=int(1e9), clock=clock
+        ) as motor_controller,
+    ):
+        strummer = Strummer(
+            input_stream=input_stream, motor_controller=motor_controller, clock=clock
+        )
+        tune(100.0)
+        strummer.calibrate(estimate_downstroke_separately=True)
+        assert strummer.calibration is not None
+        assert strummer.calibration.frequency == pytest.approx(100.0, rel=0.02)
+
+        plucks = []
+        for frequency in [45.0, 65.0, 100.0]:
+            tune(frequency)
+            measured = strummer.measure_plucks()
+            assert measured is not None
+            plucks.append(measured)
+        strummer.offset_table = StrumOffsetTable.from_plucks(
+            plucks, steps_per_turn=motor_controller.steps_per_turn()
+        )
+
+        # A looser string is held longer, so the upstroke pluck comes later
+        tune(50.0)
+        strummer.set_frequency(50.0)
+        strummer.set_strum_state("downstroke")
+        strummer.strum()
+        pluck_steps = motor_controller.step_history.get_steps_at(string.pluck_times[-1])
+        assert pluck_steps is not None
+        # The strum went to the upstroke position
+        target_steps = motor_controller.get_target_steps()
+        assert target_steps - pluck_steps == pytest.approx(UPSTROKE_BASE_OFFSET, abs=3)
+        assert target_steps - strummer.calibration.upstroke_steps >= 5
+
+
+def test_strummer_follows_pitch_readings():
+    clock = SimulatedClock()
+    string = SimulatedString(clock=clock)
+    with (
+        SimulatedInputStream(string, block_size=2048, clock=clock) as input_stream,
+        MotorController(
+            motor=string.pick_motor(), max_steps=int(1e9), clock=clock
+        ) as motor_controller,
+    ):
+        strummer = Strummer(
+            input_stream=input_stream, motor_controller=motor_controller, clock=clock
+        )
+        strummer.on_pitch_reading((82.0, 1.0))
+        assert strummer.frequency == 82.0
+        # Failed readings don't count
+        strummer.on_pitch_reading((np.nan, 2.0))
+        assert strummer.frequency == 82.0
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from autoguitar.clock import SimulatedClock
+from autoguitar.control.strum_scheduler import StrumEvent, StrumPattern, StrumScheduler
+from autoguitar.control.strummer import Strummer
+from autoguitar.motor import MotorController
+from autoguitar.simulation.string_simulator import (
+    SimulatedInputStream,
+    SimulatedString,
+    StringSimulatorConfig,
+)
+
+
+def test_strum_scheduler_compensates_latency():
+    clock = SimulatedClock()
+    string = SimulatedString(config=StringSimulatorConfig(), clock=clock)
+    pattern = StrumPattern(
+        events=[StrumEvent(beat=0), StrumEvent(beat=1), StrumEvent(beat=2.5)],
+        beats_per_bar=4,
+    )
+
+    with (
+        SimulatedInputStream(string, block_size=512, clock=clock) as input_stream,
+        MotorController(
+            motor=string.pick_motor(), max_steps=int(1e9), clock=clock
+        ) as motor_controller,
+    ):
+        strummer = Strummer(
+            input_stream=input_stream, motor_controller=motor_controller, clock=clock
+        )
+        strummer.calibrate()
+        n_plucks_before = len(string.pluck_times)
+
+        scheduler = StrumScheduler(
+            strummer, pattern, bpm=120, initial_latency_sec=0.0, clock=clock
+        )
+        with scheduler:
+            scheduler.wait_until_bar(6)
+            # Let the measurements of the last bar finish
+            clock.sleep(1.0)
+
+    assert len(string.pluck_times) - n_plucks_before >= 6 * 3
+    stats = scheduler.bar_stats
+    assert len(stats) >= 5
+    assert all(s.n_events == 3 and s.n_skipped == 0 for s in stats)
+    assert all(s.n_measured == 3 for s in stats)
+
+    # Without any latency compensation, the first bar is late
+    assert stats[0].mean_error_sec > 0.02
+    # Later, the strums sound on the beat
+    assert abs(stats[-1].mean_error_sec) < 0.015
+    assert stats[-1].jitter_sec < 0.015
+    assert set(scheduler.latency_sec) == {"upstroke", "downstroke"}
+
+    # Check against when the simulated string was actually plucked. At 120 BPM, the
+    # pattern is 0.5s, 0.75s and 0.75s between strums, and a bar is 2s.
+    pluck_times = np.array(string.pluck_times[-7:])
+    for interval in np.diff(pluck_times):
+        assert min(abs(interval - 0.5), abs(interval - 0.75)) < 0.015
+    assert pluck_times[-1] - pluck_times[-4] == pytest.approx(2.0, abs=0.015)
@@ -0,0 +1,99 @@
+import numpy as np
+
+from autoguitar.clock import SimulatedClock
+from autoguitar.control.strummer import CalibrationMethod, Strummer
+from autoguitar.dsp.loudness_detector import find_onset
+from autoguitar.motor import MotorController
+from autoguitar.simulation.string_simulator import (
+    SimulatedInputStream,
+    SimulatedString,
+    StringSimulatorConfig,
+)
+
+
+def test_find_onset():
+    rng = np.random.default_rng(0)
+    y = rng.normal(scale=0.01, size=10000)
+    y[6000:] += np.sin(np.arange(4000) * 0.1) * np.exp(-np.arange(4000) / 2000)
+    onset = find_onset(y)
+    assert onset is not None
+    assert abs(onset - 6000) <= 128
+
+    # Just noise
+    assert find_onset(rng.normal(scale=0.01, size=10000)) is None
+
+
+def test_validate_calibration():
+    clock = SimulatedClock()
+    string = SimulatedString(config=StringSimulatorConfig(), clock=clock)
+
+    with (
+        SimulatedInputStream(string, block_size=2048, clock=clock) as input_stream,
+        MotorController(
+            motor=string.pick_motor(), max_steps=int(1e9), clock=clock
+        ) as motor_controller,
+    ):
+        strummer = Strummer(
+            input_stream=input_stream, motor_controller=motor_controller, clock=clock
+        )
+        strummer.calibrate()
+        calibration = strummer.calibration
+        assert calibration is not None
+
+        # As if the motor had lost its position
+        wrong_calibration = calibration.model_copy(
+            update={
+                "upstroke_steps": calibration.upstroke_steps + 100,
+                "downstroke_steps": calibration.downstroke_steps + 100,
+            }
+        )
+        assert not strummer.validate_calibration(wrong_calibration)
+        assert strummer.calibration == calibration
+
+        assert strummer.validate_calibration(calibration)
+        assert strummer.strum_state == "downstroke"
+
+
+def _calibrate(method: CalibrationMethod) -> tuple[Strummer, float]:
+    clock = SimulatedClock()
+    string = SimulatedString(config=StringSimulatorConfig(), clock=clock)
+
+    with (
+        SimulatedInputStream(string, block_size=2048, clock=clock) as input_stream,
+        MotorController(
+            motor=string.pick_motor(), max_steps=int(1e9), clock=clock
+        ) as motor_controller,
+    ):
+        strummer = Strummer(
+            input_stream=input_stream, motor_controller=motor_controller, clock=clock
+        )
+        start = clock.monotonic()
+        strummer.calibrate(
+            estimate_downstroke_separately=True,
+            method=method,
+        )
+        return strummer, clock.monotonic() - start
+
+
+def test_sweep_calibration_matches_steps():
+    sweep_strummer, sweep_sec = _calibrate("sweep")
+    steps_strummer, steps_sec = _calibrate("steps")
+    assert sweep_strummer.calibration is not None
+    assert steps_strummer.calibration is not None
+
+    assert sweep_sec < steps_sec / 2
+
+    # The methods can end up on different turns of the pick
+    turn = StringSimulatorConfig().pick_steps_per_turn
+    for sweep_steps, steps_steps in [
+        (
+            sweep_strummer.calibration.upstroke_steps,
+            steps_strummer.calibration.upstroke_steps,
+        ),
+        (
+            sweep_strummer.calibration.downstroke_steps,
+            steps_strummer.calibration.downstroke_steps,
+        ),
+    ]:
+        difference = (sweep_steps - steps_steps) % turn
+        assert min(difference, turn - difference) <= 5
@@ -0,0 +1,89 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from autoguitar.dashboard.dash_app import TELEMETRY_CLIENT
+from autoguitar.tuning.sweep import (
+    SweepData,
+    SweepResult,
+    get_grid,
+    get_pareto_front,
+    get_random_configs,
+    run_sweep,
+)
+
+
+def test_get_grid_and_random_configs():
+    grid = get_grid({"coef": [4.0, 5.0], "median_smoothing_window": [1, 3, 5]})
+    assert len(grid) == 6
+    assert {"coef": 5.0, "median_smoothing_window": 3} in grid
+
+    configs = get_random_configs(
+        {"adaptiveness": (0.0, 1.0), "slack_correction_cents": (0, 10)}, n_configs=20
+    )
+    assert len(configs) == 20
+    assert all(0 <= c["adaptiveness"] <= 1 for c in configs)
+    assert all(isinstance(c["slack_correction_cents"], int) for c in configs)
+
+
+def _write_session(path: Path):
+    """A session where the string obeys f^2 = 4.35*x + 3000 and the motor is idle."""
+    with path.open("w") as f:
+        for i, target_frequency in enumerate([65.41, 77.78]):
+            for j in range(20):
+                value = {
+                    "estimated_target_steps": 0,
+                    "target_frequency": target_frequency,
+                    "frequency": float(np.sqrt(3000)),
+                    "cur_steps": 0,
+                    "coef": 4.35,
+                    "network_timestamp": 1e9 + i * 10 + j * 0.2,
+                }
+                f.write(
+                    json.dumps({"kind": "model_based_tuner_strategy", "value": value})
+                )
+                f.write("\n")
+
+
+def test_run_sweep_uses_cache(tmp_path: Path):
+    session_path = tmp_path / "session.jsonl"
+    _write_session(session_path)
+    data = SweepData(kind="sessions", session_paths=[session_path])
+    cache_dir = tmp_path / "cache"
+
+    configs = get_grid({"coef": [4.35, 2.0], "adaptiveness": [0.5]})
+    results = run_sweep(configs, data, max_workers=1, cache_dir=cache_dir)
+    assert [r.params for r in results] == configs
+    assert results[0].fraction_reached == 1.0
+    assert len(list(cache_dir.iterdir())) == 2
+    # Only the workers turn off telemetry
+    assert TELEMETRY_CLIENT.enabled
+
+    # Corrupt a cached result to check that it's read instead of recomputed
+    cache_file = next(cache_dir.iterdir())
+    cached = SweepResult.model_validate_json(cache_file.read_text())
+    cached.n_targets = 123
+    cache_file.write_text(cached.model_dump_json())
+
+    results = run_sweep(configs, data, max_workers=1, cache_dir=cache_dir)
+    assert 123 in [r.n_targets for r in results]
+
+
+def test_pareto_front():
+    def make(fraction: float, time: float, error: float) -> SweepResult:
+        return SweepResult(
+            params={},
+            n_targets=10,
+            fraction_reached=fraction,
+            median_time_to_within_sec=time,
+            median_abs_error_cents=error,
+        )
+
+    results = [
+        make(1.0, 1.0, 5.0),
+        make(1.0, 2.0, 2.0),
+        make(1.0, 2.0, 6.0),  # Slower and less accurate than the first
+        make(0.5, 0.1, 0.1),  # Doesn't reach enough targets
+    ]
+    assert get_pareto_front(results) == [True, True, False, False]
@@ -0,0 +1,85 @@
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+
+from autoguitar.dashboard.telemetry import TelemetryClient
+
+
+def _start_server(received_batches: list[list[dict]]) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            body = self.rfile.read(length)
+            if self.headers["Content-Encoding"] == "gzip":
+                body = gzip.decompress(body)
+            received_batches.append(json.loads(body)["events"])
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format: str, *args: Any):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_telemetry_client_sends_batches(compress: bool):
+    received_batches = []
+    server = _start_server(received_batches)
+    url = f"http://localhost:{server.server_address[1]}/api/events"
+
+    with TelemetryClient(
+        url, max_batch_size=10, flush_interval_sec=0.05, compress=compress
+    ) as client:
+        for i in range(25):
+            client.post(kind="tuner", value={"i": i})
+
+    server.shutdown()
+
+    received = [event["value"]["i"] for batch in received_batches for event in batch]
+    assert received == list(range(25))
+    assert all(len(batch) <= 10 for batch in received_batches)
+    assert client.get_stats().n_sent == 25
+
+
+def test_telemetry_client_drops_oldest():
+    received_batches = []
+    server = _start_server(received_batches)
+    url = f"http://localhost:{server.server_address[1]}/api/events"
+
+    client = TelemetryClient(url, max_queue_size=3, autostart=False)
+    for i in range(5):
+        client.post(kind="tuner", value={"i": i})
+
+    stats = client.get_stats()
+    assert stats.n_enqueued == 5
+    assert stats.n_dropped == 2
+
+    client.start()
+    client.close()
+    server.shutdown()
+
+    received = [event["value"]["i"] for batch in received_batches for event in batch]
+    assert received == [2, 3, 4]
+
+
+def test_telemetry_client_post_does_not_block_when_server_is_down():
+    # Nothing listens on this port, requests will fail
+    client = TelemetryClient("http://localhost:9/api/events", timeout_sec=1)
+
+    start = time.monotonic()
+    for i in range(1000):
+        client.post(kind="tuner", value={"i": i})
+    assert time.monotonic() - start < 0.5
+
+    client.close(timeout_sec=2)
+    stats = client.get_stats()
+    assert stats.n_sent == 0
+    assert stats.n_failed > 0
@@ -0,0 +1,41 @@
+import time
+
+import numpy as np
+
+from autoguitar.time_sync import ClockMapping, ClockService
+
+
+def test_clock_mapping_estimates_offset_and_drift():
+    rng = np.random.default_rng(0)
+    mapping = ClockMapping(max_samples=500)
+
+    for source in np.arange(0, 100, 0.01):
+        # 50 ppm drift and up to 1ms of jitter, e.g. from the audio callback
+        target = 1234.5 + source * (1 + 50e-6) + rng.uniform(0, 1e-3)
+        mapping.add_sample(source, target)
+
+    assert len(mapping) == 500
+    assert abs(mapping.drift - 50e-6) < 5e-6
+    expected = 1234.5 + 200 * (1 + 50e-6) + 0.5e-3
+    assert abs(mapping(200) - expected) < 1e-3
+    assert abs(mapping.inverse(mapping(200)) - 200) < 1e-9
+
+
+def test_clock_mapping_is_identity_without_samples():
+    mapping = ClockMapping(initial_offset=10.0)
+    assert mapping(5.0) == 15.0
+
+    mapping.add_sample(1.0, 3.0)
+    assert mapping(5.0) == 7.0
+    assert mapping.drift == 0
+
+
+def test_clock_service_works_offline():
+    clock_service = ClockService(ntp_server=None)
+
+    assert abs(clock_service.network_timestamp() - time.time()) < 0.01
+    assert not clock_service.sync()
+
+    monotonic = time.monotonic()
+    network = clock_service.network_timestamp(monotonic)
+    assert abs(clock_service.network_to_monotonic(network) - monotonic) < 1e-6
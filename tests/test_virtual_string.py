@@ -1,6 +1,8 @@
+import librosa
+import numpy as np
 import pytest
 
-from autoguitar.virtual_string import Envelope
+from autoguitar.virtual_string import Envelope, PluckedStringSynth, SynthEvent
 
 
 def test_envelope():
@@ -18,3 +20,36 @@ def test_envelope():
     assert env(2.0) == pytest.approx(0.5)
     assert 0.1 < env(2.1) < 0.9
     assert env(2.25) == pytest.approx(1.0)
+
+
+def test_envelope_vectorized():
+    env = Envelope(attack_sec=0.25, decay_halftime_sec=0.75)
+    env.pluck(1)
+    t = np.linspace(0, 3, 31)
+    assert env(t) == pytest.approx([env(float(x)) for x in t])
+
+
+def test_plucked_string_synth_offline():
+    sr = 22050
+    synth = PluckedStringSynth(n_voices=2, sample_rate=sr)
+    events = [
+        SynthEvent(time_sec=0.1, voice=0, kind="pluck", frequency=110.0),
+        SynthEvent(time_sec=0.6, voice=0, kind="set_frequency", frequency=82.41),
+    ]
+    y = synth.render_offline(events, duration_sec=1.5)
+
+    assert len(y) == int(1.5 * sr)
+    # Silence before the pluck, sound right after it
+    assert np.abs(y[: int(0.1 * sr) - 1]).max() == 0
+    assert np.abs(y[int(0.1 * sr) : int(0.2 * sr)]).max() > 0.1
+
+    def estimate_pitch(start_sec: float) -> float:
+        start = int(start_sec * sr)
+        f0 = librosa.yin(
+            y[start : start + 4096], fmin=40, fmax=400, sr=sr, frame_length=2048
+        )
+        return float(np.median(f0))
+
+    # Inharmonicity makes the pitch slightly sharp
+    assert estimate_pitch(0.3) == pytest.approx(110, rel=0.02)
+    assert estimate_pitch(1.0) == pytest.approx(82.41, rel=0.02)